@@ -15,6 +15,9 @@ IF NOT EXIST ".venv" (
 REM Activar entorno virtual
 call .venv\Scripts\activate.bat
 
+REM Backend de filas: sqlite (por defecto) o parquet (particionado por Provincia/año)
+REM set RNI_BACKEND=parquet
+
 REM Levantar Streamlit en puerto fijo (ej: 8501)
 python -m streamlit run rni_app_v3.2.py --server.port 8501
 
@@ -0,0 +1,143 @@
+# ============================================================
+# ⏱️ BENCHMARK - RESUMEN GENERAL DE MEDICIONES
+# ============================================================
+# Compara el resumen por localidad original (groupby iterado en
+# Python, que queda acá como referencia) con el que usa la app:
+# calcular_rollup (se hace una vez, al ingresar) más
+# resumen_por_localidad_desde_rollup (en cada vista), sobre datos
+# sintéticos de 10k a 5M mediciones.
+#
+# Uso:
+#   python benchmark_resumen.py
+#   python benchmark_resumen.py --filas 10000 100000 --original-hasta 100000
+# ============================================================
+
+import argparse, time, warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from rni_procesamiento import format_timedelta_long
+from rni_resumen import calcular_rollup, resumen_por_localidad_desde_rollup
+
+CCTES = ["CABA", "Buenos Aires", "Comodoro Rivadavia", "Córdoba", "Neuquén", "Posadas", "Salta"]
+PROVINCIAS = ["Buenos Aires", "CABA", "Catamarca", "Chaco", "Chubut", "Córdoba", "Corrientes", "Entre Ríos",
+              "Formosa", "Jujuy", "La Pampa", "La Rioja", "Mendoza", "Misiones", "Neuquén", "Río Negro",
+              "Salta", "San Juan", "San Luis", "Santa Cruz", "Santa Fe", "Santiago del Estero",
+              "Tierra del Fuego", "Tucumán"]
+
+def generar_mediciones(n: int, seed: int = 0) -> pd.DataFrame:
+    """Genera n mediciones sintéticas (~1 archivo cada 500 filas, ~4 archivos por localidad)."""
+    rng = np.random.default_rng(seed)
+    n_archivos = max(1, n // 500)
+    n_localidades = max(1, n_archivos // 4)
+
+    loc_ccte = rng.integers(0, len(CCTES), n_localidades)
+    loc_prov = rng.integers(0, len(PROVINCIAS), n_localidades)
+    arch_loc = rng.integers(0, n_localidades, n_archivos)
+    arch_inicio = (
+        np.datetime64("2022-01-01T08:00:00")
+        + rng.integers(0, 3 * 365, n_archivos).astype("timedelta64[D]")
+        + rng.integers(0, 12 * 3600, n_archivos).astype("timedelta64[s]")
+    )
+
+    archivo = np.sort(rng.integers(0, n_archivos, n))
+    paso = rng.integers(5, 60, n).astype("timedelta64[s]")
+    # Tiempo acumulado dentro de cada archivo
+    acumulado = pd.Series(paso).groupby(archivo).cumsum().to_numpy()
+    fecha_hora = pd.Series(arch_inicio[archivo] + acumulado).dt.floor("s")
+    loc = arch_loc[archivo]
+
+    df = pd.DataFrame({
+        "CCTE": np.array(CCTES, dtype=object)[loc_ccte[loc]],
+        "Provincia": np.array(PROVINCIAS, dtype=object)[loc_prov[loc]],
+        "Localidad": pd.Series(loc).map(lambda i: f"Localidad {i}").to_numpy(),
+        "Resultado": rng.gamma(2.0, 0.8, n).round(2),
+        "Nombre Archivo": pd.Series(archivo).map(lambda i: f"medicion_{i}.xlsx").to_numpy(),
+        "Expediente": pd.Series(archivo // 3).map(lambda i: f"EX-2024-{i:07d}").to_numpy(),
+        "Sonda": rng.choice(["EP-600", "EP-645", "SRM-3006"], n),
+        "FechaHora": fecha_hora,
+    })
+    df["Fecha"] = df["FechaHora"].dt.normalize()
+    df["Hora"] = df["FechaHora"].dt.strftime("%H:%M:%S")
+    return df
+
+def resumen_por_localidad_original(df: pd.DataFrame) -> pd.DataFrame:
+    """Implementación anterior (groupby iterado y datetime.combine por grupo), como referencia."""
+    df = df.copy()
+    df["Fecha"] = pd.to_datetime(df["Fecha"], dayfirst=True, errors='coerce').dt.date
+    df["Hora"] = pd.to_datetime(df["Hora"], errors='coerce').dt.time
+
+    def calcular_tiempo_total_por_archivo(df):
+        total = timedelta(0)
+        for _, df_archivo in df.groupby("Nombre Archivo"):
+            for fecha, df_dia in df_archivo.groupby("Fecha"):
+                horas_validas = df_dia["Hora"].dropna()
+                if not horas_validas.empty:
+                    delta = datetime.combine(fecha, horas_validas.max()) - datetime.combine(fecha, horas_validas.min())
+                    if delta.total_seconds() < 0:
+                        delta += timedelta(days=1)
+                    total += delta
+        return total
+
+    resumen_localidad = []
+    for (ccte, prov, loc), g in df.groupby(["CCTE", "Provincia", "Localidad"]):
+        max_res = g["Resultado"].max() if pd.notna(g["Resultado"].max()) else None
+        resumen_localidad.append({
+            "CCTE": ccte,
+            "Provincia": prov,
+            "Localidad": loc,
+            "Inicio": g["FechaHora"].min(),
+            "Fin": g["FechaHora"].max(),
+            "Mediciones": len(g),
+            "Tiempo mediciones": format_timedelta_long(calcular_tiempo_total_por_archivo(g)),
+            "Resultado Max (V/m)": max_res,
+            "Resultado Max (%)": max_res**2 / 3770 / 0.20021 * 100 if max_res else None,
+            "N° Expediente": ", ".join(sorted(g["Expediente"].dropna().unique().astype(str))),
+            "Sonda utilizada": ", ".join(sorted(g["Sonda"].dropna().unique().astype(str))),
+        })
+    return pd.DataFrame(resumen_localidad)
+
+def _medir(funcion, df):
+    inicio = time.perf_counter()
+    resultado = funcion(df)
+    return resultado, time.perf_counter() - inicio
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del resumen general por localidad")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--original-hasta", type=int, default=1_000_000,
+                        help="Tamaño máximo en el que también se mide la implementación original")
+    args = parser.parse_args()
+    # La implementación original parsea Hora sin formato y pandas avisa en cada corrida
+    warnings.simplefilter("ignore", UserWarning)
+
+    print(
+        f"{'filas':>10} {'localidades':>12} {'original (s)':>14} {'rollup (s)':>12} "
+        f"{'resumen (s)':>12} {'aceleración':>12} {'iguales':>8}"
+    )
+    for n in args.filas:
+        df = generar_mediciones(n)
+        rollup, t_rollup = _medir(calcular_rollup, df)
+        nuevo, t_nuevo = _medir(resumen_por_localidad_desde_rollup, rollup)
+
+        t_orig, iguales, aceleracion = None, "-", "-"
+        if n <= args.original_hasta:
+            original, t_orig = _medir(resumen_por_localidad_original, df)
+            pd.testing.assert_frame_equal(
+                nuevo.reset_index(drop=True), original[nuevo.columns].reset_index(drop=True),
+                check_dtype=False,
+            )
+            iguales = "sí"
+            # Por vista: el rollup ya está guardado en rni.db
+            aceleracion = f"{t_orig / t_nuevo:.1f}x"
+
+        t_orig_txt = f"{t_orig:.3f}" if t_orig is not None else "-"
+        print(
+            f"{n:>10,} {len(nuevo):>12,} {t_orig_txt:>14} {t_rollup:>12.3f} "
+            f"{t_nuevo:>12.3f} {aceleracion:>12} {iguales:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ import pandas as pd
 import numpy as np
 from PIL import Image
 from datetime import datetime, timedelta
-import os, re, sqlite3   # >>> CAMBIO SQLITE (sacamos pickle, agregamos sqlite3)
+import os
 from streamlit import rerun
 import openpyxl
 from openpyxl.styles import Alignment, Font
@@ -28,6 +28,30 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RL
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.pagesizes import A4
 from io import BytesIO
+from rni_procesamiento import (
+    MAX_WORKERS_INGESTA, ESTADO_PROCESADO, ESTADO_SIN_UBICACION, procesar_lote, componer_fecha_hora,
+    format_timedelta_long,
+)
+from rni_resumen import (
+    COLUMNAS_ROLLUP, resumen_por_localidad_desde_rollup, resumen_diario_desde_rollup,
+    resumen_mensual_desde_rollup, resumen_por_expediente_desde_rollup,
+)
+from rni_db import (
+    DB_FILE, EXPECTED_COLS,
+    append_tabla_maestra_to_db, actualizar_localidad_en_db, eliminar_localidad_en_db,
+    normalizar_tabla_maestra, codificar_categoricas, valores_distintos, años_disponibles, load_tabla_maestra_filtrada,
+    load_rollup_filtrado, load_mapa_calor, load_mediciones_en_radio, load_mediciones_en_caja, version_datos,
+    hashes_ingresados, contar_mediciones, ultima_fecha_carga, load_maximo_resultado,
+)
+from rni_semaforo import COLORES_RGB, porcentaje_limite, color_semaforo
+from rni_mapa import (
+    MAX_PUNTOS_MAPA, MODO_PUNTOS, MODO_CALOR, NIVELES_CALOR,
+    datos_mapa, datos_calor, capas_por_banda, tamaño_nivel, zoom_inicial, caja_puntos,
+)
+from rni_sitios import KDTREE_DISPONIBLE, RADIO_SITIO_M, IndiceSitios, resumen_sitios_repetidos
+from rni_nomenclador import PROVINCIAS, PROVINCIA_AUTOMATICA, Nomenclador, asignar_por_gps
+from rni_cache import CacheDerivados
+from rni_dataset import DatasetCompartido
 
 # ---------------------- ESTILO ----------------------
 with open("style.css") as f:
@@ -44,250 +68,90 @@ except:
     st.sidebar.write("Logo ENACOM no encontrado")
 
 # ------------------- SESSION STATE ------------------
-st.session_state.setdefault("tabla_maestra", pd.DataFrame())
 st.session_state.setdefault("uploaded_files_list", [])
 st.session_state.setdefault("form_ccte", "")
 st.session_state.setdefault("form_provincia", "")
 st.session_state.setdefault("form_localidad", "")
 st.session_state.setdefault("form_expediente", "")
 
-DB_FILE = "rni.db"
-TABLE_NAME = "tabla_maestra"
-
-EXPECTED_COLS = [
-    "CCTE", "Provincia", "Localidad",
-    "Resultado", "Fecha", "Hora",
-    "Nombre Archivo", "Expediente",
-    "Sonda", "Lat", "Lon",
-    "FechaCarga",
-]
-   
-def load_tabla_maestra_from_db() -> pd.DataFrame:
-    """Carga tabla_maestra desde SQLite. Si no existe, devuelve DF vacío."""
-    if not os.path.exists(DB_FILE):
-        return pd.DataFrame()
-    conn = sqlite3.connect(DB_FILE)
-    try:
-        # Si la tabla no existe, devolvemos vacío
-        tablas = pd.read_sql(
-            "SELECT name FROM sqlite_master WHERE type='table';", conn
-        )["name"].tolist()
-        if TABLE_NAME not in tablas:
-            # Si solo hay una tabla, la usamos igual
-            if len(tablas) == 1:
-                tabla_real = tablas[0]
-            else:
-                # No sabemos cuál es -> devolvemos vacío y dejamos que el usuario cargue de nuevo
-                return pd.DataFrame()
-        else:
-            tabla_real = TABLE_NAME
-
-        df = pd.read_sql(f"SELECT * FROM {tabla_real}", conn)
-
-        # --- Normalizamos nombres de columnas (ccte / CCTE / CCTE_ / etc.) ---
-        col_map = {}
-        for c in df.columns:
-            key = c.strip().lower().replace("ó", "o").replace("í", "i")
-            if key == "ccte":
-                col_map[c] = "CCTE"
-            elif key == "provincia":
-                col_map[c] = "Provincia"
-            elif key == "localidad":
-                col_map[c] = "Localidad"
-            elif key in ("resultado", "resultado_con_incertidumbre"):
-                col_map[c] = "Resultado"
-            elif key == "fecha":
-                col_map[c] = "Fecha"
-            elif key in ("hora", "time"):
-                col_map[c] = "Hora"
-            elif key in ("nombrearchivo", "nombre_archivo", "archivo"):
-                col_map[c] = "Nombre Archivo"
-            elif key == "expediente":
-                col_map[c] = "Expediente"
-            elif key in ("sonda", "sonda_utilizada"):
-                col_map[c] = "Sonda"
-            elif key in ("lat", "latitud"):
-                col_map[c] = "Lat"
-            elif key in ("lon", "longitud"):
-                col_map[c] = "Lon"
-            elif key.lower() in ("fechacarga", "fecha_carga"):
-                col_map[c] = "FechaCarga"
-
-        if col_map:
-            df = df.rename(columns=col_map)
-
-        # Creamos columnas faltantes como NaN para que el resto del código no explote
-        for col in EXPECTED_COLS:
-            if col not in df.columns:
-                df[col] = np.nan
-
-        return df
-
-    finally:
-        conn.close()
-
-def save_tabla_maestra_to_db(df: pd.DataFrame):
-    """Guarda toda la tabla_maestra en SQLite, reemplazando el contenido."""
-    if df is None:
-        return
-    conn = sqlite3.connect(DB_FILE)
-    try:
-        df.to_sql(TABLE_NAME, conn, if_exists="replace", index=False)
-    finally:
-        conn.close()
+# Carga persistente de tabla maestra desde SQLite (ya no usamos PKL).
+# Una sola copia por proceso del servidor, compartida por todas las sesiones,
+# que se carga solo para las vistas de la tabla completa: el resto consulta rni.db.
+@st.cache_resource
+def dataset_compartido() -> DatasetCompartido:
+    """Tabla maestra compartida (instantáneas de solo lectura por versión de datos)."""
+    return DatasetCompartido()
 
-# Carga persistente de tabla maestra desde SQLite (ya no usamos PKL)
-if st.session_state["tabla_maestra"].empty:
+def cargar_tabla_maestra() -> pd.DataFrame:
+    """Instantánea vigente de la tabla maestra (no modificarla: es compartida)."""
     try:
-        st.session_state["tabla_maestra"] = load_tabla_maestra_from_db()
+        return dataset_compartido().snapshot(st.session_state["version_datos"])
     except Exception as e:
         st.warning(f"No se pudo cargar tabla desde {DB_FILE}: {e}")
+        return pd.DataFrame()
 
-# ============================================================
-# 🧩 FUNCIONES AUXILIARES
-# ============================================================
+# ------------------- CACHÉ DE DERIVADOS ------------------
+@st.cache_resource
+def cache_derivados() -> CacheDerivados:
+    """Caché de tablas y gráficos derivados, compartido por todas las sesiones del servidor."""
+    return CacheDerivados()
 
-def format_timedelta_long(td: timedelta) -> str:
-    """Convierte un timedelta a formato hh:mm:ss."""
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-def parse_dms_to_decimal(val):
-    """Convierte coordenadas DMS (grados, minutos, segundos) a decimal."""
-    if pd.isna(val):
-        return np.nan
-    try:
-        return float(val)
-    except:
-        pass
-    s = str(val).strip().replace(",", ".")
-    m = re.search(r'([+-]?\d+(?:\.\d+)?)\D+(\d+(?:\.\d+)?)\D+(\d+(?:\.\d+)?)\D*\s*([NnSsEeWwOo])?', s)
-    if m:
-        d = float(m.group(1)); mnt = float(m.group(2)); sec = float(m.group(3))
-        hemi = (m.group(4) or "").upper()
-        dec = abs(d) + mnt/60.0 + sec/3600.0
-        if hemi in ("S","W","O"):
-            dec = -dec
-        return dec
-    m2 = re.search(r'([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)', s)
-    if m2:
-        try:
-            return float(m2.group(1))
-        except:
-            return np.nan
-    return np.nan
-
-def extract_numeric_from_text(series):
-    """Extrae valores numéricos (float) desde texto."""
-    s = series.astype(str).str.replace(",", ".", regex=False)
-    num = s.str.extract(r'([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)', expand=False)
-    return pd.to_numeric(num, errors="coerce")
-
-def find_index_column(df):
-    """Detecta la columna que actúa como índice numérico."""
-    candidates = ["índice", "indice", "index", "nro", "nº", "n°", "num", "numero", "#"]
-    for c in df.columns:
-        if any(cand in str(c).lower() for cand in candidates):
-            return c
-    return None
-
-def calcular_tiempo_total_por_archivo(df: pd.DataFrame) -> timedelta:
+@st.cache_resource
+def nomenclador() -> Nomenclador:
+    """Nomenclador de localidades (localidades_ar.csv) indexado, uno por proceso del servidor."""
+    return Nomenclador()
+
+def leer_version_datos():
+    """
+    Lee la versión de datos de rni.db una vez por rerun (y después de cada escritura)
+    y la deja en la sesión: derivado() la usa como clave sin abrir la base cada vez.
     """
-    Calcula la duración total de medición por archivo (considerando saltos de día),
-    usando siempre Fecha + Hora y agrupando por 'Nombre Archivo'.
+    st.session_state["version_datos"] = version_datos()
+
+leer_version_datos()
+
+def derivado(clave, calcular):
     """
-    total = timedelta(0)
-    if "Nombre Archivo" in df.columns:
-        for _, df_archivo in df.groupby("Nombre Archivo"):
-            if "Fecha" in df_archivo.columns and "Hora" in df_archivo.columns:
-                for fecha, df_dia in df_archivo.groupby("Fecha"):
-                    horas_validas = df_dia["Hora"].dropna()
-                    if not horas_validas.empty:
-                        dt_inicio = datetime.combine(fecha, horas_validas.min())
-                        dt_fin = datetime.combine(fecha, horas_validas.max())
-                        delta = dt_fin - dt_inicio
-                        if delta.total_seconds() < 0:
-                            delta += timedelta(days=1)
-                        total += delta
-    return total
+    Memoiza calcular() por clave (nombre + filtros) y versión de datos de rni.db.
+    Cada alta, edición o baja incrementa la versión y descarta lo cacheado.
+    """
+    return cache_derivados().obtener(st.session_state["version_datos"], clave, calcular)
 
 # ============================================================
 # ⚙️ PROCESAMIENTO DE ARCHIVOS EXCEL
 # ============================================================
 
-def procesar_archivos(uploaded_files, ccte, provincia, localidad, expediente):
-    """Procesa múltiples archivos Excel y los integra en la tabla maestra."""
-    lista_procesados, resumen_archivos = [], []
+def procesar_archivos(uploaded_files, ccte, provincia, localidad, expediente, max_workers=1):
+    """
+    Procesa múltiples archivos Excel y los integra en la tabla maestra.
+    Con max_workers > 1 reparte los archivos en un pool de procesos (modo paralelo).
+    Los archivos ya ingresados (mismo contenido) se omiten antes de leerlos.
+    """
+    archivos = [(file.name, file.getvalue()) for file in uploaded_files]
+    ya_ingresados = hashes_ingresados()
+    try:
+        df_proc, resumen_df, advertencias = procesar_lote(
+            archivos, ccte, provincia, localidad, expediente, max_workers=max_workers, ya_ingresados=ya_ingresados
+        )
+    except Exception as e:
+        # Si el pool de procesos falla (ej. entorno sin multiprocessing) seguimos en serie
+        st.warning(f"Falló la ingesta en paralelo ({e}). Se procesa en serie.")
+        df_proc, resumen_df, advertencias = procesar_lote(
+            archivos, ccte, provincia, localidad, expediente, max_workers=1, ya_ingresados=ya_ingresados
+        )
 
-    for file in uploaded_files:
-        try:
-            df = pd.read_excel(file, header=8, engine="openpyxl")
-        except Exception as e:
-            st.warning(f"No se pudo leer {file.name}: {e}")
-            continue
-
-        df = df.dropna(axis=1, how="all")
-        idx_col = find_index_column(df)
-        total_mediciones = len(df)
-
-        # Detecta número de mediciones
-        if idx_col:
-            df["_idx_num"] = pd.to_numeric(df[idx_col], errors="coerce")
-            df = df[df["_idx_num"].notna()]
-            if not df.empty:
-                total_mediciones = int(df["_idx_num"].max())
-
-        # Mapeo de columnas esperadas
-        mapping_candidates = {
-            "Fecha": ["fecha"],
-            "Hora": ["hora", "time"],
-            "Resultado": ["resultado con incertidumbre", "resultado"],
-            "Sonda": ["sonda", "sonda utilizada"],
-            "Lat": ["latitud", "lat"],
-            "Lon": ["longitud", "lon"]
-        }
-
-        columnas_map, missing = {}, False
-        for key, cands in mapping_candidates.items():
-            found = next((c for c in df.columns if any(cand in str(c).lower() for cand in cands)), None)
-            if not found and key not in ("Lat", "Lon"):
-                st.warning(f"Archivo {file.name}: no se encontró columna para '{key}'")
-                missing = True
-                break
-            if found:
-                columnas_map[key] = found
-        if missing:
-            continue
-
-        # Renombrado y limpieza
-        df = df.rename(columns={v: k for k, v in columnas_map.items()})
-        df["CCTE"], df["Provincia"], df["Localidad"] = ccte, provincia, localidad
-        df["Expediente"] = expediente if expediente else os.path.splitext(file.name)[0]
-        df["Nombre Archivo"] = file.name
-
-        # Limpieza y formateo de campos
-        if "Resultado" in df.columns:
-            df["Resultado"] = extract_numeric_from_text(df["Resultado"])
-        if "Lat" in df.columns:
-            df["Lat"] = df["Lat"].apply(parse_dms_to_decimal)
-        if "Lon" in df.columns:
-            df["Lon"] = df["Lon"].apply(parse_dms_to_decimal)
-        df.drop(columns=["_idx_num"], errors="ignore", inplace=True)
-
-        lista_procesados.append(df)
-        resumen_archivos.append({
-            "archivo": file.name,
-            "expediente": df["Expediente"].iloc[0],
-            "total mediciones": total_mediciones,
-            "max_resultado": df["Resultado"].max() if "Resultado" in df.columns else None
-        })
+    # Provincia/Localidad por coordenadas: completa las automáticas y marca las que no coinciden
+    df_proc, verificacion, avisos_gps, sin_ubicacion = asignar_por_gps(df_proc, provincia, localidad, nomenclador())
+    if not resumen_df.empty:
+        resumen_df = resumen_df.merge(verificacion, on="archivo", how="left")
+        # No se registran: se pueden volver a cargar con Provincia/Localidad a mano
+        resumen_df.loc[resumen_df["archivo"].isin(sin_ubicacion), "estado"] = ESTADO_SIN_UBICACION
+    advertencias = advertencias + avisos_gps
 
-    if lista_procesados:
-        return pd.concat(lista_procesados, ignore_index=True), pd.DataFrame(resumen_archivos)
-    return pd.DataFrame(), pd.DataFrame()
+    for aviso in advertencias:
+        st.warning(aviso)
+    # Mismo encoding categórico que la tabla cargada desde rni.db
+    return codificar_categoricas(df_proc), resumen_df
 
 # ============================================================
 # 🧹 FUNCIONES ADMINISTRATIVAS
@@ -295,23 +159,19 @@ def procesar_archivos(uploaded_files, ccte, provincia, localidad, expediente):
 
 def eliminar_localidad(nombre_localidad: str):
     """Elimina una localidad completa de la tabla maestra."""
-    if st.session_state["tabla_maestra"].empty:
+    if contar_mediciones() == 0:
         st.warning("⚠️ No hay datos cargados en la tabla maestra.")
         return
 
-    df = st.session_state["tabla_maestra"]
-    if "Localidad" not in df.columns:
-        st.error("❌ No se encontró columna 'Localidad'.")
-        return
-
-    eliminados = len(df[df["Localidad"] == nombre_localidad])
+    eliminados = contar_mediciones(localidad=nombre_localidad)
     if eliminados == 0:
         st.info(f"ℹ️ No se encontró la localidad **{nombre_localidad}** en la tabla.")
         return
 
-    st.session_state["tabla_maestra"] = df[df["Localidad"] != nombre_localidad]
-    # >>> CAMBIO SQLITE: guardamos en DB
-    save_tabla_maestra_to_db(st.session_state["tabla_maestra"])
+    # >>> CAMBIO SQLITE: borramos solo las filas de la localidad
+    eliminar_localidad_en_db(nombre_localidad)
+    dataset_compartido().registrar_baja(nombre_localidad)
+    leer_version_datos()
     st.success(f"✅ Localidad **{nombre_localidad}** eliminada ({eliminados} registros).")
 
 # ============================================================
@@ -335,39 +195,64 @@ with st.sidebar.form("carga_form", clear_on_submit=False):
     ccte = st.selectbox("CCTE", ["CABA", "Buenos Aires", "Comodoro Rivadavia", "Córdoba", "Neuquén", "Posadas", "Salta"], key="form_ccte")
     provincia = st.selectbox(
         "Provincia",
-        ["Buenos Aires","CABA","Catamarca","Chaco","Chubut","Córdoba","Corrientes","Entre Ríos","Formosa","Jujuy",
-         "La Pampa","La Rioja","Mendoza","Misiones","Neuquén","Río Negro","Salta","San Juan","San Luis","Santa Cruz",
-         "Santa Fe","Santiago del Estero","Tierra del Fuego","Tucumán"],
+        [PROVINCIA_AUTOMATICA] + PROVINCIAS,
         key="form_provincia"
     )
-    localidad = st.text_input("Localidad", value=st.session_state["form_localidad"], key="form_localidad")
+    localidad = st.text_input(
+        "Localidad", value=st.session_state["form_localidad"], key="form_localidad",
+        help="Vacía: se toma de las coordenadas de cada archivo (localidad más cercana)."
+    )
     expediente = st.text_input("Expediente", value=st.session_state["form_expediente"], key="form_expediente")
     files = st.file_uploader("Seleccionar archivos Excel", accept_multiple_files=True, type=["xlsx"], key=f"form_files_{st.session_state['uploader_key']}")
+    workers = st.number_input(
+        "Procesos en paralelo", min_value=1, max_value=max(1, os.cpu_count() or 1),
+        value=MAX_WORKERS_INGESTA, step=1, key="form_workers",
+        help="Cantidad de archivos que se procesan a la vez. Con 1 se procesan en serie."
+    )
     submit = st.form_submit_button("Procesar archivos")
 
     if submit and files:
-        df_proc, resumen_df = procesar_archivos(files, ccte, provincia, localidad, expediente)
+        df_proc, resumen_df = procesar_archivos(files, ccte, provincia, localidad, expediente, max_workers=int(workers))
         if not df_proc.empty:
-            df_proc["FechaCarga"] = datetime.now()
-            st.session_state["tabla_maestra"] = pd.concat([st.session_state["tabla_maestra"], df_proc], ignore_index=True)
-            # >>> CAMBIO SQLITE: guardamos en DB
-            save_tabla_maestra_to_db(st.session_state["tabla_maestra"])
-            st.success(f"{len(files)} archivos procesados y agregados.")
-            st.sidebar.dataframe(resumen_df)
+            # Al segundo, como queda en rni.db (la instantánea en memoria debe coincidir)
+            fecha_carga = datetime.now().replace(microsecond=0)
+            df_proc["FechaCarga"] = fecha_carga
+            # Mismas columnas y tipos que la tabla cargada desde rni.db
+            df_proc = normalizar_tabla_maestra(df_proc)[EXPECTED_COLS]
+            # Hash de cada archivo procesado, para no volver a ingresarlo
+            procesados = resumen_df[resumen_df["estado"] == ESTADO_PROCESADO]
+            # Localidad con que quedó cada archivo (la del formulario o la asignada por GPS)
+            localidad_archivo = df_proc.drop_duplicates("Nombre Archivo").set_index("Nombre Archivo")["Localidad"]
+            archivos_ingresados = [
+                {"Hash": r["hash"], "Nombre Archivo": r["archivo"], "Expediente": r["expediente"],
+                 "Localidad": localidad_archivo.get(r["archivo"], localidad), "FechaCarga": fecha_carga.strftime("%Y-%m-%d %H:%M:%S")}
+                for r in procesados.to_dict("records")
+            ]
+            # Solo agregamos el lote nuevo a la base (y a la instantánea compartida)
+            append_tabla_maestra_to_db(df_proc, archivos=archivos_ingresados)
+            dataset_compartido().registrar_alta(df_proc)
+            leer_version_datos()
+            st.success(f"{len(procesados)} archivos procesados y agregados.")
             st.session_state["uploader_key"] += 1
         else:
             st.warning("No se procesaron archivos válidos.")
+        if not resumen_df.empty:
+            st.sidebar.dataframe(resumen_df.drop(columns="hash"))
 
 st.sidebar.button("Restablecer formulario", on_click=reset_form)
 
 # ------------------- SIDEBAR: eliminar localidad ------------------
-if "tabla_maestra" in st.session_state and not st.session_state["tabla_maestra"].empty:
-    localidades_unicas = sorted(st.session_state["tabla_maestra"]["Localidad"].dropna().unique().tolist())
+if derivado(("total_mediciones",), contar_mediciones):
+    localidades_unicas = derivado(("valores", "Localidad"), lambda: valores_distintos("Localidad"))
     localidad_a_borrar = st.sidebar.selectbox("Seleccionar localidad a eliminar", [""] + localidades_unicas)
 
     if st.sidebar.button("❌ Eliminar localidad") and localidad_a_borrar:
         eliminar_localidad(localidad_a_borrar)
 
+# Cantidad vigente después de las altas/bajas del sidebar (sin cargar la tabla)
+total_registros = derivado(("total_mediciones",), contar_mediciones)
+hay_datos = total_registros > 0
+
 # ------------------- ENCABEZADO CON LOGO ------------------
 col1, col2 = st.columns([6,1])
 
@@ -378,15 +263,14 @@ with col2:
     st.image("logo_enacom.png")
 
 # ------------------- HIGHLIGHT GLOBAL ------------------
-if "tabla_maestra" in st.session_state and not st.session_state["tabla_maestra"].empty:
-    df = st.session_state["tabla_maestra"].copy()
-    df["Resultado"] = pd.to_numeric(df["Resultado"], errors="coerce")
-    idx_max = df["Resultado"].idxmax()
-    fila_max = df.loc[idx_max]
+# Solo la fila del máximo, resuelta en SQLite
+maximo_global = derivado(("maximo_global",), load_maximo_resultado) if hay_datos else pd.DataFrame()
+if not maximo_global.empty:
+    fila_max = maximo_global.iloc[0]
 
     localidad_top = fila_max.get("Localidad", "N/A")
     resultado_top = fila_max["Resultado"]
-    resultado_top_pct = resultado_top**2 / 3770 / 0.20021 * 100 if pd.notna(resultado_top) else None
+    resultado_top_pct = porcentaje_limite(resultado_top) if pd.notna(resultado_top) else None
 
     # Fecha/Hora asociada
     fecha_top = None
@@ -437,82 +321,51 @@ if "tabla_maestra" in st.session_state and not st.session_state["tabla_maestra"]
     col4.metric("Fecha/Hora", str(fecha_top))
 
 # ------------------- RESUMEN GENERAL DE LOCALIDADES (con filtros previos) ------------------
-if "tabla_maestra" in st.session_state and not st.session_state["tabla_maestra"].empty:
-    df = st.session_state["tabla_maestra"].copy()
-    df["Resultado"] = pd.to_numeric(df["Resultado"], errors="coerce")
-
-    # --- 🔍 FILTROS PREVIOS ---    
+if hay_datos:
+    # --- 🔍 FILTROS PREVIOS (las opciones y el filtrado se resuelven en SQLite) ---
     st.header("📊 Resumen general de mediciones")
 
     col1, col2, col3 = st.columns([1, 1, 1])
     with col1:
         ccte_sel = st.selectbox(
             "Filtrar CCTE",
-            ["Todos"] + sorted(df["CCTE"].dropna().unique().tolist()),
+            ["Todos"] + derivado(("valores", "CCTE"), lambda: valores_distintos("CCTE")),
             key="resumen_ccte"
         )
-        if ccte_sel != "Todos":
-            df = df[df["CCTE"] == ccte_sel]
+        filtro_ccte = ccte_sel if ccte_sel != "Todos" else None
 
     with col2:
         prov_sel = st.selectbox(
             "Filtrar Provincia",
-            ["Todas"] + sorted(df["Provincia"].dropna().unique().tolist()),
+            ["Todas"] + derivado(
+                ("valores", "Provincia", filtro_ccte),
+                lambda: valores_distintos("Provincia", ccte=filtro_ccte),
+            ),
             key="resumen_provincia"
         )
-        if prov_sel != "Todas":
-            df = df[df["Provincia"] == prov_sel]
+        filtro_prov = prov_sel if prov_sel != "Todas" else None
 
     with col3:
         año_sel = "Todos"
-        if "Fecha" in df.columns:
-            df["Fecha"] = pd.to_datetime(df["Fecha"], dayfirst=True, errors="coerce")
-            años_disp = sorted(df["Fecha"].dt.year.dropna().astype(int).unique().tolist(), reverse=True)
-            if años_disp:
-                año_sel = st.selectbox(
-                    "Filtrar Año",
-                    ["Todos"] + [str(a) for a in años_disp],
-                    key="resumen_año"
-                )
-                if año_sel != "Todos":
-                    df = df[df["Fecha"].dt.year == int(año_sel)]
-
-    # --- Procesamiento base ---
-    if "Fecha" in df.columns:
-        df["Fecha"] = pd.to_datetime(df["Fecha"], dayfirst=True, errors='coerce').dt.date
-    if "Hora" in df.columns:
-        df["Hora"] = pd.to_datetime(df["Hora"], errors='coerce').dt.time
-
-    if "Fecha" in df.columns and "Hora" in df.columns:
-        df["FechaHora"] = df.apply(
-            lambda x: datetime.combine(x["Fecha"], x["Hora"]) if pd.notna(x["Fecha"]) and pd.notna(x["Hora"]) else pd.NaT,
-            axis=1
+        años_disp = derivado(
+            ("años", filtro_ccte, filtro_prov),
+            lambda: años_disponibles(ccte=filtro_ccte, provincia=filtro_prov),
         )
-    else:
-        df["FechaHora"] = pd.NaT
-
-    # --- Resumen agrupado ---
-    resumen_localidad = []
-    for (ccte, prov, loc), g in df.groupby(["CCTE", "Provincia", "Localidad"]):
-        inicio = g["FechaHora"].min() if "FechaHora" in g.columns else None
-        fin = g["FechaHora"].max() if "FechaHora" in g.columns else None
-        tiempo_total_localidad = calcular_tiempo_total_por_archivo(g)
-        max_res = g["Resultado"].max() if pd.notna(g["Resultado"].max()) else None
-        resumen_localidad.append({
-            "CCTE": ccte,
-            "Provincia": prov,
-            "Localidad": loc,
-            "Inicio": inicio,
-            "Fin": fin,
-            "Mediciones": len(g),
-            "Tiempo mediciones": format_timedelta_long(tiempo_total_localidad),
-            "Resultado Max (V/m)": max_res,
-            "Resultado Max (%)": max_res**2 / 3770 / 0.20021 * 100 if max_res else None,
-            "N° Expediente": ", ".join(sorted(g["Expediente"].dropna().unique().astype(str))),
-            "Sonda utilizada": ", ".join(sorted(g["Sonda"].dropna().unique().astype(str))) if "Sonda" in g.columns else "N/A"
-        })
-
-    resumen_localidad_df = pd.DataFrame(resumen_localidad)
+        if años_disp:
+            año_sel = st.selectbox(
+                "Filtrar Año",
+                ["Todos"] + [str(a) for a in años_disp],
+                key="resumen_año"
+            )
+        filtro_año = int(año_sel) if año_sel != "Todos" else None
+
+    # --- Resumen agrupado desde los rollups (no se leen las mediciones crudas) ---
+    resumen_localidad_df = derivado(
+        ("resumen_localidad", filtro_ccte, filtro_prov, filtro_año),
+        lambda: resumen_por_localidad_desde_rollup(
+            load_rollup_filtrado(ccte=filtro_ccte, provincia=filtro_prov, año=filtro_año)
+        ),
+    )
     
     st.dataframe(resumen_localidad_df)
 
@@ -556,30 +409,35 @@ if "tabla_maestra" in st.session_state and not st.session_state["tabla_maestra"]
                 st.error(f"Error exportando Excel: {e}")
 
 #----------------------------- GRAFICOS-------------------------------------
-if not st.session_state["tabla_maestra"].empty:
-    df_grafico = st.session_state["tabla_maestra"].copy()
-    
-    # Distribución de puntos medidos por CCTE
-    df_pie = df_grafico.groupby("CCTE").size().reset_index(name="Cantidad Puntos")
-    fig_pie = px.pie(
-        df_pie,
-        names="CCTE",
-        values="Cantidad Puntos",
-        title="Distribución de puntos medidos por CCTE",
-        color_discrete_sequence=px.colors.qualitative.Set3
-    )
+if hay_datos:
+    def graficos_generales():
+        # Desde los rollups: una fila por (localidad, expediente, archivo, día)
+        df_grafico = load_rollup_filtrado()
+
+        # Distribución de puntos medidos por CCTE
+        df_pie = df_grafico.groupby("CCTE", observed=True)["Mediciones"].sum().reset_index(name="Cantidad Puntos")
+        fig_pie = px.pie(
+            df_pie,
+            names="CCTE",
+            values="Cantidad Puntos",
+            title="Distribución de puntos medidos por CCTE",
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
 
-    # Localidades por Provincia y CCTE
-    resumen = df_grafico.groupby(["Provincia","CCTE"])["Localidad"].nunique().reset_index(name="CantidadLocalidades")
-    fig_bar = px.bar(
-        resumen,
-        x="Provincia",
-        y="CantidadLocalidades",
-        color="CCTE",
-        text="CantidadLocalidades",
-        barmode="group",
-        title="Localidades por Provincia y CCTE"
-    )
+        # Localidades por Provincia y CCTE
+        resumen = df_grafico.groupby(["Provincia","CCTE"], observed=True)["Localidad"].nunique().reset_index(name="CantidadLocalidades")
+        fig_bar = px.bar(
+            resumen,
+            x="Provincia",
+            y="CantidadLocalidades",
+            color="CCTE",
+            text="CantidadLocalidades",
+            barmode="group",
+            title="Localidades por Provincia y CCTE"
+        )
+        return fig_pie, fig_bar
+
+    fig_pie, fig_bar = derivado(("graficos_generales",), graficos_generales)
 
     st.subheader("📊 Resumen de mediciones y localidades")
     col1, col2 = st.columns(2)
@@ -591,83 +449,97 @@ if not st.session_state["tabla_maestra"].empty:
 # ------------------- RESUMEN Y EDICIÓN DE LOCALIDAD ------------------
 st.header("📊 Gestión de Localidades")
 
-df_base = st.session_state["tabla_maestra"].copy()
-
-columnas_necesarias = {"CCTE", "Provincia", "Localidad"}
-if df_base.empty or not columnas_necesarias.issubset(df_base.columns):
+if not hay_datos:
     st.info("Todavía no hay datos suficientes (o faltan columnas CCTE/Provincia/Localidad) para gestionar localidades. Cargá mediciones nuevas.")
     df_filtrado_prov = pd.DataFrame()
+    rollup_localidad = pd.DataFrame(columns=COLUMNAS_ROLLUP)
     localidad_seleccionada = ""
     provincia_filtro = "Todas"
     ccte_filtro = "Todos"
+    filtros_gestion = None
 else:
+    # Las opciones de cada filtro y las filas se consultan a SQLite según la selección
     col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
 
     with col1:
-        lista_ccte = sorted(df_base["CCTE"].dropna().unique().tolist())
+        lista_ccte = derivado(("valores", "CCTE"), lambda: valores_distintos("CCTE"))
         ccte_filtro = st.selectbox(
             "Filtrar CCTE",
             ["Todos"] + lista_ccte,
             key="gestion_ccte"
         )
-        if ccte_filtro == "Todos":
-            df_filtrado_ccte = df_base.copy()
-        else:
-            df_filtrado_ccte = df_base[df_base["CCTE"] == ccte_filtro].copy()
+        filtro_ccte = ccte_filtro if ccte_filtro != "Todos" else None
 
     with col2:
-        lista_prov = sorted(df_filtrado_ccte["Provincia"].dropna().unique().tolist())
+        lista_prov = derivado(
+            ("valores", "Provincia", filtro_ccte),
+            lambda: valores_distintos("Provincia", ccte=filtro_ccte),
+        )
         provincia_filtro = st.selectbox(
             "Filtrar Provincia",
             ["Todas"] + lista_prov,
             key="gestion_provincia"
         )
-        if provincia_filtro == "Todas":
-            df_filtrado_prov = df_filtrado_ccte.copy()
-        else:
-            df_filtrado_prov = df_filtrado_ccte[df_filtrado_ccte["Provincia"] == provincia_filtro].copy()
+        filtro_prov = provincia_filtro if provincia_filtro != "Todas" else None
 
     with col4:
         año_filtro = "Todos"
-        if not df_filtrado_prov.empty and "Fecha" in df_filtrado_prov.columns:
-            _años = pd.to_datetime(df_filtrado_prov["Fecha"], dayfirst=True, errors="coerce").dt.year
-            df_filtrado_prov["_Año"] = _años
-            años_disponibles = sorted(df_filtrado_prov["_Año"].dropna().astype(int).unique().tolist(), reverse=True)
-            opciones_año = ["Todos"] + [str(a) for a in años_disponibles]
+        años_disponibles_gestion = derivado(
+            ("años", filtro_ccte, filtro_prov),
+            lambda: años_disponibles(ccte=filtro_ccte, provincia=filtro_prov),
+        )
+        if años_disponibles_gestion:
+            opciones_año = ["Todos"] + [str(a) for a in años_disponibles_gestion]
             año_filtro = st.selectbox("📅 Año", opciones_año, index=0, key="gestion_año")
-            if año_filtro != "Todos":
-                df_filtrado_prov = df_filtrado_prov[df_filtrado_prov["_Año"] == int(año_filtro)]
-            df_filtrado_prov = df_filtrado_prov.drop(columns=["_Año"])
+        filtro_año = int(año_filtro) if año_filtro != "Todos" else None
 
     with col3:
-        if not df_filtrado_prov.empty:
-            localidades_cargadas = df_filtrado_prov["Localidad"].dropna().unique().tolist()
-        else:
-            localidades_cargadas = []
+        localidades_cargadas = derivado(
+            ("valores", "Localidad", filtro_ccte, filtro_prov, filtro_año),
+            lambda: valores_distintos("Localidad", ccte=filtro_ccte, provincia=filtro_prov, año=filtro_año),
+        )
         localidad_seleccionada = st.selectbox(
             "Seleccionar Localidad",
-            [""] + sorted(localidades_cargadas),
+            [""] + localidades_cargadas,
             key="gestion_localidad"
         )
 
-# Subset final
-if localidad_seleccionada:
-    df_localidad = df_filtrado_prov[df_filtrado_prov["Localidad"] == localidad_seleccionada].copy()
-else:
-    df_localidad = df_filtrado_prov.copy()
-
-# Convertir fechas y horas
-if "Fecha" in df_localidad.columns:
-    df_localidad["Fecha"] = pd.to_datetime(df_localidad["Fecha"], dayfirst=True, errors='coerce').dt.date
-if "Hora" in df_localidad.columns:
-    df_localidad["Hora"] = pd.to_datetime(df_localidad["Hora"], errors='coerce').dt.time
-if "Fecha" in df_localidad.columns and "Hora" in df_localidad.columns:
-    df_localidad["FechaHora"] = df_localidad.apply(
-        lambda x: datetime.combine(x["Fecha"], x["Hora"]) if pd.notna(x["Fecha"]) and pd.notna(x["Hora"]) else pd.NaT,
-        axis=1
+    # Solo se cargan las filas de la selección (la localidad, si hay una elegida)
+    filtros_gestion = (filtro_ccte, filtro_prov, filtro_año, localidad_seleccionada or None)
+    if any(f is not None for f in filtros_gestion):
+        df_filtrado_prov = derivado(
+            ("tabla_filtrada",) + filtros_gestion,
+            lambda: load_tabla_maestra_filtrada(*filtros_gestion),
+        )
+    else:
+        # Vista inicial sin filtros: la instantánea compartida, que al arrancar se mapea
+        # del snapshot Arrow en lugar de leer y normalizar toda la base
+        df_filtrado_prov = cargar_tabla_maestra()
+    rollup_localidad = derivado(
+        ("rollup",) + filtros_gestion,
+        lambda: load_rollup_filtrado(*filtros_gestion),
     )
-else:
-    df_localidad["FechaHora"] = pd.NaT    
+
+def preparar_df_localidad(df_filtrado):
+    """Subset final con Fecha como date, Hora como time y FechaHora garantizada."""
+    # Copia superficial: solo Fecha y Hora se reemplazan, el resto comparte los
+    # buffers de df_filtrado (que sin filtros es la instantánea compartida)
+    df_localidad = df_filtrado.copy(deep=False)
+
+    # Convertir fechas y horas
+    if "Fecha" in df_localidad.columns:
+        df_localidad["Fecha"] = pd.to_datetime(df_localidad["Fecha"], dayfirst=True, errors='coerce').dt.date
+    if "Hora" in df_localidad.columns:
+        df_localidad["Hora"] = pd.to_datetime(df_localidad["Hora"], errors='coerce').dt.time
+    if "FechaHora" not in df_localidad.columns:
+        if "Fecha" in df_localidad.columns and "Hora" in df_localidad.columns:
+            df_localidad["FechaHora"] = componer_fecha_hora(df_localidad["Fecha"], df_localidad["Hora"])
+        else:
+            df_localidad["FechaHora"] = pd.NaT
+    return df_localidad
+
+# Subset final
+df_localidad = derivado(("df_localidad", filtros_gestion), lambda: preparar_df_localidad(df_filtrado_prov))
 
 # ---------------- Datos generales ----------------
 if localidad_seleccionada:    
@@ -682,10 +554,11 @@ else:
 
 st.subheader(f"Mediciones RNI de {titulo_scope}")
 
-tiempo_total_localidad = calcular_tiempo_total_por_archivo(df_localidad)
+# Tiempo trabajado: suma de las duraciones por (archivo, día) guardadas en los rollups
+tiempo_total_localidad = timedelta(seconds=float(rollup_localidad["Duracion"].sum()))
 total_puntos = len(df_localidad)
 max_resultado = df_localidad["Resultado"].max() if "Resultado" in df_localidad.columns else None
-max_resultado_pct = max_resultado**2 / 3770 / 0.20021 * 100 if pd.notna(max_resultado) else None
+max_resultado_pct = porcentaje_limite(max_resultado) if pd.notna(max_resultado) else None
 sondas = df_localidad["Sonda"].dropna().unique().tolist() if "Sonda" in df_localidad.columns else []
 
 st.write(f"Cantidad total de puntos medidos: {total_puntos}")
@@ -695,68 +568,9 @@ st.write(f"Tiempo total de mediciones: {format_timedelta_long(tiempo_total_local
 
 # ---------------- Resumen por día y mes ----------------
 if "FechaHora" in df_localidad.columns and not df_localidad.empty:
-    df_localidad["FechaHora"] = pd.to_datetime(df_localidad["FechaHora"])
-    df_localidad["Fecha"] = df_localidad["FechaHora"].dt.date
-    df_localidad["Mes"] = df_localidad["FechaHora"].dt.to_period("M")
-
-    # --- Resumen diario ---
-    def resumen_por_dia(df_dia):
-        tiempo_total = calcular_tiempo_total_por_archivo(df_dia)
-        inicio_dt = df_dia["FechaHora"].min()
-        fin_dt = df_dia["FechaHora"].max()
-        hora_inicio = inicio_dt.strftime("%H:%M:%S") if pd.notna(inicio_dt) else "-"
-        hora_fin = fin_dt.strftime("%H:%M:%S") if pd.notna(fin_dt) else "-"
-        puntos = len(df_dia)
-        localidades = ", ".join(sorted(df_dia["Localidad"].dropna().unique()))
-        return {
-            "Hora de inicio": hora_inicio,
-            "Hora de fin": hora_fin,
-            "Tiempo total trabajado": format_timedelta_long(tiempo_total),
-            "Cantidad de puntos medidos": puntos,
-            "Localidades trabajadas (por día)": localidades,
-        }
-
-    filas_resumen_dias = []
-    for fecha, g_dia in df_localidad.groupby("Fecha"):
-        info = resumen_por_dia(g_dia)
-        info["Fecha de medición"] = fecha
-        filas_resumen_dias.append(info)
-
-    resumen_dias = pd.DataFrame(filas_resumen_dias)
-    if not resumen_dias.empty:
-        resumen_dias = resumen_dias[
-            [
-                "Fecha de medición",
-                "Hora de inicio",
-                "Hora de fin",
-                "Tiempo total trabajado",
-                "Cantidad de puntos medidos",
-                "Localidades trabajadas (por día)",
-            ]
-        ]
-    
-    # --- Resumen mensual ---
-    resumen_mensual = df_localidad.groupby("Mes").agg({
-        "FechaHora": ["min","max"],
-        "Localidad": lambda x: ", ".join(sorted(x.dropna().unique())),
-        "Resultado": "count"
-    }).reset_index()
-
-    resumen_mensual.columns = ["Mes","Hora inicio","Hora fin","Localidades trabajadas","Cantidad puntos"]
-
-    # Calcular tiempo total trabajado por mes
-    def calcular_tiempo_mes(g_mes):
-        return format_timedelta_long(calcular_tiempo_total_por_archivo(g_mes))
-
-    filas_tiempo_mes = []
-    for mes, g_mes in df_localidad.groupby("Mes"):
-        filas_tiempo_mes.append({
-            "Mes": mes,
-            "Horas trabajadas": calcular_tiempo_mes(g_mes)
-        })
-    tiempo_por_mes = pd.DataFrame(filas_tiempo_mes)
-
-    resumen_mensual = resumen_mensual.merge(tiempo_por_mes, on="Mes")
+    # --- Resúmenes diario y mensual (desde los rollups de la selección) ---
+    resumen_dias = derivado(("resumen_diario", filtros_gestion), lambda: resumen_diario_desde_rollup(rollup_localidad))
+    resumen_mensual = derivado(("resumen_mensual", filtros_gestion), lambda: resumen_mensual_desde_rollup(rollup_localidad))
 
     # -------- Tabs para elegir vista --------
     tab1, tab2, tab3 = st.tabs(["📅 Resumen Diario", "🗓️ Resumen Mensual", "📊 Gráfico"])
@@ -773,63 +587,60 @@ if "FechaHora" in df_localidad.columns and not df_localidad.empty:
         if not resumen_mensual.empty:
             st.markdown(f"### 📊 Gráfico mensual de mediciones y tiempo trabajado en {titulo_scope}")
 
-            # Crear figura con dos ejes: cantidad de puntos y horas trabajadas
-            fig = go.Figure()
-
-            # Barra: Cantidad de puntos
-            fig.add_trace(go.Bar(
-                x=resumen_mensual["Mes"].astype(str),
-                y=resumen_mensual["Cantidad puntos"],
-                name="Cantidad puntos",
-                marker_color="steelblue",
-                yaxis="y1",
-                text=resumen_mensual["Cantidad puntos"],
-                textposition="auto",
-                hovertext=resumen_mensual["Localidades trabajadas"],  # 👈 tooltip
-                hovertemplate="<b>%{x}</b><br>Puntos: %{y}<br>Localidades: %{hovertext}"
-            ))
-
-            # Línea: Horas trabajadas   
-            def tiempo_a_horas(s):
-                h, m, sec = map(int, s.split(":"))
-                return h + m/60 + sec/3600
-
-            resumen_mensual["Horas trabajadas num"] = resumen_mensual["Horas trabajadas"].apply(tiempo_a_horas)
-
-            fig.add_trace(go.Scatter(
-                x=resumen_mensual["Mes"].astype(str),
-                y=resumen_mensual["Horas trabajadas num"],
-                name="Horas trabajadas",
-                yaxis="y2",
-                mode="lines+markers",
-                line=dict(color="orange", width=2)
-            ))
-
-            # Configuración de ejes
-            fig.update_layout(
-                xaxis=dict(title="Mes"),
-                yaxis=dict(title="Cantidad de puntos", side="left"),
-                yaxis2=dict(
-                    title="Horas trabajadas",
-                    overlaying="y",
-                    side="right"
-                ),
-                legend=dict(x=0.01, y=0.99),
-                template="plotly_white",
-                height=450
-            )
+            def grafico_mensual():
+                # Crear figura con dos ejes: cantidad de puntos y horas trabajadas
+                fig = go.Figure()
+
+                # Barra: Cantidad de puntos
+                fig.add_trace(go.Bar(
+                    x=resumen_mensual["Mes"].astype(str),
+                    y=resumen_mensual["Cantidad puntos"],
+                    name="Cantidad puntos",
+                    marker_color="steelblue",
+                    yaxis="y1",
+                    text=resumen_mensual["Cantidad puntos"],
+                    textposition="auto",
+                    hovertext=resumen_mensual["Localidades trabajadas"],  # 👈 tooltip
+                    hovertemplate="<b>%{x}</b><br>Puntos: %{y}<br>Localidades: %{hovertext}"
+                ))
+
+                # Línea: Horas trabajadas   
+                def tiempo_a_horas(s):
+                    h, m, sec = map(int, s.split(":"))
+                    return h + m/60 + sec/3600
+
+                horas_trabajadas_num = resumen_mensual["Horas trabajadas"].apply(tiempo_a_horas)
+
+                fig.add_trace(go.Scatter(
+                    x=resumen_mensual["Mes"].astype(str),
+                    y=horas_trabajadas_num,
+                    name="Horas trabajadas",
+                    yaxis="y2",
+                    mode="lines+markers",
+                    line=dict(color="orange", width=2)
+                ))
+
+                # Configuración de ejes
+                fig.update_layout(
+                    xaxis=dict(title="Mes"),
+                    yaxis=dict(title="Cantidad de puntos", side="left"),
+                    yaxis2=dict(
+                        title="Horas trabajadas",
+                        overlaying="y",
+                        side="right"
+                    ),
+                    legend=dict(x=0.01, y=0.99),
+                    template="plotly_white",
+                    height=450
+                )
+                return fig
 
+            fig = derivado(("grafico_mensual", filtros_gestion), grafico_mensual)
             st.plotly_chart(fig, width="stretch")
 
 # ---------------- Semáforo ----------------
 if max_resultado_pct and not df_localidad.empty:
-    rangos_colores = [
-        (0, 1, "#84C2F5"), (1, 2, "#489DFF"), (2, 4, "#006BD6"),
-        (4, 8, "#A9E7A9"), (8, 15, "#89DD89"), (15, 20, "#4D9623"),
-        (20, 35, "#D9FF00"), (35, 50, "#F39A6D"), (50, 100, "#E68200"),
-        (100, float("inf"), "#CC0000")
-    ]
-    color_localidad = next((color for low, high, color in rangos_colores if low <= max_resultado_pct < high), "#FFFFFF")
+    color_localidad = color_semaforo(max_resultado_pct)
     st.markdown(
         f"""
         <div style="
@@ -850,71 +661,189 @@ if max_resultado_pct and not df_localidad.empty:
 
 # ------------------- MAPA INTERACTIVO ------------------
 if "Lat" in df_localidad.columns and "Lon" in df_localidad.columns and not df_localidad.empty:
-    coords = df_localidad.dropna(subset=["Lat", "Lon"])[["Lat", "Lon", "Localidad", "Resultado"]].copy()
-    if not coords.empty:
-        # Forzamos coordenadas negativas (Argentina)
-        coords["lat"] = coords["Lat"].apply(lambda x: -abs(x))
-        coords["lon"] = coords["Lon"].apply(lambda x: -abs(x))
-
-        rangos_colores_map = [
-            (0, 1, [132, 194, 245]),
-            (1, 2, [72, 157, 255]),
-            (2, 4, [0, 107, 214]),
-            (4, 8, [169, 231, 169]),
-            (8, 15, [137, 221, 137]),
-            (15, 20, [77, 150, 35]),
-            (20, 35, [217, 255, 0]),
-            (35, 50, [243, 154, 109]),
-            (50, 100, [230, 130, 0]),
-            (100, float("inf"), [204, 0, 0])
-        ]
-
-        def color_semaforo(valor):
-            if pd.isna(valor):
-                return [200, 200, 200]
-            for low, high, color in rangos_colores_map:
-                if low <= valor < high:
-                    return color
-            return [0, 0, 0]
-
-        coords["color"] = coords["Resultado"].apply(color_semaforo)
+    def coordenadas_mapa():
+        # Lat/Lon ya vienen con signo y Banda/CoordValida calculadas en la ingesta
+        return df_localidad.loc[
+            df_localidad["CoordValida"], ["Lat", "Lon", "Localidad", "Resultado", "Banda"]
+        ].rename(columns={"Lat": "lat", "Lon": "lon"})
 
+    coords = derivado(("coordenadas_mapa", filtros_gestion), coordenadas_mapa)
+    if not coords.empty:
         st.subheader("🗺️ Mapa Semaforizado")
+        # Pocos puntos: se dibujan tal cual; muchos: celdas agregadas en el servidor
+        modo_mapa, datos_capa, tamaño = derivado(("datos_mapa", filtros_gestion), lambda: datos_mapa(coords))
+        # Una capa por banda con color fijo: las filas viajan sin colores ni texto
+        capas_banda = derivado(("capas_mapa", filtros_gestion), lambda: capas_por_banda(modo_mapa, datos_capa))
+        if modo_mapa == MODO_PUNTOS:
+            capas = [
+                pdk.Layer(
+                    "ScatterplotLayer",
+                    id=f"banda_{banda}",
+                    data=filas,
+                    get_position='[lon, lat]',
+                    get_fill_color=COLORES_RGB[banda].tolist(),
+                    get_radius=12,
+                    pickable=True,
+                )
+                for banda, filas in capas_banda
+            ]
+            tooltip = {"text": "Resultado: {Resultado}"}
+            zoom = 6
+        else:
+            capas = [
+                pdk.Layer(
+                    "PolygonLayer",
+                    id=f"banda_{banda}",
+                    data=filas,
+                    get_polygon="poligono",
+                    get_fill_color=COLORES_RGB[banda].tolist(),
+                    stroked=False,
+                    opacity=0.8,
+                    pickable=True,
+                )
+                for banda, filas in capas_banda
+            ]
+            tooltip = {"text": "Mediciones: {Mediciones}\nResultado máx.: {Resultado}"}
+            zoom = zoom_inicial(coords["lat"], coords["lon"])
+            st.caption(
+                f"{len(coords):,} puntos agregados en {len(datos_capa):,} celdas de {tamaño}° "
+                f"(color de la peor banda de cada celda). Con hasta {MAX_PUNTOS_MAPA:,} puntos se ve cada medición."
+            )
         mapa = pdk.Deck(
             map_style="https://basemaps.cartocdn.com/gl/positron-gl-style/style.json",
             initial_view_state=pdk.ViewState(
                 latitude=coords["lat"].mean(),
                 longitude=coords["lon"].mean(),
-                zoom=6,
+                zoom=zoom,
                 pitch=0,
             ),
+            layers=capas,
+            tooltip=tooltip,
+        )
+        seleccion_mapa = st.pydeck_chart(mapa, width="stretch", on_select="rerun", key="mapa_semaforo")
+
+        # Los datos de texto del punto elegido se buscan acá (no viajan con el mapa)
+        elegidos = [
+            obj["fila"] for objs in seleccion_mapa.selection.get("objects", {}).values()
+            for obj in objs if "fila" in obj
+        ] if seleccion_mapa else []
+        elegidos = [f for f in elegidos if f in df_localidad.index]
+        if elegidos:
+            st.dataframe(
+                df_localidad.loc[elegidos, ["Localidad", "Resultado", "FechaHora", "Lat", "Lon"]],
+                width="stretch", hide_index=True,
+            )
+
+# ------------------- MAPA DE CALOR NACIONAL ------------------
+# Pirámide de celdas precalculada en rni.db: solo viaja el nivel elegido
+if hay_datos and st.toggle("🌡️ Mostrar mapa de calor nacional", key="mapa_calor"):
+    nivel_calor = st.select_slider(
+        "Tamaño de celda",
+        options=NIVELES_CALOR,
+        value=3,
+        format_func=lambda n: f"{tamaño_nivel(n):g}°",
+        key="nivel_calor",
+    )
+    capas_calor = derivado(
+        ("mapa_calor", nivel_calor),
+        lambda: capas_por_banda(MODO_CALOR, datos_calor(load_mapa_calor(nivel_calor), nivel_calor)),
+    )
+    if capas_calor:
+        mapa_calor = pdk.Deck(
+            map_style="https://basemaps.cartocdn.com/gl/positron-gl-style/style.json",
+            initial_view_state=pdk.ViewState(latitude=-38.4, longitude=-63.6, zoom=3.5, pitch=0),
             layers=[
                 pdk.Layer(
-                    "ScatterplotLayer",
-                    data=coords,
-                    get_position='[lon, lat]',
-                    get_fill_color='color',
-                    get_radius=12,
+                    "PolygonLayer",
+                    id=f"calor_{banda}",
+                    data=filas,
+                    get_polygon="poligono",
+                    get_fill_color=COLORES_RGB[banda].tolist(),
+                    stroked=False,
+                    opacity=0.8,
                     pickable=True,
                 )
+                for banda, filas in capas_calor
             ],
-            tooltip={"text": "Localidad: {Localidad}\nResultado: {Resultado}"}
+            tooltip={"text": "Mediciones: {Mediciones}\nMáximo: {MaxPct} % del límite"},
+        )
+        st.pydeck_chart(mapa_calor, width="stretch")
+        st.caption("Máximo porcentaje del límite por celda, con todas las mediciones con coordenadas válidas.")
+
+# ------------------- MEDICIONES CERCA DE UN PUNTO ------------------
+# Consulta por radio sobre el índice espacial de rni.db (solo lee las filas cercanas)
+if hay_datos:
+    with st.expander("📍 Mediciones cerca de un punto", expanded=False):
+        col_lat, col_lon, col_radio = st.columns(3)
+        lat_punto = col_lat.number_input("Latitud", value=-34.6037, min_value=-90.0, max_value=90.0, format="%.5f", key="cerca_lat")
+        lon_punto = col_lon.number_input("Longitud", value=-58.3816, min_value=-180.0, max_value=180.0, format="%.5f", key="cerca_lon")
+        radio_km = col_radio.number_input("Radio (km)", value=2.0, min_value=0.1, max_value=100.0, step=0.5, key="cerca_radio")
+        cercanas = derivado(
+            ("mediciones_en_radio", lat_punto, lon_punto, radio_km),
+            lambda: load_mediciones_en_radio(
+                lat_punto, lon_punto, radio_km * 1000,
+                columnas=["Localidad", "Expediente", "Resultado", "FechaHora", "Lat", "Lon"],
+            ),
+        )
+        if cercanas.empty:
+            st.info("No hay mediciones en ese radio.")
+        else:
+            st.caption(
+                f"{len(cercanas):,} mediciones a menos de {radio_km:g} km · "
+                f"máximo {porcentaje_limite(cercanas['Resultado'].max()):.2f} % del límite"
+            )
+            st.dataframe(cercanas.round({"Distancia": 0}), width="stretch", hide_index=True)
+
+# ------------------- SITIOS YA MEDIDOS ------------------
+# Índice KD-tree (rni_sitios): mismo lugar con otra Localidad o Expediente
+if KDTREE_DISPONIBLE and hay_datos and localidad_seleccionada:
+    def mediciones_previas():
+        puntos = df_localidad[df_localidad["CoordValida"]]
+        if puntos.empty:
+            return puntos
+        # Solo se leen (por el R-tree de rni.db) e indexan las mediciones de la caja que rodea a la localidad
+        candidatas = load_mediciones_en_caja(
+            *caja_puntos(puntos["Lat"], puntos["Lon"], RADIO_SITIO_M),
+            columnas=["Localidad", "Expediente", "Resultado", "Fecha", "Lat", "Lon", "CoordValida"],
+        )
+        candidatas = candidatas[candidatas["Localidad"] != localidad_seleccionada].reset_index(drop=True)
+        indice = IndiceSitios(candidatas)
+        cercanas = candidatas.iloc[indice.filas_cercanas(puntos["Lat"], puntos["Lon"], RADIO_SITIO_M)]
+        if cercanas.empty:
+            return cercanas
+        return (
+            cercanas.groupby(["Localidad", "Expediente"], observed=True)
+            .agg(Mediciones=("Resultado", "size"), Desde=("Fecha", "min"), Hasta=("Fecha", "max"),
+                 **{"Resultado Max (V/m)": ("Resultado", "max")})
+            .reset_index()
+            .sort_values("Hasta", ascending=False)
         )
-        st.pydeck_chart(mapa, width="stretch")
+
+    previas = derivado(("mediciones_previas", filtros_gestion), mediciones_previas)
+    if not previas.empty:
+        with st.expander(f"📌 Este sitio ya se midió como otra localidad ({len(previas)})", expanded=False):
+            st.caption(f"Mediciones de otras localidades a menos de {RADIO_SITIO_M} m de algún punto de {localidad_seleccionada}.")
+            st.dataframe(previas, width="stretch", hide_index=True)
+
+# Recorre toda la tabla: la instantánea compartida y su índice se cargan al activar la vista
+if KDTREE_DISPONIBLE and hay_datos and st.toggle("🔁 Buscar sitios medidos más de una vez", key="sitios_repetidos"):
+    indice_sitios = dataset_compartido().indice_sitios(st.session_state["version_datos"])
+    repetidos = derivado(
+        ("sitios_repetidos",),
+        lambda: resumen_sitios_repetidos(indice_sitios.df, indice_sitios.sitios(RADIO_SITIO_M)),
+    )
+    st.caption(
+        f"{len(repetidos):,} sitios con más de una Localidad o Expediente "
+        f"(puntos a menos de {RADIO_SITIO_M} m del primer punto de cada sitio)."
+    )
+    st.dataframe(repetidos, width="stretch", hide_index=True)
 
 # -------------------- Edición de información (plegable) --------------------
 if localidad_seleccionada:
-    # >>> CAMBIO SQLITE: aseguramos que FechaCarga sea datetime antes de usar strftime
-    if "FechaCarga" in st.session_state["tabla_maestra"].columns:
-        st.session_state["tabla_maestra"]["FechaCarga"] = pd.to_datetime(
-            st.session_state["tabla_maestra"]["FechaCarga"], errors="coerce"
-        )
-
-    ultima_fecha = None
-    if "FechaCarga" in st.session_state["tabla_maestra"].columns:
-        mask_fecha = st.session_state["tabla_maestra"]["Localidad"] == localidad_seleccionada
-        if mask_fecha.any():
-            ultima_fecha = st.session_state["tabla_maestra"].loc[mask_fecha, "FechaCarga"].max()
+    # >>> CAMBIO SQLITE: FechaCarga más reciente de la localidad, consultada en rni.db
+    ultima_fecha = derivado(
+        ("ultima_fecha_carga", localidad_seleccionada), lambda: ultima_fecha_carga(localidad_seleccionada)
+    )
 
     expander_title = f"✏️ Editar información de {localidad_seleccionada}"
     if ultima_fecha is not None and pd.notna(ultima_fecha):
@@ -933,30 +862,24 @@ if localidad_seleccionada:
         )
         nueva_provincia = st.selectbox(
             "Provincia",
-            ["Buenos Aires","CABA","Catamarca","Chaco","Chubut","Córdoba","Corrientes","Entre Ríos","Formosa","Jujuy",
-             "La Pampa","La Rioja","Mendoza","Misiones","Neuquén","Río Negro","Salta","San Juan","San Luis","Santa Cruz",
-             "Santa Fe","Santiago del Estero","Tierra del Fuego","Tucumán"],
-            index=["Buenos Aires","CABA","Catamarca","Chaco","Chubut","Córdoba","Corrientes","Entre Ríos","Formosa","Jujuy",
-                   "La Pampa","La Rioja","Mendoza","Misiones","Neuquén","Río Negro","Salta","San Juan","San Luis","Santa Cruz",
-                   "Santa Fe","Santiago del Estero","Tierra del Fuego","Tucumán"].index(provincia_actual)
+            PROVINCIAS,
+            index=PROVINCIAS.index(provincia_actual) if provincia_actual in PROVINCIAS else 0
         )
         nueva_localidad = st.text_input("Localidad", value=localidad_actual)
         nuevo_expediente = st.text_input("Expediente", value=expediente_actual)
 
-        if "FechaCarga" not in st.session_state["tabla_maestra"].columns:
-            st.session_state["tabla_maestra"]["FechaCarga"] = pd.NaT
-
         def guardar_cambios():
-            mask = st.session_state["tabla_maestra"]["Localidad"] == localidad_actual
-            st.session_state["tabla_maestra"].loc[mask, "CCTE"] = nuevo_ccte
-            st.session_state["tabla_maestra"].loc[mask, "Provincia"] = nueva_provincia
-            st.session_state["tabla_maestra"].loc[mask, "Localidad"] = nueva_localidad
-            st.session_state["tabla_maestra"].loc[mask, "Expediente"] = nuevo_expediente
-            st.session_state["tabla_maestra"].loc[mask, "FechaCarga"] = datetime.now()
-
+            ahora = datetime.now().replace(microsecond=0)
+            cambios = {
+                "CCTE": nuevo_ccte,
+                "Provincia": nueva_provincia,
+                "Localidad": nueva_localidad,
+                "Expediente": nuevo_expediente,
+            }
             try:
-                # >>> CAMBIO SQLITE: guardamos en DB
-                save_tabla_maestra_to_db(st.session_state["tabla_maestra"])
+                # >>> CAMBIO SQLITE: UPDATE solo de las filas de la localidad
+                actualizar_localidad_en_db(localidad_actual, {**cambios, "FechaCarga": ahora.strftime("%Y-%m-%d %H:%M:%S")})
+                dataset_compartido().registrar_edicion(localidad_actual, {**cambios, "FechaCarga": ahora})
                 st.success("Cambios guardados correctamente")
             except Exception as e:
                 st.error(f"No se pudieron guardar los cambios: {e}")
@@ -964,12 +887,11 @@ if localidad_seleccionada:
         st.button("💾 Guardar cambios", on_click=guardar_cambios)
 
         def eliminar_localidad_cb():
-            mask = st.session_state["tabla_maestra"]["Localidad"] == localidad_actual
-            if mask.any():
-                st.session_state["tabla_maestra"] = st.session_state["tabla_maestra"].loc[~mask]
+            if contar_mediciones(localidad=localidad_actual):
                 try:
-                    # >>> CAMBIO SQLITE: guardamos en DB
-                    save_tabla_maestra_to_db(st.session_state["tabla_maestra"])
+                    # >>> CAMBIO SQLITE: DELETE solo de las filas de la localidad
+                    eliminar_localidad_en_db(localidad_actual)
+                    dataset_compartido().registrar_baja(localidad_actual)
                     st.success(f"Localidad '{localidad_actual}' eliminada correctamente")
                     st.experimental_rerun()  # recarga la app para reflejar cambios
                 except Exception as e:
@@ -986,13 +908,13 @@ if localidad_seleccionada:
 with st.expander("🖨️ Generar informe PDF / Word", expanded=False):
     st.header("🖨️ Generar Informe con Gráficos y Datos Resumidos")
 
-    if not st.session_state["tabla_maestra"].empty:
+    if hay_datos:
         # Usamos el mismo subset que se está viendo en pantalla:
         df_export = df_localidad.copy() if not df_localidad.empty else df_filtrado_prov.copy()
 
         # Si por algún motivo ese df está vacío, fallback a tabla completa
         if df_export.empty:
-            df_export = st.session_state["tabla_maestra"].copy()
+            df_export = cargar_tabla_maestra().copy()
 
         # ========= ESTADÍSTICAS PARA EL RELATO =========
         df_export["Resultado"] = pd.to_numeric(df_export.get("Resultado", np.nan), errors="coerce")
@@ -1003,7 +925,7 @@ with st.expander("🖨️ Generar informe PDF / Word", expanded=False):
         fecha_hora_max = None
 
         if pd.notna(max_resultado):
-            max_resultado_pct = max_resultado**2 / 3770 / 0.20021 * 100
+            max_resultado_pct = porcentaje_limite(max_resultado)
 
             fila_max = df_export.loc[df_export["Resultado"].idxmax()]
             localidad_max = fila_max.get("Localidad", "N/D")
@@ -1029,8 +951,14 @@ with st.expander("🖨️ Generar informe PDF / Word", expanded=False):
                 fecha_min = fechas.min().date()
                 fecha_max_med = fechas.max().date()
 
+        # Rollups del mismo ámbito que df_export (tiempos, desglose mensual y expedientes)
+        ambito_export = filtros_gestion if not df_localidad.empty else None
+        rollup_export = rollup_localidad if not df_localidad.empty else derivado(
+            ("rollup", None, None, None, None), load_rollup_filtrado
+        )
+
         # Tiempo total trabajado (según Nombre Archivo + Fecha/Hora)
-        tiempo_total_trabajado = calcular_tiempo_total_por_archivo(df_export)
+        tiempo_total_trabajado = timedelta(seconds=float(rollup_export["Duracion"].sum()))
 
         # Sondas utilizadas
         sondas_uniq = []
@@ -1038,52 +966,29 @@ with st.expander("🖨️ Generar informe PDF / Word", expanded=False):
             sondas_uniq = sorted(df_export["Sonda"].dropna().astype(str).unique().tolist())
 
         # ========= DESGLOSE POR MES =========
-        resumen_mensual_export = pd.DataFrame()
-        if "FechaHora" in df_export.columns and df_export["FechaHora"].notna().any():
-            df_tmp = df_export.copy()
-            df_tmp["FechaHora"] = pd.to_datetime(df_tmp["FechaHora"], errors="coerce")
-            df_tmp["Mes"] = df_tmp["FechaHora"].dt.to_period("M")
-
-            if df_tmp["Mes"].notna().any():
-                resumen_mensual_export = df_tmp.groupby("Mes").agg(
-                    Cantidad_puntos=("Resultado", "count"),
-                    Fecha_inicio=("FechaHora", "min"),
-                    Fecha_fin=("FechaHora", "max"),
-                    Localidades_trabajadas=("Localidad", lambda x: ", ".join(sorted(x.dropna().unique())))
-                ).reset_index()
-
-                # Tiempo por mes
-                def _tiempo_mes(g_mes):
-                    return format_timedelta_long(calcular_tiempo_total_por_archivo(g_mes))
-
-                filas_tiempo_export = []
-                for mes, g_mes in df_tmp.groupby("Mes"):
-                    filas_tiempo_export.append({
-                        "Mes": mes,
-                        "Horas_trabajadas": _tiempo_mes(g_mes)
-                    })
-                tiempos_mes = pd.DataFrame(filas_tiempo_export)
-
-                resumen_mensual_export = resumen_mensual_export.merge(tiempos_mes, on="Mes")
+        resumen_mensual_export = derivado(
+            ("resumen_mensual", ambito_export),
+            lambda: resumen_mensual_desde_rollup(rollup_export),
+        ).rename(columns={
+            "Hora inicio": "Fecha_inicio",
+            "Hora fin": "Fecha_fin",
+            "Localidades trabajadas": "Localidades_trabajadas",
+            "Cantidad puntos": "Cantidad_puntos",
+            "Horas trabajadas": "Horas_trabajadas",
+        })
 
         # ========= TABLA DE EXPEDIENTES =========
-        expedientes_df = pd.DataFrame()
-        if "Expediente" in df_export.columns:
-            expedientes_df = df_export.groupby("Expediente").agg(
-                Cantidad_puntos=("Resultado", "count"),
-                CCTE=("CCTE", lambda x: ", ".join(sorted(x.dropna().unique()))),
-                Provincias=("Provincia", lambda x: ", ".join(sorted(x.dropna().unique()))),
-                Localidades=("Localidad", lambda x: ", ".join(sorted(x.dropna().unique()))),
-                Max_Vm=("Resultado", "max")
-            ).reset_index()
-            expedientes_df = expedientes_df.sort_values(by="Max_Vm", ascending=False)
+        expedientes_df = derivado(
+            ("expedientes", ambito_export),
+            lambda: resumen_por_expediente_desde_rollup(rollup_export),
+        )
 
         # ========= GRÁFICO SOLO DEL ÁMBITO ACTUAL =========
         df_graf_export = df_export.copy()
         if {"Provincia", "CCTE", "Localidad"}.issubset(df_graf_export.columns):
             resumen_export = (
                 df_graf_export
-                .groupby(["Provincia", "CCTE"])["Localidad"]
+                .groupby(["Provincia", "CCTE"], observed=True)["Localidad"]
                 .nunique()
                 .reset_index(name="CantidadLocalidades")
             )
@@ -1341,14 +1246,17 @@ with st.expander("🖨️ Generar informe PDF / Word", expanded=False):
 
 st.header("📊 Tabla Maestra de Mediciones RNI")
 
-if st.session_state["tabla_maestra"].empty:
+if not hay_datos:
     st.info("La tabla maestra está vacía. Cargá archivos a la izquierda.")
 else:
-    total_registros = len(st.session_state["tabla_maestra"])
     st.caption(f"🗂️ Registros totales: **{total_registros:,}**")
-    with st.expander("📂 Mostrar / Ocultar tabla maestra", expanded=False):
-        df_maestra = st.session_state["tabla_maestra"].copy().dropna(axis=1, how="all")
-        st.dataframe(df_maestra.reset_index(drop=True), width="stretch")
+    # La tabla completa (instantánea compartida del proceso) se carga solo al mostrarla
+    if st.toggle("📂 Mostrar / Ocultar tabla maestra", key="mostrar_tabla_maestra"):
+        df_maestra = derivado(
+            ("tabla_maestra_visible",),
+            lambda: cargar_tabla_maestra().dropna(axis=1, how="all").reset_index(drop=True),
+        )
+        st.dataframe(df_maestra, width="stretch")
         if st.button("💾 Exportar tabla a Excel"):
             df_maestra.to_excel("tabla_maestra.xlsx", index=False)
             with open("tabla_maestra.xlsx", "rb") as f:
@@ -0,0 +1,65 @@
+# ============================================================
+# 🧠 CACHÉ DE DERIVADOS - RNI ENACOM
+# ============================================================
+# Memoiza tablas y gráficos derivados (resúmenes, filtros,
+# figuras) entre reruns de Streamlit. Cada entrada se indexa
+# por (nombre, filtros) y todo el caché se descarta cuando
+# avanza la versión de datos de rni.db (ver rni_db.version_datos).
+# Una sesión que todavía no releyó la versión calcula sin guardar:
+# no pisa las entradas de la versión nueva.
+# ============================================================
+
+import threading
+from collections import OrderedDict
+
+# Cantidad máxima de entradas antes de desalojar la menos usada
+MAX_ENTRADAS_CACHE = 128
+
+class CacheDerivados:
+    """Caché LRU atado a una versión de datos; seguro entre sesiones (threads) de Streamlit."""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS_CACHE):
+        self.max_entradas = max_entradas
+        self.version = None
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, version, clave, calcular):
+        """
+        Devuelve el valor memoizado para `clave` en `version` o lo calcula con `calcular()`.
+        Si la versión avanzó, vacía el caché antes de buscar; si es anterior a la del caché
+        (sesión que leyó la versión antes de una escritura), calcula sin guardar.
+        Los valores se comparten entre reruns y sesiones: quien los reciba no debe modificarlos.
+        """
+        with self._lock:
+            if self.version is None or version > self.version:
+                self._entradas.clear()
+                self.version = version
+            elif clave in self._entradas and version == self.version:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+
+        # Se calcula fuera del lock para no bloquear a las otras sesiones
+        valor = calcular()
+
+        with self._lock:
+            self.fallos += 1
+            # Si otra escritura cambió la versión mientras se calculaba, no se guarda
+            if version == self.version:
+                self._entradas[clave] = valor
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        """Descarta todas las entradas."""
+        with self._lock:
+            self._entradas.clear()
+            self.version = None
+
+    def __len__(self):
+        return len(self._entradas)
@@ -0,0 +1,135 @@
+# ============================================================
+# 🗃️ DATASET COMPARTIDO - RNI ENACOM
+# ============================================================
+# Una sola copia de la tabla maestra por proceso del servidor,
+# compartida por todas las sesiones de Streamlit. Cada versión
+# de datos es una instantánea de solo lectura: las altas,
+# ediciones y bajas arman una instantánea nueva (copy-on-write)
+# y las sesiones que todavía leen la anterior no se ven afectadas.
+# También mantiene el índice KD-tree de sitios (rni_sitios) de la
+# instantánea vigente: las altas lo extienden y el resto de los
+# cambios lo descartan hasta que se vuelva a pedir. La tabla se
+# carga recién cuando una vista necesita la tabla completa; el
+# resto de la app consulta rni.db por columnas o filas.
+# ============================================================
+
+import threading
+
+import pandas as pd
+
+from rni_db import (
+    load_tabla_maestra_from_db, version_datos, guardar_snapshot,
+    concatenar_tablas, agregar_categoria,
+)
+from rni_sitios import KDTREE_DISPONIBLE, IndiceSitios
+
+# Columnas cuya edición cambia las posiciones del índice de sitios
+COLUMNAS_SITIOS = {"Lat", "Lon", "CoordValida"}
+
+class DatasetCompartido:
+    """Tabla maestra compartida entre sesiones, versionada con rni_db.version_datos."""
+
+    def __init__(self):
+        self.version = None
+        self._df = pd.DataFrame()
+        # IndiceSitios de self._df (None = se arma al pedirlo)
+        self._sitios = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, version=None) -> pd.DataFrame:
+        """
+        Devuelve la instantánea de la versión de datos actual de rni.db (o de `version`,
+        si quien llama ya la leyó). Si la base avanzó por fuera de este proceso, se recarga
+        completa; una sesión que todavía está en una versión anterior recibe la vigente
+        (la instantánea no vuelve atrás). Es compartida: quien la reciba no debe modificarla.
+        """
+        if version is None:
+            version = version_datos()
+        with self._lock:
+            if self.version is None or version > self.version:
+                self._df = load_tabla_maestra_from_db()
+                self._sitios = None
+                self.version = version
+            return self._df
+
+    def indice_sitios(self, version=None):
+        """
+        IndiceSitios (KD-tree) de la instantánea vigente, o None sin scipy.
+        El índice es compartido: sus posiciones son filas de indice.df.
+        """
+        if not KDTREE_DISPONIBLE:
+            return None
+        df = self.snapshot(version)
+        with self._lock:
+            if self._sitios is None or self._sitios.df is not self._df:
+                self._sitios = IndiceSitios(df)
+            return self._sitios
+
+    def _aplicar(self, transformar, actualizar_sitios=None):
+        """
+        Arma la instantánea de la nueva versión después de una escritura en rni.db.
+        Si la base avanzó exactamente una versión se aplica transformar(df) sobre
+        la instantánea vigente; si no (otra escritura en el medio), se recarga.
+        actualizar_sitios(indice, df) pasa el índice de sitios a la instantánea
+        nueva (sin él, el índice se descarta). Si la tabla todavía no se cargó en
+        este proceso no se hace nada: la carga la primera vista que la necesite.
+        """
+        version = version_datos()
+        with self._lock:
+            if self.version is None:
+                return
+            if version == self.version + 1:
+                self._df = transformar(self._df)
+                if self._sitios is not None and actualizar_sitios is not None:
+                    self._sitios = actualizar_sitios(self._sitios, self._df)
+                else:
+                    self._sitios = None
+                # Snapshot Arrow de la versión nueva para el próximo arranque
+                guardar_snapshot(self._df, version)
+            elif version != self.version:
+                self._df = load_tabla_maestra_from_db()
+                self._sitios = None
+            self.version = version
+
+    def registrar_alta(self, df_nuevo: pd.DataFrame):
+        """Agrega el lote recién guardado con append_tabla_maestra_to_db."""
+        # Las filas nuevas quedan al final: el índice de sitios solo agrega esas
+        self._aplicar(lambda df: concatenar_tablas([df, df_nuevo]), lambda indice, df: indice.agregar(df))
+
+    def registrar_edicion(self, localidad: str, cambios: dict):
+        """Refleja actualizar_localidad_en_db: solo se reemplazan las columnas editadas."""
+        def transformar(df):
+            if "Localidad" not in df.columns:
+                return df
+            mask = df["Localidad"] == localidad
+            # Copia superficial: las columnas no editadas comparten buffers con la versión anterior
+            nuevo = df.copy(deep=False)
+            for col, valor in cambios.items():
+                if col in nuevo.columns:
+                    serie = df[col]
+                    if isinstance(serie.dtype, pd.CategoricalDtype):
+                        # Categórica: el valor nuevo se agrega a las categorías y el viejo se descarta si quedó sin uso
+                        nuevo[col] = agregar_categoria(serie, valor).mask(mask, valor).cat.remove_unused_categories()
+                    else:
+                        nuevo[col] = serie.mask(mask, valor)
+            return nuevo
+
+        def actualizar_sitios(indice, df):
+            # Mismas filas en el mismo orden: si no cambiaron coordenadas, el índice sigue valiendo
+            if COLUMNAS_SITIOS & set(cambios):
+                return None
+            indice.df = df
+            return indice
+        self._aplicar(transformar, actualizar_sitios)
+
+    def registrar_baja(self, localidad: str):
+        """Refleja eliminar_localidad_en_db."""
+        def transformar(df):
+            if "Localidad" not in df.columns:
+                return df
+            nuevo = df[df["Localidad"] != localidad].copy(deep=False)
+            for col in nuevo.columns:
+                if isinstance(nuevo[col].dtype, pd.CategoricalDtype):
+                    nuevo[col] = nuevo[col].cat.remove_unused_categories()
+            return nuevo
+        self._aplicar(transformar)
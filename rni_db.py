@@ -0,0 +1,1146 @@
+# ============================================================
+# 🗄️ PERSISTENCIA SQLITE - RNI ENACOM
+# ============================================================
+# Lectura y escritura de la tabla maestra en rni.db.
+# ============================================================
+
+import logging, os, sqlite3, uuid
+
+import pandas as pd
+import numpy as np
+from pandas.api.types import union_categoricals
+
+from rni_procesamiento import componer_fecha_hora, coordenada_con_signo, coordenadas_validas
+from rni_semaforo import banda_semaforo, porcentaje_limite
+from rni_mapa import NIVELES_CALOR, celdas_calor, tamaño_nivel, indices_celda, distancia_m, caja_radio
+from rni_resumen import COLUMNAS_ROLLUP, calcular_rollup
+import rni_parquet
+import rni_snapshot
+
+log = logging.getLogger(__name__)
+
+DB_FILE = "rni.db"
+TABLE_NAME = "tabla_maestra"
+
+EXPECTED_COLS = [
+    "CCTE", "Provincia", "Localidad",
+    "Resultado", "Fecha", "Hora",
+    "Nombre Archivo", "Expediente",
+    "Sonda", "Lat", "Lon",
+    "FechaCarga",
+    "FechaHora",
+    "Banda", "CoordValida",
+]
+
+# Versión del esquema tipado (PRAGMA user_version). 0 = tabla heredada creada por to_sql
+SCHEMA_VERSION = 10
+
+# Tipos SQLite de cada columna: números como REAL y fechas/horas como texto ISO 8601
+# (Fecha "YYYY-MM-DD", Hora "HH:MM:SS", FechaCarga y FechaHora "YYYY-MM-DD HH:MM:SS").
+# Banda (semáforo, -1 sin Resultado) y CoordValida (0/1) se calculan al ingresar.
+COLUMN_TYPES = {
+    "CCTE": "TEXT",
+    "Provincia": "TEXT",
+    "Localidad": "TEXT",
+    "Resultado": "REAL",
+    "Fecha": "TEXT",
+    "Hora": "TEXT",
+    "Nombre Archivo": "TEXT",
+    "Expediente": "TEXT",
+    "Sonda": "TEXT",
+    "Lat": "REAL",
+    "Lon": "REAL",
+    "FechaCarga": "TEXT",
+    "FechaHora": "TEXT",
+    "Banda": "INTEGER",
+    "CoordValida": "INTEGER",
+}
+
+# Columnas de texto repetidas en cada medición: en memoria son categóricas y en rni.db
+# se guardan como id de una tabla de dimensión (valor único por id)
+DIMENSIONES = {
+    "CCTE": "dim_ccte",
+    "Provincia": "dim_provincia",
+    "Localidad": "dim_localidad",
+    "Sonda": "dim_sonda",
+    "Expediente": "dim_expediente",
+    "Nombre Archivo": "dim_archivo",
+}
+COLUMNAS_CATEGORICAS = list(DIMENSIONES)
+
+# Tabla de hechos (ids de dimensión + valores medidos). tabla_maestra pasa a ser una
+# vista que la une con las dimensiones, con las mismas columnas de texto que antes.
+MEDICIONES_TABLE = "mediciones"
+
+def columna_id(col: str) -> str:
+    """Nombre de la columna de id de dimensión en la tabla de hechos ("CCTE" -> "CCTE_id")."""
+    return f"{col}_id"
+
+INDICES = {
+    "idx_tm_ccte_prov_loc": [columna_id("CCTE"), columna_id("Provincia"), columna_id("Localidad")],
+    "idx_tm_localidad": [columna_id("Localidad")],
+    "idx_tm_expediente": [columna_id("Expediente")],
+    "idx_tm_archivo": [columna_id("Nombre Archivo")],
+    "idx_tm_fecha": ["Fecha"],
+}
+
+# Pre-agregados por (localidad, expediente, archivo, día), ver rni_resumen.calcular_rollup.
+# Se mantienen en cada alta, edición o baja para que los resúmenes no lean mediciones crudas.
+ROLLUP_TABLE = "rollup_mediciones"
+
+ROLLUP_TYPES = {
+    "CCTE": "TEXT",
+    "Provincia": "TEXT",
+    "Localidad": "TEXT",
+    "Expediente": "TEXT",
+    "Nombre Archivo": "TEXT",
+    "Fecha": "TEXT",
+    "Mediciones": "INTEGER",
+    "Resultados": "INTEGER",
+    "PuntosConHora": "INTEGER",
+    "ResultadosConHora": "INTEGER",
+    "MaxResultado": "REAL",
+    "Inicio": "TEXT",
+    "Fin": "TEXT",
+    "Duracion": "REAL",  # segundos
+    "Sondas": "TEXT",
+}
+
+# Contador monótono de versión de datos: cada alta, edición o baja lo incrementa
+# dentro de su transacción. Los cachés de derivados de la app se indexan por él.
+META_TABLE = "metadatos"
+CLAVE_VERSION_DATOS = "version_datos"
+# Identificador aleatorio de la base: distingue snapshots de una rni.db borrada y recreada
+CLAVE_ID_BASE = "id_base"
+
+# Registro de archivos ingresados (hash SHA-256 del contenido), para no volver a
+# ingresar el mismo Excel. Una entrada se borra cuando su localidad deja de existir.
+REGISTRO_TABLE = "archivos_ingresados"
+REGISTRO_COLS = ["Hash", "Nombre Archivo", "Expediente", "Localidad", "FechaCarga"]
+
+# Pirámide del mapa de calor nacional (ver rni_mapa.celdas_calor): máximo % del límite y
+# cantidad de mediciones por celda de cada nivel, solo con coordenadas válidas y Resultado.
+# Cada alta o baja regenera únicamente las celdas que tocan sus puntos.
+CALOR_TABLE = "mapa_calor"
+# Columnas cuya edición obliga a regenerar la pirámide
+COLUMNAS_CALOR = {"Lat", "Lon", "Resultado", "CoordValida"}
+
+# Índice espacial R-tree de las mediciones con coordenadas válidas (id = id de la medición).
+# Lo mantienen triggers sobre la tabla de hechos, así cualquier alta, edición o baja lo actualiza.
+# Si el SQLite instalado no trae el módulo rtree, las consultas espaciales recorren Lat/Lon.
+RTREE_TABLE = "mediciones_rtree"
+
+def _rtree_disponible() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute('CREATE VIRTUAL TABLE "r" USING rtree("id", "x0", "x1")')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+RTREE_DISPONIBLE = _rtree_disponible()
+
+# Backend de las filas: "sqlite" (por defecto) o "parquet" (ver rni_parquet).
+# Con "parquet" las lecturas de filas van a los archivos particionados por Provincia/año;
+# rni.db sigue siendo la fuente de verdad (versión de datos y rollups) y se copia a Parquet.
+BACKEND = os.environ.get("RNI_BACKEND", "sqlite").strip().lower()
+
+# ============================================================
+# 🔄 CONVERSIÓN DE TIPOS
+# ============================================================
+
+def _parse_fecha(serie: pd.Series) -> pd.Series:
+    """Convierte Fecha a datetime64[ns]: primero ISO (formato de la base), luego dd/mm/aaaa."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        # Siempre en ns: Parquet y el snapshot no deben mezclar unidades entre lotes
+        return serie.astype("datetime64[ns]").dt.normalize()
+    texto = serie.where(serie.notna()).astype("string")
+    fechas = pd.to_datetime(texto, format="ISO8601", errors="coerce")
+    resto = fechas.isna() & texto.notna()
+    if resto.any():
+        fechas[resto] = pd.to_datetime(texto[resto], dayfirst=True, format="mixed", errors="coerce")
+    return fechas.astype("datetime64[ns]").dt.normalize()
+
+def _parse_fecha_hora(serie: pd.Series) -> pd.Series:
+    """Convierte un timestamp a datetime64[ns]: primero ISO (formato de la base), luego cualquier formato."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.astype("datetime64[ns]")
+    texto = serie.where(serie.notna()).astype("string")
+    fechas = pd.to_datetime(texto, format="ISO8601", errors="coerce")
+    resto = fechas.isna() & texto.notna()
+    if resto.any():
+        fechas[resto] = pd.to_datetime(texto[resto], format="mixed", errors="coerce")
+    return fechas.astype("datetime64[ns]")
+
+def _hora_a_texto(serie: pd.Series) -> pd.Series:
+    """Convierte Hora (time, datetime o texto) a texto "HH:MM:SS"."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime("%H:%M:%S").astype(object).where(serie.notna(), None)
+    texto = serie.where(serie.notna()).astype("string")
+    # Camino rápido: texto u objetos time ya en "HH:MM:SS" (lo habitual en la base y en los Excel)
+    resultado = texto.where(texto.str.fullmatch(r"\d{2}:\d{2}:\d{2}").fillna(False))
+    resto = resultado.isna() & texto.notna()
+    if resto.any():
+        horas = pd.to_datetime(texto[resto], format="mixed", errors="coerce")
+        resultado[resto] = horas.dt.strftime("%H:%M:%S")
+    return resultado.astype(object).where(resultado.notna(), None)
+
+def _a_categoria(serie: pd.Series) -> pd.Series:
+    """Convierte a categórica de texto con categorías en orden alfabético."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories
+        if categorias.is_monotonic_increasing and all(isinstance(c, str) for c in categorias):
+            return serie
+    serie = serie.astype("category")
+    textos = serie.cat.categories.map(str)
+    if textos.is_unique:
+        serie = serie.cat.rename_categories(textos)
+    else:
+        # Valores distintos con el mismo texto (ej. 5 y "5"): se unifican
+        serie = serie.astype(object).where(serie.isna(), serie.astype(str)).astype("category")
+    return serie.cat.reorder_categories(serie.cat.categories.sort_values())
+
+def codificar_categoricas(df: pd.DataFrame) -> pd.DataFrame:
+    """Pasa a categóricas las columnas de COLUMNAS_CATEGORICAS presentes en df."""
+    df = df.copy(deep=False)
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns:
+            df[col] = _a_categoria(df[col])
+    return df
+
+def agregar_categoria(serie: pd.Series, valor) -> pd.Series:
+    """Devuelve la categórica con `valor` entre sus categorías (manteniendo el orden alfabético)."""
+    if pd.isna(valor) or valor in serie.cat.categories:
+        return serie
+    return serie.cat.set_categories(serie.cat.categories.append(pd.Index([str(valor)])).sort_values())
+
+def concatenar_tablas(partes: list) -> pd.DataFrame:
+    """
+    Concatena tablas normalizadas conservando las columnas categóricas
+    (pd.concat las pasaría a object si las categorías difieren).
+    """
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    df = pd.concat(partes, ignore_index=True)
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns and all(col in p.columns for p in partes):
+            df[col] = _a_categoria(pd.Series(
+                union_categoricals([_a_categoria(p[col]).array for p in partes], sort_categories=True),
+                index=df.index, name=col,
+            ))
+    return df
+
+def normalizar_tabla_maestra(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve la tabla con las columnas esperadas y tipos consistentes:
+    Resultado float, Lat/Lon float con signo, Fecha/FechaCarga/FechaHora datetime64
+    (FechaCarga al segundo, como se guarda en la base), Hora texto "HH:MM:SS", Banda int8, CoordValida bool y
+    CCTE/Provincia/Localidad/Sonda/Expediente/Nombre Archivo categóricas.
+    FechaHora, Banda y CoordValida se toman de la base y solo se calculan donde faltan.
+    """
+    df = df.copy()
+    for col in EXPECTED_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+    for col in COLUMNAS_CATEGORICAS:
+        df[col] = _a_categoria(df[col])
+    df["Resultado"] = pd.to_numeric(df["Resultado"], errors="coerce").astype(float)
+    df["Lat"] = coordenada_con_signo(df["Lat"])
+    df["Lon"] = coordenada_con_signo(df["Lon"])
+    df["Fecha"] = _parse_fecha(df["Fecha"])
+    df["Hora"] = _hora_a_texto(df["Hora"])
+    df["FechaCarga"] = _parse_fecha_hora(df["FechaCarga"]).dt.floor("s")
+    fecha_hora = _parse_fecha_hora(df["FechaHora"])
+    faltantes = fecha_hora.isna()
+    if faltantes.any():
+        fecha_hora[faltantes] = componer_fecha_hora(df.loc[faltantes, "Fecha"], df.loc[faltantes, "Hora"])
+    df["FechaHora"] = fecha_hora
+    banda = pd.to_numeric(df["Banda"], errors="coerce")
+    faltantes = banda.isna()
+    if faltantes.any():
+        banda[faltantes] = banda_semaforo(df.loc[faltantes, "Resultado"])
+    df["Banda"] = banda.astype(np.int8)
+    valida = pd.to_numeric(df["CoordValida"], errors="coerce")
+    faltantes = valida.isna()
+    if faltantes.any():
+        valida[faltantes] = coordenadas_validas(df.loc[faltantes, "Lat"], df.loc[faltantes, "Lon"]).astype(float)
+    df["CoordValida"] = valida.astype(bool)
+    return df
+
+def _a_formato_db(conn, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Prepara las columnas esperadas para insertarlas en la tabla de hechos:
+    fechas como texto ISO y columnas categóricas como id de su dimensión.
+    """
+    df = normalizar_tabla_maestra(df)[EXPECTED_COLS]
+    for col in DIMENSIONES:
+        df[col] = _ids_dimension(conn, col, df[col])
+    df["Fecha"] = df["Fecha"].dt.strftime("%Y-%m-%d")
+    df["FechaCarga"] = df["FechaCarga"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["FechaHora"] = df["FechaHora"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["CoordValida"] = df["CoordValida"].astype(np.int8)
+    return df.astype(object).where(df.notna(), None)
+
+# ============================================================
+# 🏗️ ESQUEMA Y MIGRACIÓN
+# ============================================================
+
+def _tablas_en_db(conn) -> list:
+    """Devuelve los nombres de las tablas existentes en la base."""
+    return [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+
+def _columnas_tabla(conn, tabla: str) -> set:
+    """Nombres de las columnas de una tabla."""
+    return {r[1] for r in conn.execute(f'PRAGMA table_info("{tabla}")')}
+
+def _normalizar_columnas_legacy(df: pd.DataFrame) -> pd.DataFrame:
+    """Renombra columnas de bases viejas (ccte / nombre_archivo / latitud / etc.)."""
+    # --- Normalizamos nombres de columnas (ccte / CCTE / CCTE_ / etc.) ---
+    col_map = {}
+    for c in df.columns:
+        key = c.strip().lower().replace("ó", "o").replace("í", "i")
+        if key == "ccte":
+            col_map[c] = "CCTE"
+        elif key == "provincia":
+            col_map[c] = "Provincia"
+        elif key == "localidad":
+            col_map[c] = "Localidad"
+        elif key in ("resultado", "resultado_con_incertidumbre"):
+            col_map[c] = "Resultado"
+        elif key == "fecha":
+            col_map[c] = "Fecha"
+        elif key in ("hora", "time"):
+            col_map[c] = "Hora"
+        elif key in ("nombrearchivo", "nombre_archivo", "archivo"):
+            col_map[c] = "Nombre Archivo"
+        elif key == "expediente":
+            col_map[c] = "Expediente"
+        elif key in ("sonda", "sonda_utilizada"):
+            col_map[c] = "Sonda"
+        elif key in ("lat", "latitud"):
+            col_map[c] = "Lat"
+        elif key in ("lon", "longitud"):
+            col_map[c] = "Lon"
+        elif key.lower() in ("fechacarga", "fecha_carga"):
+            col_map[c] = "FechaCarga"
+
+    if col_map:
+        df = df.rename(columns=col_map)
+
+    # Creamos columnas faltantes como NaN para que el resto del código no explote
+    for col in EXPECTED_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+
+    return df
+
+def _columnas_hechos() -> list:
+    """Columnas de la tabla de hechos, en el orden de EXPECTED_COLS."""
+    return [columna_id(c) if c in DIMENSIONES else c for c in EXPECTED_COLS]
+
+def _crear_esquema(conn):
+    """
+    Crea las tablas de dimensión, la tabla de hechos (id explícito para que el rowid
+    sea estable), sus índices de filtrado y la vista tabla_maestra.
+    """
+    for dim in DIMENSIONES.values():
+        conn.execute(f'CREATE TABLE "{dim}" ("id" INTEGER PRIMARY KEY, "valor" TEXT NOT NULL UNIQUE)')
+
+    columnas = []
+    for col, tipo in COLUMN_TYPES.items():
+        if col in DIMENSIONES:
+            columnas.append(f'"{columna_id(col)}" INTEGER REFERENCES "{DIMENSIONES[col]}" ("id")')
+        else:
+            columnas.append(f'"{col}" {tipo}')
+    lista = ",\n    ".join(columnas)
+    conn.execute(f'CREATE TABLE "{MEDICIONES_TABLE}" (\n    "id" INTEGER PRIMARY KEY,\n    {lista}\n)')
+
+    for nombre, cols in INDICES.items():
+        lista = ", ".join(f'"{c}"' for c in cols)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{nombre}" ON "{MEDICIONES_TABLE}" ({lista})')
+
+    _crear_vista(conn)
+
+def _crear_vista(conn):
+    """Vista con las columnas de texto de siempre (y los ids, para leer categóricas sin texto)."""
+    valores = ", ".join(f'd{i}."valor" AS "{col}"' for i, col in enumerate(DIMENSIONES))
+    joins = "\n".join(
+        f'LEFT JOIN "{dim}" d{i} ON d{i}."id" = m."{columna_id(col)}"'
+        for i, (col, dim) in enumerate(DIMENSIONES.items())
+    )
+    conn.execute(f'CREATE VIEW "{TABLE_NAME}" AS\nSELECT m.*, {valores}\nFROM "{MEDICIONES_TABLE}" m\n{joins}')
+
+def _ids_dimension(conn, col: str, categorica: pd.Series) -> pd.Series:
+    """
+    Devuelve el id de dimensión de cada fila de una columna categórica (creando
+    los valores que falten). Solo se buscan las categorías; las filas se resuelven por código.
+    """
+    dim = DIMENSIONES[col]
+    categorias = list(categorica.cat.categories)
+    conn.executemany(f'INSERT OR IGNORE INTO "{dim}" ("valor") VALUES (?)', ((c,) for c in categorias))
+    ids = dict(conn.execute(f'SELECT "valor", "id" FROM "{dim}"'))
+    por_codigo = np.array([ids[c] for c in categorias] + [0], dtype=np.int64)
+    codigos = categorica.cat.codes.to_numpy()
+    # Código -1 (nulo) cae en la última posición y se reemplaza por None
+    return pd.Series(por_codigo[codigos], index=categorica.index, dtype=object).where(codigos >= 0, None)
+
+def _id_valor(conn, col: str, valor):
+    """Id de dimensión de un valor suelto (lo crea si no existe); None para nulos."""
+    if valor is None or pd.isna(valor):
+        return None
+    dim = DIMENSIONES[col]
+    conn.execute(f'INSERT OR IGNORE INTO "{dim}" ("valor") VALUES (?)', (str(valor),))
+    return conn.execute(f'SELECT "id" FROM "{dim}" WHERE "valor" = ?', (str(valor),)).fetchone()[0]
+
+def _podar_dimensiones(conn):
+    """Borra valores de dimensión que ya no usa ninguna medición."""
+    for col, dim in DIMENSIONES.items():
+        conn.execute(
+            f'DELETE FROM "{dim}" WHERE "id" NOT IN '
+            f'(SELECT DISTINCT "{columna_id(col)}" FROM "{MEDICIONES_TABLE}" WHERE "{columna_id(col)}" IS NOT NULL)'
+        )
+
+def _registrar_archivos(conn, archivos):
+    """Agrega archivos al registro (dicts con las claves de REGISTRO_COLS; sin commit)."""
+    marcas = ", ".join("?" for _ in REGISTRO_COLS)
+    lista = ", ".join(f'"{c}"' for c in REGISTRO_COLS)
+    conn.executemany(
+        f'INSERT OR IGNORE INTO "{REGISTRO_TABLE}" ({lista}) VALUES ({marcas})',
+        [tuple(None if pd.isna(a.get(c)) else str(a.get(c)) for c in REGISTRO_COLS) for a in archivos],
+    )
+
+def _podar_registro(conn):
+    """Borra del registro los archivos cuya localidad ya no tiene mediciones (se pueden volver a cargar)."""
+    conn.execute(
+        f'DELETE FROM "{REGISTRO_TABLE}" WHERE "Localidad" NOT IN (SELECT "valor" FROM "{DIMENSIONES["Localidad"]}")'
+    )
+
+def _insertar_filas(conn, df: pd.DataFrame):
+    """Inserta filas en la tabla de hechos (sin commit: lo maneja quien llama)."""
+    if df is None or df.empty:
+        return
+    filas = _a_formato_db(conn, df)
+    columnas = ", ".join(f'"{c}"' for c in _columnas_hechos())
+    marcas = ", ".join("?" for _ in EXPECTED_COLS)
+    conn.executemany(
+        f'INSERT INTO "{MEDICIONES_TABLE}" ({columnas}) VALUES ({marcas})',
+        filas.itertuples(index=False, name=None),
+    )
+    return filas
+
+def _migrar_desde_legacy(conn):
+    """Crea el esquema actual copiando los datos de la tabla heredada (si la hay)."""
+    tablas = _tablas_en_db(conn)
+    if TABLE_NAME in tablas:
+        tabla_legacy = TABLE_NAME
+    elif len(tablas) == 1:
+        # Base vieja con una sola tabla de otro nombre: la usamos igual
+        tabla_legacy = tablas[0]
+    else:
+        tabla_legacy = None
+
+    df_legacy = None
+    if tabla_legacy is not None:
+        df_legacy = _normalizar_columnas_legacy(pd.read_sql(f'SELECT * FROM "{tabla_legacy}"', conn))
+        conn.execute(f'DROP TABLE "{tabla_legacy}"')
+    _crear_esquema(conn)
+    _insertar_filas(conn, df_legacy)
+
+def _migrar_v1_a_v2(conn):
+    """v2: agrega FechaHora (ISO) y la completa a partir de Fecha + Hora."""
+    conn.execute(f'ALTER TABLE "{TABLE_NAME}" ADD COLUMN "FechaHora" TEXT')
+    conn.execute(
+        f'UPDATE "{TABLE_NAME}" SET "FechaHora" = "Fecha" || \' \' || "Hora" '
+        'WHERE "Fecha" IS NOT NULL AND "Hora" IS NOT NULL'
+    )
+
+def _crear_tabla_rollup(conn):
+    """Crea la tabla de rollups con sus índices de filtrado."""
+    columnas = ",\n    ".join(f'"{col}" {tipo}' for col, tipo in ROLLUP_TYPES.items())
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{ROLLUP_TABLE}" (\n    {columnas}\n)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_ru_ccte_prov_loc" ON "{ROLLUP_TABLE}" ("CCTE", "Provincia", "Localidad")')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_ru_localidad" ON "{ROLLUP_TABLE}" ("Localidad")')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_ru_fecha" ON "{ROLLUP_TABLE}" ("Fecha")')
+
+def _migrar_v2_a_v3(conn):
+    """
+    v3: crea rollup_mediciones. Se completa al final de asegurar_esquema:
+    _recalcular_rollup lee la tabla de hechos, que recién existe desde v6.
+    """
+    _crear_tabla_rollup(conn)
+
+def _migrar_v3_a_v4(conn):
+    """v4: crea la tabla de metadatos con el contador de versión de datos."""
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{META_TABLE}" ("clave" TEXT PRIMARY KEY, "valor" INTEGER)')
+    conn.execute(
+        f'INSERT OR IGNORE INTO "{META_TABLE}" ("clave", "valor") VALUES (?, 0)',
+        (CLAVE_VERSION_DATOS,),
+    )
+
+def _migrar_v4_a_v5(conn):
+    """v5: agrega el identificador de la base a los metadatos."""
+    conn.execute(
+        f'INSERT OR IGNORE INTO "{META_TABLE}" ("clave", "valor") VALUES (?, ?)',
+        (CLAVE_ID_BASE, uuid.uuid4().int >> 65),
+    )
+
+def _crear_registro(conn):
+    """Crea la tabla del registro de archivos ingresados (Hash como clave)."""
+    columnas = ", ".join(
+        '"Hash" TEXT PRIMARY KEY' if c == "Hash" else f'"{c}" TEXT' for c in REGISTRO_COLS
+    )
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{REGISTRO_TABLE}" ({columnas})')
+
+def _migrar_v5_a_v6(conn):
+    """v6: pasa tabla_maestra a tabla de hechos con ids + tablas de dimensión + vista."""
+    anterior = f"_{TABLE_NAME}_v5"
+    conn.execute(f'ALTER TABLE "{TABLE_NAME}" RENAME TO "{anterior}"')
+    # Los índices viejos se mueven con la tabla renombrada y chocarían con los nuevos
+    for nombre in INDICES:
+        conn.execute(f'DROP INDEX IF EXISTS "{nombre}"')
+    _crear_esquema(conn)
+
+    for col, dim in DIMENSIONES.items():
+        conn.execute(
+            f'INSERT OR IGNORE INTO "{dim}" ("valor") '
+            f'SELECT DISTINCT CAST("{col}" AS TEXT) FROM "{anterior}" WHERE "{col}" IS NOT NULL'
+        )
+    destino = ", ".join(f'"{c}"' for c in ["id"] + _columnas_hechos())
+    # Las columnas que agregan versiones posteriores quedan en NULL (las completa su migración)
+    existentes = _columnas_tabla(conn, anterior)
+    origen = ", ".join(
+        f'(SELECT "id" FROM "{DIMENSIONES[c]}" WHERE "valor" = CAST(o."{c}" AS TEXT))' if c in DIMENSIONES
+        else f'o."{c}"' if c in existentes
+        else "NULL"
+        for c in EXPECTED_COLS
+    )
+    conn.execute(f'INSERT INTO "{MEDICIONES_TABLE}" ({destino}) SELECT o."id", {origen} FROM "{anterior}" o')
+    conn.execute(f'DROP TABLE "{anterior}"')
+
+def _migrar_v6_a_v7(conn):
+    """v7: crea el registro de archivos ingresados (los archivos anteriores no tienen hash)."""
+    _crear_registro(conn)
+
+def _migrar_v7_a_v8(conn):
+    """
+    v8: Lat/Lon pasan a guardarse con signo y se agregan Banda y CoordValida,
+    calculadas una sola vez para las mediciones existentes.
+    """
+    existentes = _columnas_tabla(conn, MEDICIONES_TABLE)
+    for col in ("Banda", "CoordValida"):
+        if col not in existentes:
+            conn.execute(f'ALTER TABLE "{MEDICIONES_TABLE}" ADD COLUMN "{col}" {COLUMN_TYPES[col]}')
+    conn.execute(f'UPDATE "{MEDICIONES_TABLE}" SET "Lat" = -abs("Lat"), "Lon" = -abs("Lon")')
+    df = pd.read_sql(f'SELECT "id", "Resultado", "Lat", "Lon" FROM "{MEDICIONES_TABLE}"', conn)
+    filas = zip(
+        banda_semaforo(df["Resultado"]).tolist(),
+        coordenadas_validas(df["Lat"], df["Lon"]).astype(int).tolist(),
+        df["id"].tolist(),
+    )
+    conn.executemany(f'UPDATE "{MEDICIONES_TABLE}" SET "Banda" = ?, "CoordValida" = ? WHERE "id" = ?', filas)
+    # La vista se vuelve a crear para que m.* incluya las columnas nuevas
+    conn.execute(f'DROP VIEW IF EXISTS "{TABLE_NAME}"')
+    _crear_vista(conn)
+    # Cambiaron los datos: invalida el snapshot Arrow y el directorio Parquet
+    _incrementar_version(conn)
+
+def _migrar_v8_a_v9(conn):
+    """v9: crea la pirámide del mapa de calor y la completa con toda la tabla."""
+    _crear_tabla_calor(conn)
+    _recalcular_mapa_calor(conn)
+
+def _crear_rtree(conn):
+    """Crea el R-tree de coordenadas, sus triggers de sincronización y lo completa con las mediciones actuales."""
+    conn.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS "{RTREE_TABLE}" USING rtree("id", "min_lon", "max_lon", "min_lat", "max_lat")'
+    )
+    conn.execute(
+        f'CREATE TRIGGER IF NOT EXISTS "trg_rtree_alta" AFTER INSERT ON "{MEDICIONES_TABLE}" '
+        f'WHEN NEW."CoordValida" = 1 BEGIN '
+        f'INSERT INTO "{RTREE_TABLE}" VALUES (NEW."id", NEW."Lon", NEW."Lon", NEW."Lat", NEW."Lat"); END'
+    )
+    conn.execute(
+        f'CREATE TRIGGER IF NOT EXISTS "trg_rtree_baja" AFTER DELETE ON "{MEDICIONES_TABLE}" BEGIN '
+        f'DELETE FROM "{RTREE_TABLE}" WHERE "id" = OLD."id"; END'
+    )
+    conn.execute(
+        f'CREATE TRIGGER IF NOT EXISTS "trg_rtree_edicion" AFTER UPDATE OF "Lat", "Lon", "CoordValida" '
+        f'ON "{MEDICIONES_TABLE}" BEGIN '
+        f'DELETE FROM "{RTREE_TABLE}" WHERE "id" = OLD."id"; '
+        f'INSERT INTO "{RTREE_TABLE}" SELECT NEW."id", NEW."Lon", NEW."Lon", NEW."Lat", NEW."Lat" '
+        f'WHERE NEW."CoordValida" = 1; END'
+    )
+    conn.execute(f'DELETE FROM "{RTREE_TABLE}"')
+    conn.execute(
+        f'INSERT INTO "{RTREE_TABLE}" SELECT "id", "Lon", "Lon", "Lat", "Lat" '
+        f'FROM "{MEDICIONES_TABLE}" WHERE "CoordValida" = 1'
+    )
+
+def _migrar_v9_a_v10(conn):
+    """v10: índice espacial R-tree de las coordenadas (si el SQLite lo soporta)."""
+    if RTREE_DISPONIBLE:
+        _crear_rtree(conn)
+
+def _incrementar_version(conn):
+    """Incrementa la versión de datos. No hace commit: corre dentro de la transacción de quien llama."""
+    conn.execute(
+        f'UPDATE "{META_TABLE}" SET "valor" = "valor" + 1 WHERE "clave" = ?',
+        (CLAVE_VERSION_DATOS,),
+    )
+
+def _recalcular_rollup(conn, localidades=None):
+    """
+    Recalcula los rollups de las localidades indicadas (None = toda la tabla)
+    a partir de tabla_maestra. No hace commit: corre dentro de la transacción de quien llama.
+    """
+    if localidades is None:
+        conn.execute(f'DELETE FROM "{ROLLUP_TABLE}"')
+        consultas = [("", [])]
+    else:
+        consultas = []
+        for localidad in dict.fromkeys(localidades):
+            conn.execute(f'DELETE FROM "{ROLLUP_TABLE}" WHERE "Localidad" IS ?', (localidad,))
+            consultas.append((' WHERE "Localidad" IS ?', [localidad]))
+
+    marcas = ", ".join("?" for _ in COLUMNAS_ROLLUP)
+    lista = ", ".join(f'"{c}"' for c in COLUMNAS_ROLLUP)
+    for where, params in consultas:
+        df = _leer_mediciones(conn, where, params)
+        if df.empty:
+            continue
+        rollup = calcular_rollup(normalizar_tabla_maestra(df))
+        rollup["Fecha"] = rollup["Fecha"].dt.strftime("%Y-%m-%d")
+        rollup["Inicio"] = rollup["Inicio"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        rollup["Fin"] = rollup["Fin"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        rollup = rollup.astype(object).where(rollup.notna(), None)
+        conn.executemany(
+            f'INSERT INTO "{ROLLUP_TABLE}" ({lista}) VALUES ({marcas})',
+            rollup.itertuples(index=False, name=None),
+        )
+
+def _crear_tabla_calor(conn):
+    """Crea la tabla de la pirámide del mapa de calor (una fila por nivel y celda)."""
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{CALOR_TABLE}" ('
+        '"Nivel" INTEGER, "ix" INTEGER, "iy" INTEGER, "MaxPct" REAL, "Mediciones" INTEGER, '
+        'PRIMARY KEY ("Nivel", "ix", "iy")) WITHOUT ROWID'
+    )
+
+def _recalcular_mapa_calor(conn, puntos=None):
+    """
+    Regenera las celdas del mapa de calor que contienen los puntos dados (DataFrame con
+    Lat, Lon y CoordValida; None = toda la pirámide). Las celdas se recalculan con las
+    mediciones de la caja de celdas de 1° (nivel 0) que las cubre, que contiene por
+    completo a las celdas de todos los niveles. No hace commit.
+    """
+    condicion, params = ' WHERE "CoordValida" = 1 AND "Resultado" IS NOT NULL', []
+    if puntos is None:
+        conn.execute(f'DELETE FROM "{CALOR_TABLE}"')
+    else:
+        validos = pd.to_numeric(puntos["CoordValida"], errors="coerce") == 1
+        lat = pd.to_numeric(puntos.loc[validos, "Lat"], errors="coerce").to_numpy(dtype=float)
+        lon = pd.to_numeric(puntos.loc[validos, "Lon"], errors="coerce").to_numpy(dtype=float)
+        if len(lat) == 0:
+            return
+        condicion += ' AND "Lat" >= ? AND "Lat" < ? AND "Lon" >= ? AND "Lon" < ?'
+        params = [np.floor(lat.min()), np.floor(lat.max()) + 1, np.floor(lon.min()), np.floor(lon.max()) + 1]
+
+    mediciones = pd.read_sql(
+        f'SELECT "Lat", "Lon", "Resultado" FROM "{MEDICIONES_TABLE}"{condicion}', conn, params=params
+    )
+    porcentaje = porcentaje_limite(mediciones["Resultado"].to_numpy(dtype=float))
+    for nivel in NIVELES_CALOR:
+        celdas = celdas_calor(mediciones["Lat"], mediciones["Lon"], porcentaje, nivel)
+        if puntos is not None:
+            # Solo las celdas tocadas: se borran y se vuelven a escribir las que siguen con mediciones
+            ix, iy = indices_celda(lat, lon, tamaño_nivel(nivel))
+            tocadas = pd.DataFrame({"ix": ix, "iy": iy}).drop_duplicates()
+            conn.executemany(
+                f'DELETE FROM "{CALOR_TABLE}" WHERE "Nivel" = ? AND "ix" = ? AND "iy" = ?',
+                ((nivel, int(x), int(y)) for x, y in tocadas.itertuples(index=False, name=None)),
+            )
+            celdas = celdas.merge(tocadas, on=["ix", "iy"])
+        conn.executemany(
+            f'INSERT INTO "{CALOR_TABLE}" ("Nivel", "ix", "iy", "MaxPct", "Mediciones") VALUES (?, ?, ?, ?, ?)',
+            (
+                (nivel, int(x), int(y), float(p), int(n))
+                for x, y, p, n in celdas[["ix", "iy", "MaxPct", "Mediciones"]].itertuples(index=False, name=None)
+            ),
+        )
+
+def _decodificar_dimension(conn, col: str, ids: pd.Series) -> pd.Series:
+    """Arma la categórica de una columna a partir de sus ids y la tabla de dimensión (sin leer texto por fila)."""
+    dim = pd.read_sql(f'SELECT "id", "valor" FROM "{DIMENSIONES[col]}" ORDER BY "valor"', conn)
+    ids = pd.to_numeric(ids, errors="coerce").fillna(0).astype(np.int64).to_numpy()
+    tope = max(int(ids.max()) if len(ids) else 0, int(dim["id"].max()) if not dim.empty else 0)
+    posicion = np.full(tope + 1, -1, dtype=np.int32)
+    posicion[dim["id"].to_numpy(dtype=np.int64)] = np.arange(len(dim), dtype=np.int32)
+    categorica = pd.Categorical.from_codes(posicion[ids], categories=dim["valor"].astype(str).tolist())
+    return pd.Series(categorica, name=col)
+
+def _leer_mediciones(conn, where: str = "", params=(), columnas=None, orden: str = '"id"', limite=None) -> pd.DataFrame:
+    """
+    Lee filas de tabla_maestra (con el WHERE de _where_filtros) trayendo los ids de
+    dimensión en lugar del texto; las columnas de dimensión vuelven como categóricas.
+    """
+    columnas = list(columnas or EXPECTED_COLS)
+    lista = ", ".join(f'"{columna_id(c)}"' if c in DIMENSIONES else f'"{c}"' for c in columnas)
+    consulta = f'SELECT {lista} FROM "{TABLE_NAME}"{where} ORDER BY {orden}'
+    if limite is not None:
+        consulta += f" LIMIT {int(limite)}"
+    df = pd.read_sql(consulta, conn, params=list(params))
+    for col in columnas:
+        if col in DIMENSIONES:
+            df[col] = _decodificar_dimension(conn, col, df.pop(columna_id(col))).values
+    return df[columnas]
+
+def asegurar_esquema(conn):
+    """
+    Crea el esquema tipado si no existe, migra bases heredadas
+    (tabla creada por to_sql, con cualquier nombre de columnas) y aplica
+    las migraciones de versión pendientes, todo en una transacción.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    with conn:
+        conn.execute("BEGIN")
+        if version == 0:
+            # Crea directamente el esquema actual (dimensiones + hechos + vista)
+            _migrar_desde_legacy(conn)
+        elif version < 2:
+            _migrar_v1_a_v2(conn)
+        if version < 3:
+            _migrar_v2_a_v3(conn)
+        if version < 4:
+            _migrar_v3_a_v4(conn)
+        if version < 5:
+            _migrar_v4_a_v5(conn)
+        if 0 < version < 6:
+            _migrar_v5_a_v6(conn)
+        if version < 7:
+            _migrar_v6_a_v7(conn)
+        if 0 < version < 8:
+            _migrar_v7_a_v8(conn)
+        if version < 9:
+            _migrar_v8_a_v9(conn)
+        if version < 10:
+            _migrar_v9_a_v10(conn)
+        if version < 3:
+            # Con el esquema ya actualizado (ids de dimensión, coordenadas con signo)
+            _recalcular_rollup(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def _conectar():
+    """Abre rni.db asegurando el esquema tipado."""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        asegurar_esquema(conn)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+# ============================================================
+# 🧱 BACKEND PARQUET
+# ============================================================
+
+def _usa_parquet() -> bool:
+    return BACKEND == "parquet" and rni_parquet.PARQUET_DISPONIBLE
+
+def _meta_en_conn(conn, clave: str) -> int:
+    fila = conn.execute(f'SELECT "valor" FROM "{META_TABLE}" WHERE "clave" = ?', (clave,)).fetchone()
+    return int(fila[0]) if fila else 0
+
+def _version_en_conn(conn) -> int:
+    return _meta_en_conn(conn, CLAVE_VERSION_DATOS)
+
+def _reconstruir_parquet(conn, version: int):
+    """Reescribe todo el dataset Parquet desde tabla_maestra."""
+    df = _leer_mediciones(conn)
+    rni_parquet.save_tabla_maestra_to_parquet(normalizar_tabla_maestra(df)[EXPECTED_COLS])
+    rni_parquet.marcar_version(version)
+
+def _sincronizar_parquet(conn):
+    """Antes de leer: si Parquet quedó atrás de rni.db (u no existe), se reconstruye."""
+    version = _version_en_conn(conn)
+    if rni_parquet.version_parquet() != version:
+        _reconstruir_parquet(conn, version)
+
+def _parquet_despues_de_escribir(conn, aplicar):
+    """
+    Después de una escritura en rni.db: si Parquet estaba en la versión anterior,
+    aplica solo el cambio (aplicar()); si no, reconstruye todo.
+    El cambio ya quedó confirmado en rni.db: si Parquet falla no se propaga el error,
+    se registra y el directorio queda marcado para reconstruirse en la próxima lectura.
+    """
+    if not _usa_parquet():
+        return
+    try:
+        version = _version_en_conn(conn)
+        if rni_parquet.version_parquet() == version - 1:
+            aplicar()
+            rni_parquet.marcar_version(version)
+        else:
+            _reconstruir_parquet(conn, version)
+    except Exception:
+        log.exception("No se pudo actualizar %s; se reconstruye en la próxima lectura", rni_parquet.PARQUET_DIR)
+        rni_parquet.marcar_desactualizado()
+
+# ============================================================
+# 📂 LECTURA / ESCRITURA
+# ============================================================
+
+def load_tabla_maestra_from_db() -> pd.DataFrame:
+    """
+    Carga tabla_maestra desde SQLite. Si no existe, devuelve DF vacío.
+    Si hay un snapshot Arrow de la versión de datos actual se mapea en memoria
+    (ver rni_snapshot); si no, se lee de la base y se deja escrito el snapshot.
+    """
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame()
+    conn = _conectar()
+    try:
+        # Versión y filas en la misma transacción de lectura
+        conn.execute("BEGIN")
+        version = _version_en_conn(conn)
+        id_base = _meta_en_conn(conn, CLAVE_ID_BASE)
+        df = rni_snapshot.leer_snapshot(version, id_base)
+        if df is not None:
+            return df
+        if _usa_parquet():
+            _sincronizar_parquet(conn)
+            df = rni_parquet.load_tabla_maestra_from_parquet()
+        else:
+            df = _leer_mediciones(conn)
+        if df.empty:
+            return pd.DataFrame()
+        df = normalizar_tabla_maestra(df)[EXPECTED_COLS]
+        rni_snapshot.escribir_snapshot(df, version, id_base)
+        return df
+    finally:
+        conn.close()
+
+def version_datos() -> int:
+    """Devuelve la versión de datos actual de rni.db (0 si la base no existe)."""
+    if not os.path.exists(DB_FILE):
+        return 0
+    conn = _conectar()
+    try:
+        return _version_en_conn(conn)
+    finally:
+        conn.close()
+
+def guardar_snapshot(df: pd.DataFrame, version: int):
+    """Escribe el snapshot Arrow de la tabla completa ya armada en memoria para `version`."""
+    if df.empty or not os.path.exists(DB_FILE):
+        return
+    conn = _conectar()
+    try:
+        id_base = _meta_en_conn(conn, CLAVE_ID_BASE)
+    finally:
+        conn.close()
+    rni_snapshot.escribir_snapshot(df, version, id_base)
+
+def save_tabla_maestra_to_db(df: pd.DataFrame):
+    """Guarda toda la tabla_maestra en SQLite, reemplazando el contenido."""
+    if df is None:
+        return
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(f'DELETE FROM "{MEDICIONES_TABLE}"')
+            _insertar_filas(conn, df)
+            _podar_dimensiones(conn)
+            _podar_registro(conn)
+            _recalcular_rollup(conn)
+            _recalcular_mapa_calor(conn)
+            _incrementar_version(conn)
+        _parquet_despues_de_escribir(
+            conn, lambda: rni_parquet.save_tabla_maestra_to_parquet(normalizar_tabla_maestra(df)[EXPECTED_COLS])
+        )
+    finally:
+        conn.close()
+
+def append_tabla_maestra_to_db(df_nuevo: pd.DataFrame, archivos=None):
+    """
+    Agrega un lote nuevo al final de tabla_maestra en una sola transacción,
+    sin reescribir las filas existentes (costo proporcional al lote).
+    `archivos` (dicts con las claves de REGISTRO_COLS) se anotan en el registro
+    de archivos ingresados dentro de la misma transacción.
+    """
+    if df_nuevo is None or df_nuevo.empty:
+        return
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            filas = _insertar_filas(conn, df_nuevo)
+            if archivos:
+                _registrar_archivos(conn, archivos)
+            # Solo se recalculan los rollups de las localidades del lote y las celdas de sus puntos
+            _recalcular_rollup(conn, df_nuevo["Localidad"].tolist() if "Localidad" in df_nuevo.columns else [None])
+            _recalcular_mapa_calor(conn, filas)
+            _incrementar_version(conn)
+        _parquet_despues_de_escribir(
+            conn, lambda: rni_parquet.append_tabla_maestra_to_parquet(normalizar_tabla_maestra(df_nuevo)[EXPECTED_COLS])
+        )
+    finally:
+        conn.close()
+
+def actualizar_localidad_en_db(localidad: str, cambios: dict):
+    """Actualiza solo las filas de una localidad con UPDATE ... WHERE Localidad=?."""
+    cambios = {col: valor for col, valor in cambios.items() if col in COLUMN_TYPES}
+    if not cambios:
+        return
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            # Las columnas de dimensión se actualizan por id (creando el valor nuevo si hace falta)
+            asignaciones, valores = [], []
+            for col, valor in cambios.items():
+                if col in DIMENSIONES:
+                    asignaciones.append(f'"{columna_id(col)}" = ?')
+                    valores.append(_id_valor(conn, col, valor))
+                else:
+                    asignaciones.append(f'"{col}" = ?')
+                    valores.append(valor)
+            conn.execute(
+                f'UPDATE "{MEDICIONES_TABLE}" SET {", ".join(asignaciones)} WHERE "{columna_id("Localidad")}" = '
+                f'(SELECT "id" FROM "{DIMENSIONES["Localidad"]}" WHERE "valor" = ?)',
+                [*valores, localidad],
+            )
+            _podar_dimensiones(conn)
+            if "Localidad" in cambios:
+                conn.execute(
+                    f'UPDATE "{REGISTRO_TABLE}" SET "Localidad" = ? WHERE "Localidad" = ?',
+                    (cambios["Localidad"], localidad),
+                )
+            _podar_registro(conn)
+            _recalcular_rollup(conn, [localidad, cambios.get("Localidad", localidad)])
+            if COLUMNAS_CALOR & set(cambios):
+                _recalcular_mapa_calor(conn)
+            _incrementar_version(conn)
+        _parquet_despues_de_escribir(conn, lambda: rni_parquet.actualizar_localidad_en_parquet(localidad, cambios))
+    finally:
+        conn.close()
+
+def eliminar_localidad_en_db(localidad: str):
+    """Borra las filas de una localidad con DELETE ... WHERE Localidad=?."""
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            where = (
+                f' WHERE "{columna_id("Localidad")}" = '
+                f'(SELECT "id" FROM "{DIMENSIONES["Localidad"]}" WHERE "valor" = ?)'
+            )
+            # Puntos que se borran: sus celdas del mapa de calor se regeneran después del DELETE
+            borrados = pd.read_sql(
+                f'SELECT "Lat", "Lon", "CoordValida" FROM "{MEDICIONES_TABLE}"{where}', conn, params=[localidad]
+            )
+            conn.execute(f'DELETE FROM "{MEDICIONES_TABLE}"{where}', (localidad,))
+            _podar_dimensiones(conn)
+            _podar_registro(conn)
+            conn.execute(f'DELETE FROM "{ROLLUP_TABLE}" WHERE "Localidad" IS ?', (localidad,))
+            _recalcular_mapa_calor(conn, borrados)
+            _incrementar_version(conn)
+        _parquet_despues_de_escribir(conn, lambda: rni_parquet.eliminar_localidad_en_parquet(localidad))
+    finally:
+        conn.close()
+
+def hashes_ingresados() -> set:
+    """Hashes de contenido de los archivos ya ingresados (ver rni_procesamiento.procesar_lote)."""
+    if not os.path.exists(DB_FILE):
+        return set()
+    conn = _conectar()
+    try:
+        return {f[0] for f in conn.execute(f'SELECT "Hash" FROM "{REGISTRO_TABLE}"')}
+    finally:
+        conn.close()
+
+# ============================================================
+# 🔍 CONSULTAS FILTRADAS
+# ============================================================
+
+def _where_filtros(ccte=None, provincia=None, año=None, localidad=None):
+    """Arma la cláusula WHERE (y sus parámetros) para los filtros de la app."""
+    condiciones, params = [], []
+    if ccte:
+        condiciones.append('"CCTE" = ?')
+        params.append(ccte)
+    if provincia:
+        condiciones.append('"Provincia" = ?')
+        params.append(provincia)
+    if año:
+        # Rango de fechas ISO para aprovechar el índice de Fecha
+        condiciones.append('"Fecha" >= ? AND "Fecha" < ?')
+        params += [f"{int(año):04d}-01-01", f"{int(año) + 1:04d}-01-01"]
+    if localidad:
+        condiciones.append('"Localidad" = ?')
+        params.append(localidad)
+    where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    return where, params
+
+def valores_distintos(columna: str, ccte=None, provincia=None, año=None, localidad=None) -> list:
+    """Valores distintos (no nulos, ordenados) de una columna para poblar los selectbox."""
+    if columna not in COLUMN_TYPES or not os.path.exists(DB_FILE):
+        return []
+    where, params = _where_filtros(ccte, provincia, año, localidad)
+    conn = _conectar()
+    try:
+        if not where and columna in DIMENSIONES:
+            # Sin filtros alcanza con la tabla de dimensión (se poda en cada edición/baja)
+            filas = conn.execute(f'SELECT "valor" FROM "{DIMENSIONES[columna]}" ORDER BY "valor"').fetchall()
+            return [f[0] for f in filas]
+        where += (" AND " if where else " WHERE ") + f'"{columna}" IS NOT NULL'
+        filas = conn.execute(
+            f'SELECT DISTINCT "{columna}" FROM "{TABLE_NAME}"{where} ORDER BY "{columna}"', params
+        ).fetchall()
+        return [f[0] for f in filas]
+    finally:
+        conn.close()
+
+def años_disponibles(ccte=None, provincia=None, localidad=None) -> list:
+    """Años con mediciones (de mayor a menor) según los filtros."""
+    if not os.path.exists(DB_FILE):
+        return []
+    where, params = _where_filtros(ccte, provincia, None, localidad)
+    where += (" AND " if where else " WHERE ") + '"Fecha" IS NOT NULL'
+    conn = _conectar()
+    try:
+        filas = conn.execute(
+            f'SELECT DISTINCT CAST(substr("Fecha", 1, 4) AS INTEGER) AS año '
+            f'FROM "{TABLE_NAME}"{where} ORDER BY año DESC', params
+        ).fetchall()
+        return [f[0] for f in filas if f[0]]
+    finally:
+        conn.close()
+
+def contar_mediciones(ccte=None, provincia=None, año=None, localidad=None) -> int:
+    """Cantidad de mediciones que cumplen los filtros (0 si la base no existe)."""
+    if not os.path.exists(DB_FILE):
+        return 0
+    where, params = _where_filtros(ccte, provincia, año, localidad)
+    conn = _conectar()
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM "{TABLE_NAME}"{where}', params).fetchone()[0]
+    finally:
+        conn.close()
+
+def ultima_fecha_carga(localidad=None):
+    """FechaCarga más reciente (Timestamp) según los filtros; None si no hay."""
+    if not os.path.exists(DB_FILE):
+        return None
+    where, params = _where_filtros(localidad=localidad)
+    conn = _conectar()
+    try:
+        fila = conn.execute(f'SELECT MAX("FechaCarga") FROM "{TABLE_NAME}"{where}', params).fetchone()
+    finally:
+        conn.close()
+    return pd.Timestamp(fila[0]) if fila and fila[0] else None
+
+def load_maximo_resultado(columnas=None) -> pd.DataFrame:
+    """Medición con el Resultado más alto de toda la base (una fila; vacío si no hay resultados)."""
+    columnas = [c for c in (columnas or EXPECTED_COLS) if c in EXPECTED_COLS]
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame(columns=columnas)
+    conn = _conectar()
+    try:
+        df = _leer_mediciones(
+            conn, ' WHERE "Resultado" IS NOT NULL', (), columnas, orden='"Resultado" DESC, "id"', limite=1
+        )
+        return normalizar_tabla_maestra(df)[columnas]
+    finally:
+        conn.close()
+
+def load_tabla_maestra_filtrada(ccte=None, provincia=None, año=None, localidad=None, columnas=None) -> pd.DataFrame:
+    """
+    Carga solo las filas que cumplen los filtros (y solo `columnas`, si se indican).
+    El filtrado lo hace SQLite o, con el backend Parquet, la poda de particiones Provincia/año.
+    """
+    columnas = [c for c in (columnas or EXPECTED_COLS) if c in EXPECTED_COLS]
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame(columns=columnas)
+    conn = _conectar()
+    try:
+        if _usa_parquet():
+            _sincronizar_parquet(conn)
+            df = rni_parquet.load_tabla_maestra_from_parquet(ccte, provincia, año, localidad, columnas=columnas)
+        else:
+            where, params = _where_filtros(ccte, provincia, año, localidad)
+            df = _leer_mediciones(conn, where, params, columnas)
+        return normalizar_tabla_maestra(df)[columnas]
+    finally:
+        conn.close()
+
+def _where_caja(conn, oeste, sur, este, norte):
+    """WHERE de las mediciones válidas dentro de la caja (por el R-tree si existe, luego exacto)."""
+    condicion = ' WHERE "CoordValida" = 1 AND "Lon" BETWEEN ? AND ? AND "Lat" BETWEEN ? AND ?'
+    params = [oeste, este, sur, norte]
+    if RTREE_TABLE in _tablas_en_db(conn):
+        # El R-tree guarda float32 redondeados hacia afuera: preselecciona y el filtro exacto confirma
+        condicion += (
+            f' AND "id" IN (SELECT "id" FROM "{RTREE_TABLE}" '
+            'WHERE "max_lon" >= ? AND "min_lon" <= ? AND "max_lat" >= ? AND "min_lat" <= ?)'
+        )
+        params += [oeste, este, sur, norte]
+    return condicion, params
+
+def load_mediciones_en_caja(oeste, sur, este, norte, columnas=None) -> pd.DataFrame:
+    """Mediciones con coordenadas válidas dentro de la caja (grados), sin recorrer toda la tabla."""
+    columnas = [c for c in (columnas or EXPECTED_COLS) if c in EXPECTED_COLS]
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame(columns=columnas)
+    conn = _conectar()
+    try:
+        where, params = _where_caja(conn, oeste, sur, este, norte)
+        df = _leer_mediciones(conn, where, params, columnas)
+        return normalizar_tabla_maestra(df)[columnas]
+    finally:
+        conn.close()
+
+def load_mediciones_en_radio(lat: float, lon: float, radio_m: float, columnas=None) -> pd.DataFrame:
+    """
+    Mediciones a lo sumo a radio_m metros del punto, ordenadas por distancia,
+    con la columna Distancia (m). Se leen solo las de la caja que contiene al círculo.
+    """
+    columnas = [c for c in (columnas or EXPECTED_COLS) if c in EXPECTED_COLS]
+    leer = list(dict.fromkeys(columnas + ["Lat", "Lon"]))
+    df = load_mediciones_en_caja(*caja_radio(lat, lon, radio_m), columnas=leer)
+    df["Distancia"] = distancia_m(df["Lat"], df["Lon"], lat, lon) if not df.empty else pd.Series(dtype=float)
+    df = df[df["Distancia"] <= radio_m].sort_values("Distancia", kind="stable")
+    return df[columnas + ["Distancia"]].reset_index(drop=True)
+
+def load_rollup_filtrado(ccte=None, provincia=None, año=None, localidad=None) -> pd.DataFrame:
+    """Carga las filas de rollup que cumplen los filtros, con fechas y duraciones tipadas."""
+    if not os.path.exists(DB_FILE):
+        return calcular_rollup(pd.DataFrame())
+    where, params = _where_filtros(ccte, provincia, año, localidad)
+    conn = _conectar()
+    try:
+        lista = ", ".join(f'"{c}"' for c in COLUMNAS_ROLLUP)
+        rollup = pd.read_sql(f'SELECT {lista} FROM "{ROLLUP_TABLE}"{where}', conn, params=params)
+    finally:
+        conn.close()
+    rollup["Fecha"] = pd.to_datetime(rollup["Fecha"], format="ISO8601", errors="coerce")
+    rollup["Inicio"] = pd.to_datetime(rollup["Inicio"], format="ISO8601", errors="coerce")
+    rollup["Fin"] = pd.to_datetime(rollup["Fin"], format="ISO8601", errors="coerce")
+    for col in ("MaxResultado", "Duracion"):
+        rollup[col] = pd.to_numeric(rollup[col], errors="coerce")
+    return rollup
+
+def load_mapa_calor(nivel: int) -> pd.DataFrame:
+    """Celdas de un nivel de la pirámide del mapa de calor (ix, iy, MaxPct, Mediciones)."""
+    columnas = ["ix", "iy", "MaxPct", "Mediciones"]
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame(columns=columnas)
+    conn = _conectar()
+    try:
+        lista = ", ".join(f'"{c}"' for c in columnas)
+        return pd.read_sql(f'SELECT {lista} FROM "{CALOR_TABLE}" WHERE "Nivel" = ?', conn, params=[int(nivel)])
+    finally:
+        conn.close()
@@ -0,0 +1,164 @@
+# ============================================================
+# 🗺️ DATOS DEL MAPA SEMAFORIZADO - RNI ENACOM
+# ============================================================
+# Nivel de detalle del mapa: si la selección tiene pocos puntos
+# se dibujan las mediciones; si no, se agregan del lado del
+# servidor en celdas de una grilla (máximo y cantidad por celda,
+# color de la peor banda) y al navegador viaja una fila por celda.
+# Streamlit manda el mapa como JSON: para achicarlo cada banda es
+# una capa con color fijo y las filas llevan solo números
+# (coordenadas redondeadas); el texto se busca al elegir un punto.
+# El mapa de calor nacional usa una pirámide de celdas guardada
+# en rni.db (ver rni_db.load_mapa_calor) armada con celdas_calor.
+# ============================================================
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from rni_semaforo import bandas_de_porcentaje
+
+# Hasta esta cantidad de puntos se dibujan las mediciones una por una
+MAX_PUNTOS_MAPA = 20_000
+# Celdas por lado (sobre la extensión mayor de la selección) al agregar
+CELDAS_POR_LADO = 120
+# Tamaños de celda posibles (grados). La grilla está anclada en 0,0 para que
+# una misma celda tenga siempre el mismo índice, sea cual sea la selección.
+TAMAÑOS_CELDA = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+
+# Decimales con que viajan las coordenadas (~1 m, la resolución de un float32 en grados)
+DECIMALES_COORD = 5
+
+MODO_PUNTOS = "puntos"
+MODO_CELDAS = "celdas"
+MODO_CALOR = "calor"
+
+# Niveles de la pirámide del mapa de calor: la celda del nivel n mide 1/2**n grados
+# (0 = 1°, 6 ≈ 1,7 km), así cada celda se divide exactamente en 4 del nivel siguiente
+NIVELES_CALOR = list(range(7))
+
+def tamaño_nivel(nivel: int) -> float:
+    """Tamaño (grados) de las celdas de un nivel de la pirámide."""
+    return 1.0 / 2 ** nivel
+
+def indices_celda(lat, lon, tamaño: float):
+    """Índices (ix, iy) de la celda de cada punto en la grilla de `tamaño` grados anclada en 0,0."""
+    ix = np.floor(np.asarray(lon, dtype=float) / tamaño).astype(np.int64)
+    iy = np.floor(np.asarray(lat, dtype=float) / tamaño).astype(np.int64)
+    return ix, iy
+
+def poligonos_celdas(ix, iy, tamaño: float) -> list:
+    """Polígono (4 vértices lon/lat, redondeados) de cada celda."""
+    oeste, sur = np.asarray(ix) * tamaño, np.asarray(iy) * tamaño
+    este, norte = oeste + tamaño, sur + tamaño
+    return np.stack(
+        [np.column_stack(p) for p in ((oeste, sur), (este, sur), (este, norte), (oeste, norte))], axis=1
+    ).round(DECIMALES_COORD).tolist()
+
+def tamaño_celda(lat: pd.Series, lon: pd.Series) -> float:
+    """Menor tamaño de TAMAÑOS_CELDA que cubre la extensión con a lo sumo CELDAS_POR_LADO celdas."""
+    extension = max(float(lat.max() - lat.min()), float(lon.max() - lon.min()))
+    return next((t for t in TAMAÑOS_CELDA if extension / t <= CELDAS_POR_LADO), TAMAÑOS_CELDA[-1])
+
+def agregar_en_celdas(coords: pd.DataFrame, tamaño: float) -> pd.DataFrame:
+    """
+    Agrega los puntos (lat, lon, Resultado, Banda) en celdas de `tamaño` grados:
+    una fila por celda con su polígono, Mediciones, Resultado máximo y la peor Banda.
+    """
+    ix, iy = indices_celda(coords["lat"], coords["lon"], tamaño)
+    celdas = (
+        pd.DataFrame({
+            "ix": ix, "iy": iy,
+            "Resultado": coords["Resultado"].to_numpy(),
+            "Banda": coords["Banda"].to_numpy(),
+        })
+        .groupby(["ix", "iy"], sort=False)
+        .agg(Mediciones=("Banda", "size"), Resultado=("Resultado", "max"), Banda=("Banda", "max"))
+        .reset_index()
+    )
+    # BANDA_SIN_DATO (-1) es la menor: el máximo es la peor banda con dato
+    celdas["Banda"] = celdas["Banda"].astype(np.int8)
+    celdas["poligono"] = poligonos_celdas(celdas["ix"], celdas["iy"], tamaño)
+    return celdas.drop(columns=["ix", "iy"])
+
+def datos_mapa(coords: pd.DataFrame, max_puntos: int = MAX_PUNTOS_MAPA):
+    """
+    Devuelve (modo, datos, tamaño): MODO_PUNTOS con los puntos tal cual si son
+    pocos, o MODO_CELDAS con agregar_en_celdas (tamaño en grados; None para puntos).
+    """
+    if len(coords) <= max_puntos:
+        return MODO_PUNTOS, coords, None
+    tamaño = tamaño_celda(coords["lat"], coords["lon"])
+    return MODO_CELDAS, agregar_en_celdas(coords, tamaño), tamaño
+
+def capas_por_banda(modo: str, datos: pd.DataFrame) -> list:
+    """
+    Divide los datos de datos_mapa en (banda, filas) para dibujar una capa por
+    banda con color fijo. Las filas llevan solo lo que usa la capa: en puntos
+    lon/lat redondeadas, Resultado y `fila` (índice de la medición, para buscar
+    el resto de los datos al elegirla); en celdas polígono, Mediciones y Resultado;
+    en calor polígono, Mediciones y MaxPct.
+    """
+    if modo == MODO_PUNTOS:
+        minimo = pd.DataFrame({
+            "lon": datos["lon"].round(DECIMALES_COORD),
+            "lat": datos["lat"].round(DECIMALES_COORD),
+            "Resultado": datos["Resultado"].round(2),
+            "fila": datos.index,
+        })
+    elif modo == MODO_CALOR:
+        minimo = datos[["poligono", "Mediciones", "MaxPct"]].assign(MaxPct=datos["MaxPct"].round(2))
+    else:
+        minimo = datos[["poligono", "Mediciones", "Resultado"]].assign(Resultado=datos["Resultado"].round(2))
+    bandas = datos["Banda"].to_numpy()
+    return [(int(b), minimo[bandas == b]) for b in np.unique(bandas)]
+
+def celdas_calor(lat, lon, porcentaje, nivel: int) -> pd.DataFrame:
+    """Una fila por celda del nivel con mediciones: ix, iy, MaxPct (máximo % del límite) y Mediciones."""
+    ix, iy = indices_celda(lat, lon, tamaño_nivel(nivel))
+    return (
+        pd.DataFrame({"ix": ix, "iy": iy, "pct": np.asarray(porcentaje, dtype=float)})
+        .groupby(["ix", "iy"], sort=False)
+        .agg(MaxPct=("pct", "max"), Mediciones=("pct", "size"))
+        .reset_index()
+    )
+
+def datos_calor(celdas: pd.DataFrame, nivel: int) -> pd.DataFrame:
+    """Celdas de un nivel de la pirámide listas para capas_por_banda (polígono y Banda)."""
+    datos = celdas[["MaxPct", "Mediciones"]].copy()
+    datos["poligono"] = poligonos_celdas(celdas["ix"], celdas["iy"], tamaño_nivel(nivel))
+    datos["Banda"] = bandas_de_porcentaje(celdas["MaxPct"])
+    return datos
+
+def zoom_inicial(lat: pd.Series, lon: pd.Series) -> float:
+    """Zoom de pydeck que muestra aproximadamente toda la extensión de los puntos."""
+    extension = max(float(lat.max() - lat.min()), float(lon.max() - lon.min()), 0.01)
+    return float(np.clip(math.log2(360 / extension), 3, 14))
+
+# ============================================================
+# 📍 DISTANCIAS
+# ============================================================
+
+RADIO_TIERRA_M = 6_371_008.8
+
+def distancia_m(lat, lon, lat0: float, lon0: float) -> np.ndarray:
+    """Distancia (m, haversine) de cada punto (lat, lon) al punto (lat0, lon0)."""
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    lat0, lon0 = math.radians(lat0), math.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * math.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def caja_radio(lat: float, lon: float, radio_m: float):
+    """Caja (oeste, sur, este, norte) en grados que contiene el círculo de radio_m alrededor del punto."""
+    dlat = math.degrees(radio_m / RADIO_TIERRA_M)
+    # El grado de longitud más corto del círculo es el del borde más cercano al polo
+    dlon = dlat / math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+def caja_puntos(lat, lon, radio_m: float):
+    """Caja (oeste, sur, este, norte) que contiene los círculos de radio_m alrededor de todos los puntos."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    dlat = math.degrees(radio_m / RADIO_TIERRA_M)
+    dlon = dlat / math.cos(math.radians(min(float(np.abs(lat).max()) + dlat, 89.9)))
+    return float(lon.min()) - dlon, float(lat.min()) - dlat, float(lon.max()) + dlon, float(lat.max()) + dlat
@@ -0,0 +1,196 @@
+# ============================================================
+# 🧭 NOMENCLADOR DE LOCALIDADES - RNI ENACOM
+# ============================================================
+# Geocodificación inversa sin conexión: cada medición con
+# coordenadas válidas toma la Provincia y la Localidad del
+# centroide más cercano de localidades_ar.csv (incluido con la
+# aplicación; se puede reemplazar por un listado más completo,
+# ej. BAHRA / IGN, con las mismas columnas). La búsqueda usa un
+# KD-tree sobre la esfera (ver rni_sitios) o, sin scipy, el
+# producto escalar contra todos los centroides por bloques.
+# Al cargar archivos completa Provincia/Localidad si el
+# formulario las deja en automático (los archivos sin coordenadas
+# para hacerlo no se cargan) y marca los archivos cuyas coordenadas
+# no coinciden con lo cargado a mano.
+# ============================================================
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from rni_procesamiento import coordenada_con_signo, coordenadas_validas
+from rni_sitios import KDTREE_DISPONIBLE, xyz_esfera
+from rni_mapa import RADIO_TIERRA_M
+
+if KDTREE_DISPONIBLE:
+    from scipy.spatial import cKDTree
+
+ARCHIVO_NOMENCLADOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "localidades_ar.csv")
+
+PROVINCIAS = [
+    "Buenos Aires", "CABA", "Catamarca", "Chaco", "Chubut", "Córdoba", "Corrientes", "Entre Ríos", "Formosa", "Jujuy",
+    "La Pampa", "La Rioja", "Mendoza", "Misiones", "Neuquén", "Río Negro", "Salta", "San Juan", "San Luis", "Santa Cruz",
+    "Santa Fe", "Santiago del Estero", "Tierra del Fuego", "Tucumán",
+]
+# Opción del formulario de carga: Provincia tomada de las coordenadas
+PROVINCIA_AUTOMATICA = "Automática (por GPS)"
+
+# Más lejos que esto del centroide más cercano no se asigna Localidad (sí Provincia)
+DISTANCIA_MAX_LOCALIDAD_M = 25_000
+# Puntos por bloque en la búsqueda sin KD-tree (bloque x centroides en memoria)
+PUNTOS_POR_BLOQUE = 20_000
+
+def normalizar_nombre(serie: pd.Series) -> pd.Series:
+    """Nombre comparable: sin tildes, casefold y con espacios simples (nulos se mantienen)."""
+    texto = serie.astype("string")
+    if texto.isna().all():
+        # Sin ningún texto .str.decode no tiene bytes de donde inferir el tipo
+        return texto
+    return (
+        texto.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.casefold().str.split().str.join(" ")
+    )
+
+class Nomenclador:
+    """Centroides de localidades con su Provincia, indexados para buscar el más cercano."""
+
+    def __init__(self, archivo: str = ARCHIVO_NOMENCLADOR):
+        self.localidades = pd.read_csv(archivo, dtype={"Localidad": str, "Provincia": str})
+        # Un nombre que se repite en varias provincias (Mercedes, San Martín, ...) lleva la
+        # provincia: editar o borrar una localidad solo mira la Localidad y mezclaría las dos
+        self.localidades["Nombre"] = self.localidades["Localidad"]
+        repetido = self.localidades.groupby("Localidad")["Provincia"].transform("nunique") > 1
+        self.localidades.loc[repetido, "Localidad"] = (
+            self.localidades.loc[repetido, "Nombre"] + " (" + self.localidades.loc[repetido, "Provincia"] + ")"
+        )
+        # Localidad asignada -> nombre sin provincia, para comparar con lo cargado a mano
+        self.nombres = dict(zip(self.localidades["Localidad"], self.localidades["Nombre"]))
+        self._xyz = xyz_esfera(self.localidades["Lat"], self.localidades["Lon"])
+        self._arbol = cKDTree(self._xyz) if KDTREE_DISPONIBLE else None
+
+    def __len__(self):
+        return len(self.localidades)
+
+    def _mas_cercano(self, puntos: np.ndarray):
+        """Posición del centroide más cercano a cada punto (x/y/z) y su distancia en cuerda."""
+        if self._arbol is not None:
+            cuerda, posiciones = self._arbol.query(puntos, k=1)
+            return posiciones, cuerda
+        posiciones = np.empty(len(puntos), dtype=np.int64)
+        producto = np.empty(len(puntos))
+        for inicio in range(0, len(puntos), PUNTOS_POR_BLOQUE):
+            bloque = puntos[inicio:inicio + PUNTOS_POR_BLOQUE] @ self._xyz.T
+            posiciones[inicio:inicio + len(bloque)] = bloque.argmax(axis=1)
+            producto[inicio:inicio + len(bloque)] = bloque.max(axis=1)
+        # |a - b|² = 2 - 2 a·b sobre la esfera unitaria
+        return posiciones, np.sqrt(np.maximum(2 - 2 * producto, 0))
+
+    def asignar(self, lat: pd.Series, lon: pd.Series) -> pd.DataFrame:
+        """
+        ProvinciaGPS, LocalidadGPS y DistanciaGPS (m al centroide) de cada punto, con el
+        mismo índice. Lat/Lon pueden venir sin signo (como las deja parse_dms_serie).
+        Sin coordenadas válidas queda todo nulo; lejos de toda localidad, solo Provincia.
+        La Provincia es la de la localidad más cercana: cerca de un límite provincial
+        puede fallar si el nomenclador no tiene localidades de los dos lados.
+        """
+        lat = coordenada_con_signo(pd.to_numeric(lat, errors="coerce"))
+        lon = coordenada_con_signo(pd.to_numeric(lon, errors="coerce"))
+        validas = coordenadas_validas(lat, lon).to_numpy()
+        asignacion = pd.DataFrame(
+            {"ProvinciaGPS": None, "LocalidadGPS": None, "DistanciaGPS": np.nan}, index=lat.index
+        ).astype({"ProvinciaGPS": object, "LocalidadGPS": object})
+        if not validas.any():
+            return asignacion
+        posiciones, cuerda = self._mas_cercano(xyz_esfera(lat.to_numpy()[validas], lon.to_numpy()[validas]))
+        distancia = 2 * RADIO_TIERRA_M * np.arcsin(np.minimum(cuerda / 2, 1.0))
+        localidad = self.localidades["Localidad"].to_numpy()[posiciones]
+        asignacion.loc[validas, "ProvinciaGPS"] = self.localidades["Provincia"].to_numpy()[posiciones]
+        asignacion.loc[validas, "LocalidadGPS"] = np.where(distancia <= DISTANCIA_MAX_LOCALIDAD_M, localidad, None)
+        asignacion.loc[validas, "DistanciaGPS"] = distancia
+        return asignacion
+
+def _mas_frecuente(serie: pd.Series):
+    """Valor más frecuente (None si no hay ninguno no nulo)."""
+    conteo = serie.value_counts()
+    return conteo.index[0] if len(conteo) else None
+
+def asignar_por_gps(df: pd.DataFrame, provincia: str, localidad: str, nomenclador: Nomenclador):
+    """
+    Compara cada archivo del lote (df de procesar_lote) con el nomenclador.
+    Con provincia == PROVINCIA_AUTOMATICA o localidad vacía las completa por archivo
+    con la Provincia/Localidad más frecuente de sus puntos; los archivos en los que no
+    se puede (sin coordenadas válidas o lejos de toda localidad) se sacan de df para
+    que se vuelvan a cargar a mano. Devuelve (df, verificacion, advertencias, rechazados):
+    verificacion tiene una fila por archivo con "Provincia GPS", "Localidad GPS",
+    "% en provincia" (puntos en la provincia del formulario) y "Coincide" (False si la
+    provincia o la localidad del formulario no son las del GPS); rechazados, los
+    nombres de los archivos sacados.
+    """
+    columnas = ["archivo", "Provincia GPS", "Localidad GPS", "% en provincia", "Coincide"]
+    if df.empty or "Nombre Archivo" not in df.columns:
+        return df, pd.DataFrame(columns=columnas), [], []
+    provincia_auto = provincia == PROVINCIA_AUTOMATICA
+    localidad_auto = not (localidad or "").strip()
+    # Planillas sin columnas de coordenadas: ningún punto con GPS
+    sin_gps = pd.Series(np.nan, index=df.index)
+    asignacion = nomenclador.asignar(df.get("Lat", sin_gps), df.get("Lon", sin_gps))
+    archivos = df["Nombre Archivo"]
+
+    por_archivo = asignacion.groupby(archivos, sort=False).agg(
+        provincia_gps=("ProvinciaGPS", _mas_frecuente), localidad_gps=("LocalidadGPS", _mas_frecuente),
+    )
+    if provincia_auto:
+        en_provincia = pd.Series(np.nan, index=por_archivo.index)
+    else:
+        # Porcentaje de los puntos con coordenadas que caen en la provincia del formulario
+        mismo = normalizar_nombre(asignacion["ProvinciaGPS"]) == normalizar_nombre(pd.Series([provincia]))[0]
+        con_gps = asignacion["ProvinciaGPS"].notna()
+        en_provincia = (mismo & con_gps).groupby(archivos, sort=False).sum() / con_gps.groupby(archivos, sort=False).sum() * 100
+
+    advertencias = []
+    coincide = pd.Series(True, index=por_archivo.index)
+    if not provincia_auto:
+        gps = normalizar_nombre(por_archivo["provincia_gps"])
+        coincide &= gps.isna() | (gps == normalizar_nombre(pd.Series([provincia]))[0])
+    if not localidad_auto:
+        # Mismo nombre salvo tildes, mayúsculas y espacios, con o sin la provincia agregada
+        manual = normalizar_nombre(pd.Series([localidad]))[0]
+        gps = normalizar_nombre(por_archivo["localidad_gps"])
+        nombre = normalizar_nombre(por_archivo["localidad_gps"].map(nomenclador.nombres))
+        coincide &= gps.isna() | (gps == manual) | (nombre == manual)
+    for archivo in por_archivo.index[~coincide]:
+        fila = por_archivo.loc[archivo]
+        advertencias.append(
+            f"Archivo {archivo}: las coordenadas indican "
+            f"{fila['localidad_gps'] if pd.notna(fila['localidad_gps']) else 'sin localidad cercana'}, "
+            f"{fila['provincia_gps']} (formulario: {localidad or '-'}, {provincia})"
+        )
+
+    rechazados = []
+    if provincia_auto or localidad_auto:
+        df = df.copy()
+        if provincia_auto:
+            df["Provincia"] = archivos.map(por_archivo["provincia_gps"])
+        if localidad_auto:
+            df["Localidad"] = archivos.map(por_archivo["localidad_gps"])
+        for archivo, fila in por_archivo.iterrows():
+            # Un archivo sin ningún punto asignado queda con NaN (no None) en la agregación
+            if (provincia_auto and pd.isna(fila["provincia_gps"])) or (localidad_auto and pd.isna(fila["localidad_gps"])):
+                # Sin Provincia/Localidad las filas no se podrían filtrar, editar ni borrar después
+                rechazados.append(archivo)
+                advertencias.append(
+                    f"Archivo {archivo}: no se pudo asignar Provincia/Localidad por GPS, "
+                    "no se carga (volver a cargarlo con Provincia y Localidad a mano)"
+                )
+        if rechazados:
+            df = df[~archivos.isin(rechazados)]
+
+    verificacion = pd.DataFrame({
+        "archivo": por_archivo.index,
+        "Provincia GPS": por_archivo["provincia_gps"].to_numpy(),
+        "Localidad GPS": por_archivo["localidad_gps"].to_numpy(),
+        "% en provincia": en_provincia.reindex(por_archivo.index).round(1).to_numpy(),
+        "Coincide": coincide.to_numpy(),
+    })
+    return df, verificacion, advertencias, rechazados
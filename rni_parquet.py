@@ -0,0 +1,195 @@
+# ============================================================
+# 🧱 ALMACENAMIENTO COLUMNAR PARQUET - RNI ENACOM
+# ============================================================
+# Backend opcional para las filas de la tabla maestra: archivos
+# Parquet particionados por Provincia y año de Fecha
+# (rni_parquet/Provincia=.../Año=.../parte-*.parquet).
+# Las consultas por provincia/año leen solo esas particiones y
+# solo las columnas pedidas. Se activa desde rni_db con
+# RNI_BACKEND=parquet; requiere pyarrow (viene con streamlit).
+# ============================================================
+
+import os, shutil, uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+PARQUET_DIR = "rni_parquet"
+# Versión de datos de rni.db con la que quedó sincronizado el directorio.
+# El prefijo "_" hace que pyarrow no lo tome como parte del dataset.
+ARCHIVO_VERSION = "_version_datos"
+
+COLUMNAS_PARTICION = ["Provincia", "Año"]
+# Prefijo de los directorios de trabajo de una reescritura (pyarrow ignora lo que empieza con "_")
+PREFIJO_TEMPORAL = "_reescritura-"
+
+def _particionado():
+    """Particionado hive Provincia=<texto>/Año=<entero>."""
+    return ds.partitioning(pa.schema([("Provincia", pa.string()), ("Año", pa.int32())]), flavor="hive")
+
+def _dataset():
+    return ds.dataset(PARQUET_DIR, format="parquet", partitioning=_particionado())
+
+def existe_parquet() -> bool:
+    return os.path.isdir(PARQUET_DIR)
+
+# ============================================================
+# 🔢 VERSIÓN DE SINCRONIZACIÓN
+# ============================================================
+
+def version_parquet():
+    """Versión de datos con la que se escribió el directorio (None si no hay)."""
+    try:
+        with open(os.path.join(PARQUET_DIR, ARCHIVO_VERSION)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def marcar_version(version: int):
+    """Registra la versión de datos sincronizada (se escribe al final de cada escritura)."""
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    with open(os.path.join(PARQUET_DIR, ARCHIVO_VERSION), "w") as f:
+        f.write(str(version))
+
+def marcar_desactualizado():
+    """Borra la versión sincronizada: la próxima lectura reconstruye el directorio desde rni.db."""
+    try:
+        os.remove(os.path.join(PARQUET_DIR, ARCHIVO_VERSION))
+    except OSError:
+        # Sin el archivo (o sin poder borrarlo) la versión igual no coincide con la de rni.db
+        pass
+
+# ============================================================
+# 📂 LECTURA / ESCRITURA
+# ============================================================
+
+def _escribir(df: pd.DataFrame, directorio: str = PARQUET_DIR):
+    """Agrega df al dataset como archivos nuevos en cada partición (no toca los existentes)."""
+    if df.empty:
+        return
+    df = df.copy()
+    df["Año"] = pd.to_datetime(df["Fecha"], errors="coerce").dt.year.astype("Int32")
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        tabla, directorio, format="parquet", partitioning=_particionado(),
+        basename_template=f"parte-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+def _filtro(ccte=None, provincia=None, año=None, localidad=None):
+    """Expresión de filtro: Provincia y Año podan particiones, CCTE y Localidad filtran filas."""
+    condiciones = []
+    if ccte:
+        condiciones.append(ds.field("CCTE") == ccte)
+    if provincia:
+        condiciones.append(ds.field("Provincia") == provincia)
+    if año:
+        condiciones.append(ds.field("Año") == int(año))
+    if localidad:
+        condiciones.append(ds.field("Localidad") == localidad)
+    filtro = None
+    for cond in condiciones:
+        filtro = cond if filtro is None else filtro & cond
+    return filtro
+
+def load_tabla_maestra_from_parquet(ccte=None, provincia=None, año=None, localidad=None, columnas=None) -> pd.DataFrame:
+    """Lee las filas que cumplen los filtros, solo de las particiones y columnas necesarias."""
+    if not existe_parquet():
+        return pd.DataFrame()
+    dataset = _dataset()
+    if columnas is not None:
+        columnas = [c for c in columnas if c in dataset.schema.names]
+    df = dataset.to_table(columns=columnas, filter=_filtro(ccte, provincia, año, localidad)).to_pandas()
+    return df.drop(columns=["Año"], errors="ignore")
+
+def save_tabla_maestra_to_parquet(df: pd.DataFrame):
+    """Reescribe todo el dataset con df (tabla ya normalizada)."""
+    shutil.rmtree(PARQUET_DIR, ignore_errors=True)
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    _escribir(df)
+
+def append_tabla_maestra_to_parquet(df_nuevo: pd.DataFrame):
+    """Agrega un lote (tabla ya normalizada) sin reescribir las particiones existentes."""
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    _escribir(df_nuevo)
+
+def _particiones(directorio: str) -> set:
+    """Rutas (relativas a `directorio`) de las particiones con archivos Parquet."""
+    return {
+        os.path.relpath(raiz, directorio)
+        for raiz, _, archivos in os.walk(directorio)
+        if any(a.endswith(".parquet") for a in archivos)
+    }
+
+def _reescribir_localidad(localidad: str, transformar):
+    """
+    Reescribe solo las particiones que contienen filas de la localidad: las lee,
+    aplica transformar(df) y escribe el resultado en un directorio temporal; recién
+    entonces cada partición vieja se cambia por la nueva con os.replace. Si el proceso
+    se corta en el medio, la versión sincronizada sigue siendo la anterior y la
+    próxima lectura reconstruye el directorio desde rni.db.
+    """
+    if not existe_parquet():
+        return
+    dataset = _dataset()
+    claves = (
+        dataset.to_table(columns=COLUMNAS_PARTICION, filter=ds.field("Localidad") == localidad)
+        .to_pandas().drop_duplicates()
+    )
+    if claves.empty:
+        return
+
+    partes, directorios = [], []
+    for provincia, año in claves.itertuples(index=False):
+        filtro = (ds.field("Provincia").is_null() if pd.isna(provincia) else ds.field("Provincia") == provincia)
+        filtro = filtro & (ds.field("Año").is_null() if pd.isna(año) else ds.field("Año") == int(año))
+        partes.append(dataset.to_table(filter=filtro).to_pandas())
+        directorios.extend(os.path.dirname(frag.path) for frag in dataset.get_fragments(filter=filtro))
+
+    df = pd.concat(partes, ignore_index=True).drop(columns=["Año"])
+    # Las columnas diccionario vuelven como categóricas: se pasan a texto para poder asignar valores nuevos
+    df = df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+    df = transformar(df)
+
+    reescritas = {os.path.relpath(d, PARQUET_DIR) for d in directorios}
+    temporal = os.path.join(PARQUET_DIR, f"{PREFIJO_TEMPORAL}{uuid.uuid4().hex}")
+    nuevo, viejo = os.path.join(temporal, "nuevo"), os.path.join(temporal, "viejo")
+    try:
+        _escribir(df, nuevo)
+        nuevas = _particiones(nuevo) if os.path.isdir(nuevo) else set()
+        for relativo in reescritas:
+            apartada = os.path.join(viejo, relativo)
+            os.makedirs(os.path.dirname(apartada), exist_ok=True)
+            os.replace(os.path.join(PARQUET_DIR, relativo), apartada)
+            if relativo in nuevas:
+                os.replace(os.path.join(nuevo, relativo), os.path.join(PARQUET_DIR, relativo))
+        # Filas que cambiaron de partición: archivos nuevos junto a los que ya estaban
+        for relativo in nuevas - reescritas:
+            destino = os.path.join(PARQUET_DIR, relativo)
+            os.makedirs(destino, exist_ok=True)
+            for archivo in os.listdir(os.path.join(nuevo, relativo)):
+                os.replace(os.path.join(nuevo, relativo, archivo), os.path.join(destino, archivo))
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+def actualizar_localidad_en_parquet(localidad: str, cambios: dict):
+    """Aplica los cambios a las filas de la localidad (puede moverlas de partición)."""
+    def transformar(df):
+        mask = df["Localidad"] == localidad
+        for col, valor in cambios.items():
+            if col in df.columns:
+                if pd.api.types.is_datetime64_any_dtype(df[col]):
+                    valor = pd.to_datetime(valor)
+                df[col] = df[col].mask(mask, valor)
+        return df
+    _reescribir_localidad(localidad, transformar)
+
+def eliminar_localidad_en_parquet(localidad: str):
+    """Borra las filas de la localidad reescribiendo solo sus particiones."""
+    _reescribir_localidad(localidad, lambda df: df[df["Localidad"] != localidad])
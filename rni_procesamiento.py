@@ -0,0 +1,445 @@
+# ============================================================
+# ⚙️ PROCESAMIENTO DE ARCHIVOS EXCEL - RNI ENACOM
+# ============================================================
+# Funciones puras (sin Streamlit) para leer y normalizar cada
+# archivo de mediciones. Viven en un módulo aparte para que los
+# procesos del pool de ingesta paralela puedan importarlas.
+# ============================================================
+
+import hashlib, os, re
+from datetime import timedelta
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    ARROW_DISPONIBLE = True
+except ImportError:
+    ARROW_DISPONIBLE = False
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+
+# Cantidad de procesos por defecto para la ingesta paralela
+MAX_WORKERS_INGESTA = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+# Fila (1 = primera) con los encabezados de la planilla de mediciones
+FILA_ENCABEZADO = 9
+# Filas por bloque al leer las planillas en streaming
+FILAS_POR_BLOQUE = 5000
+# Textos que pd.read_excel toma como faltantes por defecto
+VALORES_NA = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+# Estado de cada archivo en el resumen de procesar_lote
+ESTADO_PROCESADO = "procesado"
+ESTADO_YA_INGRESADO = "ya ingresado"
+ESTADO_REPETIDO = "repetido en el lote"
+# Provincia/Localidad automáticas sin coordenadas para asignarlas (ver rni_nomenclador)
+ESTADO_SIN_UBICACION = "sin ubicación por GPS"
+
+# Coordenadas en texto: grados/minutos/segundos (+ hemisferio) o un número suelto
+PATRON_DMS = r'([+-]?\d+(?:\.\d+)?)\D+(\d+(?:\.\d+)?)\D+(\d+(?:\.\d+)?)\D*\s*([NnSsEeWwOo])?'
+PATRON_NUMERO = r'([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+# Las mismas expresiones para RE2 (pyarrow.compute), donde \d y \s son solo ASCII: se aplican
+# al texto formado por ASCII y símbolos de grados/minutos/segundos, donde coinciden con re
+_ESPACIOS_RE2 = r'[\t\n\v\f\r\x1c-\x1f ]'
+_NUMERO_RE2 = r'[0-9]+(?:\.[0-9]+)?'
+PATRON_DMS_RE2 = (
+    rf'(?P<g>[+-]?{_NUMERO_RE2})[^0-9]+(?P<m>{_NUMERO_RE2})[^0-9]+(?P<s>{_NUMERO_RE2})'
+    rf'[^0-9]*{_ESPACIOS_RE2}*(?P<h>[NnSsEeWwOo])?'
+)
+PATRON_NUMERO_RE2 = r'(?P<n>[-+]?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)'
+# Número que float() y el cast de Arrow leen igual (sin "_", inf ni nan)
+PATRON_FLOAT_RE2 = r'^[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?$'
+# Texto que no se puede resolver con RE2 igual que con re/float(): va celda por celda
+PATRON_TEXTO_ESPECIAL = r'[^\x00-\x7f°º′″‘’“”´˚]|_|(?i:inf|nan)'
+
+# Mapeo de columnas esperadas en la planilla de mediciones
+MAPPING_CANDIDATES = {
+    "Fecha": ["fecha"],
+    "Hora": ["hora", "time"],
+    "Resultado": ["resultado con incertidumbre", "resultado"],
+    "Sonda": ["sonda", "sonda utilizada"],
+    "Lat": ["latitud", "lat"],
+    "Lon": ["longitud", "lon"]
+}
+
+# ============================================================
+# 🧩 FUNCIONES AUXILIARES
+# ============================================================
+
+def parse_dms_to_decimal(val):
+    """Convierte coordenadas DMS (grados, minutos, segundos) a decimal."""
+    if pd.isna(val):
+        return np.nan
+    try:
+        return float(val)
+    except:
+        pass
+    s = str(val).strip().replace(",", ".")
+    m = re.search(PATRON_DMS, s)
+    if m:
+        d = float(m.group(1)); mnt = float(m.group(2)); sec = float(m.group(3))
+        hemi = (m.group(4) or "").upper()
+        dec = abs(d) + mnt/60.0 + sec/3600.0
+        if hemi in ("S","W","O"):
+            dec = -dec
+        return dec
+    m2 = re.search(PATRON_NUMERO, s)
+    if m2:
+        try:
+            return float(m2.group(1))
+        except:
+            return np.nan
+    return np.nan
+
+def _parse_dms_texto(textos: list) -> np.ndarray:
+    """
+    parse_dms_to_decimal sobre una lista de textos, con pyarrow.compute (RE2, en C++):
+    números con cast, el resto con un solo extract_regex de grados/minutos/segundos/hemisferio.
+    """
+    arr = pa.array(textos, type=pa.string())
+    resultado = np.full(len(textos), np.nan)
+
+    # Texto con caracteres que RE2 trata distinto que re/float(): celda por celda
+    especial = pc.match_substring_regex(arr, PATRON_TEXTO_ESPECIAL).to_numpy(zero_copy_only=False)
+    for i in np.flatnonzero(especial):
+        resultado[i] = parse_dms_to_decimal(textos[i])
+
+    # float() acepta el número con espacios alrededor
+    recortado = pc.utf8_trim(arr, characters=" \t\n\v\f\r")
+    numerico = pc.match_substring_regex(recortado, PATRON_FLOAT_RE2).to_numpy(zero_copy_only=False) & ~especial
+    resultado[numerico] = pc.cast(recortado.filter(numerico), pa.float64()).to_numpy(zero_copy_only=False)
+
+    resto = ~(especial | numerico)
+    limpio = pc.replace_substring(
+        pc.utf8_trim(arr.filter(resto), characters=" \t\n\v\f\r\x1c\x1d\x1e\x1f"), ",", "."
+    )
+    posiciones = np.flatnonzero(resto)
+    dms = pc.extract_regex(limpio, PATRON_DMS_RE2)
+    con_dms = dms.is_valid().to_numpy(zero_copy_only=False)
+    partes = dms.filter(con_dms)
+    grados, minutos, segundos = (
+        pc.cast(partes.field(campo), pa.float64()).to_numpy(zero_copy_only=False) for campo in ("g", "m", "s")
+    )
+    decimal = np.abs(grados) + minutos / 60.0 + segundos / 3600.0
+    sur_oeste = pc.is_in(pc.utf8_upper(partes.field("h")), pa.array(["S", "W", "O"])).to_numpy(zero_copy_only=False)
+    resultado[posiciones[con_dms]] = np.where(sur_oeste, -decimal, decimal)
+
+    numero = pc.extract_regex(limpio.filter(~con_dms), PATRON_NUMERO_RE2).field("n")
+    resultado[posiciones[~con_dms]] = pc.cast(numero, pa.float64()).to_numpy(zero_copy_only=False)
+    return resultado
+
+def parse_dms_serie(serie: pd.Series) -> pd.Series:
+    """
+    Versión vectorizada de parse_dms_to_decimal para una columna completa, con el mismo
+    resultado celda por celda. Los números pasan directo y el texto se resuelve con
+    pyarrow.compute (sin pyarrow, celda por celda).
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.Series(serie.to_numpy(dtype="float64", na_value=np.nan), index=serie.index, name=serie.name)
+    if serie.dtype != object and not pd.api.types.is_string_dtype(serie):
+        # Fechas u otros tipos: no se esperan en coordenadas
+        return serie.apply(parse_dms_to_decimal).astype("float64")
+
+    valores = pd.Series(serie.to_numpy(dtype=object))
+    tipos = valores.map(type)
+    es_texto = tipos.eq(str).to_numpy()
+    es_numero = tipos.isin([int, float, bool, np.float64, np.float32, np.int64, np.int32]).to_numpy()
+    resultado = np.full(len(valores), np.nan)
+
+    try:
+        resultado[es_numero] = valores[es_numero].to_numpy(dtype="float64")
+    except OverflowError:
+        resultado[es_numero] = [parse_dms_to_decimal(v) for v in valores[es_numero]]
+
+    # Otros objetos (raros): celda por celda
+    otros = ~(es_texto | es_numero) & valores.notna().to_numpy()
+    if otros.any():
+        resultado[otros] = [parse_dms_to_decimal(v) for v in valores[otros]]
+
+    if es_texto.any():
+        textos = valores[es_texto].tolist()
+        if ARROW_DISPONIBLE:
+            try:
+                resultado[es_texto] = _parse_dms_texto(textos)
+            except (UnicodeError, pa.ArrowException):
+                # Texto que no se puede pasar a UTF-8 (ej. surrogates sueltos)
+                resultado[es_texto] = [parse_dms_to_decimal(v) for v in textos]
+        else:
+            resultado[es_texto] = [parse_dms_to_decimal(v) for v in textos]
+
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+def extract_numeric_from_text(series):
+    """Extrae valores numéricos (float) desde texto."""
+    s = series.astype(str).str.replace(",", ".", regex=False)
+    num = s.str.extract(r'([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)', expand=False)
+    return pd.to_numeric(num, errors="coerce")
+
+INDEX_CANDIDATES = ["índice", "indice", "index", "nro", "nº", "n°", "num", "numero", "#"]
+
+def format_timedelta_long(td: timedelta) -> str:
+    """Convierte un timedelta a formato hh:mm:ss."""
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def componer_fecha_hora(fecha: pd.Series, hora: pd.Series) -> pd.Series:
+    """
+    Compone FechaHora (datetime64) a partir de Fecha + Hora sin recorrer filas.
+    Hora puede ser texto "HH:MM:SS" u objetos time; si falta alguna de las dos da NaT.
+    """
+    fechas = pd.to_datetime(fecha, errors="coerce").dt.normalize()
+    horas = pd.to_timedelta(hora.where(hora.notna()).astype("string"), errors="coerce")
+    return fechas + horas.values
+
+# ============================================================
+# 🗺️ COORDENADAS
+# ============================================================
+
+# Caja que contiene a la Argentina (continente, Tierra del Fuego y Malvinas), en grados decimales
+LAT_ARGENTINA = (-55.2, -21.7)
+LON_ARGENTINA = (-73.6, -53.5)
+
+def coordenada_con_signo(serie: pd.Series) -> pd.Series:
+    """Lat/Lon con signo negativo (Argentina está al sur y al oeste; el parseo DMS pierde el signo)."""
+    return -pd.to_numeric(serie, errors="coerce").astype(float).abs()
+
+def coordenadas_validas(lat: pd.Series, lon: pd.Series) -> pd.Series:
+    """True si el punto cae dentro de la caja de Argentina (NaN o 0,0 quedan afuera)."""
+    return lat.between(*LAT_ARGENTINA) & lon.between(*LON_ARGENTINA)
+
+# ============================================================
+# 📖 LECTURA DE PLANILLAS EN STREAMING
+# ============================================================
+
+def _valor_celda(valor):
+    """Convierte una celda como pd.read_excel: enteros exactos a int, errores y textos NA a NaN."""
+    if valor is None:
+        return np.nan
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, str) and (valor in VALORES_NA or valor in ERROR_CODES):
+        return np.nan
+    return valor
+
+def _nombres_columnas(encabezado) -> list:
+    """Nombres de columna como pd.read_excel: "Unnamed: i" si la celda está vacía y .1, .2... si se repiten."""
+    nombres, vistos = [], {}
+    for i, valor in enumerate(encabezado):
+        nombre = _valor_celda(valor)
+        if pd.isna(nombre):
+            nombre = f"Unnamed: {i}"
+        repeticiones = vistos.get(nombre, 0)
+        while repeticiones > 0:
+            vistos[nombre] = repeticiones + 1
+            nombre = f"{nombre}.{repeticiones}"
+            repeticiones = vistos.get(nombre, 0)
+        vistos[nombre] = repeticiones + 1
+        nombres.append(nombre)
+    return nombres
+
+def _bloque_tipado(filas, columnas) -> pd.DataFrame:
+    """Arma un bloque de filas con tipo por columna (números, fechas u objetos, igual que read_excel)."""
+    valores = list(zip(*filas)) if filas else [()] * len(columnas)
+    return pd.DataFrame({col: pd.Series([_valor_celda(v) for v in vals]) for col, vals in zip(columnas, valores)})
+
+def leer_excel_en_bloques(contenido, elegir_columnas=None, fila_encabezado=FILA_ENCABEZADO,
+                          filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Recorre la primera hoja del Excel en modo solo lectura, fila por fila, sin armar la
+    planilla completa en memoria. Toma los encabezados de la fila `fila_encabezado`, llama
+    una sola vez a elegir_columnas(nombres) para decidir qué columnas conservar (todas si es
+    None) y produce DataFrames de hasta `filas_por_bloque` filas con esas columnas tipadas.
+    Como pd.read_excel, descarta las filas vacías del final pero conserva las intermedias.
+    """
+    libro = load_workbook(BytesIO(contenido), read_only=True, data_only=True, keep_links=False)
+    try:
+        hoja = libro.worksheets[0]
+        # Las dimensiones declaradas en el archivo pueden estar mal: se leen las filas tal cual vienen
+        hoja.reset_dimensions()
+        filas = hoja.iter_rows(min_row=fila_encabezado, values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            raise ValueError(f"la planilla no llega a la fila de encabezados ({fila_encabezado})")
+
+        nombres = _nombres_columnas(encabezado)
+        columnas = list(elegir_columnas(nombres)) if elegir_columnas else nombres
+        posiciones = [nombres.index(col) for col in columnas]
+
+        bloque, vacias = [], 0
+        for fila in filas:
+            if all(v is None or v == "" for v in fila):
+                # Solo se agregan si después aparece una fila con datos
+                vacias += 1
+                continue
+            while vacias:
+                # Las vacías pendientes también respetan el tamaño de bloque
+                n = min(vacias, filas_por_bloque - len(bloque))
+                bloque.extend([(None,) * len(posiciones)] * n)
+                vacias -= n
+                if len(bloque) >= filas_por_bloque:
+                    yield _bloque_tipado(bloque, columnas)
+                    bloque = []
+            bloque.append(tuple(fila[i] if i < len(fila) else None for i in posiciones))
+            if len(bloque) >= filas_por_bloque:
+                yield _bloque_tipado(bloque, columnas)
+                bloque = []
+        if bloque:
+            yield _bloque_tipado(bloque, columnas)
+    finally:
+        libro.close()
+
+# ============================================================
+# 📄 PROCESAMIENTO DE UN ARCHIVO
+# ============================================================
+
+def _columnas_candidatas(nombres):
+    """Columnas del encabezado que pueden ser el índice y cada campo de MAPPING_CANDIDATES, en orden."""
+    indice = [c for c in nombres if any(cand in str(c).lower() for cand in INDEX_CANDIDATES)]
+    campos = {
+        key: [c for c in nombres if any(cand in str(c).lower() for cand in cands)]
+        for key, cands in MAPPING_CANDIDATES.items()
+    }
+    return indice, campos
+
+def procesar_un_archivo(nombre, contenido, ccte, provincia, localidad, expediente):
+    """
+    Lee y normaliza un único archivo Excel de mediciones.
+    Solo se leen las columnas candidatas a índice o a algún campo de MAPPING_CANDIDATES.
+    Devuelve (df, resumen, advertencias); df y resumen son None si el archivo se descarta.
+    """
+    advertencias = []
+    candidatas = {}
+
+    def elegir_columnas(nombres):
+        candidatas["indice"], candidatas["campos"] = _columnas_candidatas(nombres)
+        elegidas = candidatas["indice"] + [c for cols in candidatas["campos"].values() for c in cols]
+        return list(dict.fromkeys(elegidas))
+
+    try:
+        bloques = list(leer_excel_en_bloques(contenido, elegir_columnas))
+    except Exception as e:
+        advertencias.append(f"No se pudo leer {nombre}: {e}")
+        return None, None, advertencias
+
+    df = pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame()
+    # Las columnas sin ningún dato no cuentan (como dropna(axis=1, how="all"))
+    con_datos = set(df.columns[df.notna().any()])
+    idx_col = next((c for c in candidatas["indice"] if c in con_datos), None)
+    total_mediciones = len(df)
+
+    # Detecta número de mediciones
+    if idx_col:
+        idx_num = pd.to_numeric(df[idx_col], errors="coerce")
+        df = df[idx_num.notna()]
+        if not df.empty:
+            total_mediciones = int(idx_num.max())
+
+    columnas_map = {}
+    for key in MAPPING_CANDIDATES:
+        found = next((c for c in candidatas["campos"][key] if c in con_datos), None)
+        if not found and key not in ("Lat", "Lon"):
+            advertencias.append(f"Archivo {nombre}: no se encontró columna para '{key}'")
+            return None, None, advertencias
+        if found:
+            columnas_map[key] = found
+
+    # Solo las columnas mapeadas, con el nombre esperado
+    df = pd.DataFrame({key: df[col] for key, col in columnas_map.items()}).reset_index(drop=True)
+    df["CCTE"], df["Provincia"], df["Localidad"] = ccte, provincia, localidad
+    df["Expediente"] = expediente if expediente else os.path.splitext(nombre)[0]
+    df["Nombre Archivo"] = nombre
+
+    # Limpieza y formateo de campos
+    if "Resultado" in df.columns:
+        df["Resultado"] = extract_numeric_from_text(df["Resultado"])
+    if "Lat" in df.columns:
+        df["Lat"] = parse_dms_serie(df["Lat"])
+    if "Lon" in df.columns:
+        df["Lon"] = parse_dms_serie(df["Lon"])
+
+    resumen = {
+        "archivo": nombre,
+        "expediente": df["Expediente"].iloc[0] if not df.empty else expediente,
+        "total mediciones": total_mediciones,
+        "max_resultado": df["Resultado"].max() if "Resultado" in df.columns else None
+    }
+    return df, resumen, advertencias
+
+def _procesar_un_archivo_args(args):
+    """Adaptador para ProcessPoolExecutor.map (recibe una tupla de argumentos)."""
+    return procesar_un_archivo(*args)
+
+# ============================================================
+# 📦 PROCESAMIENTO DE UN LOTE
+# ============================================================
+
+def hash_contenido(contenido: bytes) -> str:
+    """Hash SHA-256 del contenido de un archivo: identifica el mismo Excel aunque cambie de nombre."""
+    return hashlib.sha256(contenido).hexdigest()
+
+def procesar_lote(archivos, ccte, provincia, localidad, expediente, max_workers=1, ya_ingresados=None):
+    """
+    Procesa una lista de (nombre, contenido_bytes) en serie o en paralelo.
+    Los archivos cuyo hash está en `ya_ingresados` (ver rni_db.hashes_ingresados) o que
+    se repiten dentro del lote se omiten sin leerlos.
+    Devuelve (df_concatenado, resumen_df, advertencias) respetando el orden de entrada;
+    resumen_df trae el estado y el hash de cada archivo procesado u omitido.
+    """
+    ya_ingresados = set(ya_ingresados or ())
+    estados, tareas, vistos = [], [], {}
+    for nombre, contenido in archivos:
+        hash_archivo = hash_contenido(contenido)
+        if hash_archivo in ya_ingresados:
+            estados.append((nombre, hash_archivo, ESTADO_YA_INGRESADO))
+        elif hash_archivo in vistos:
+            estados.append((nombre, hash_archivo, ESTADO_REPETIDO))
+        else:
+            vistos[hash_archivo] = nombre
+            estados.append((nombre, hash_archivo, ESTADO_PROCESADO))
+            tareas.append((nombre, contenido, ccte, provincia, localidad, expediente))
+
+    if max_workers > 1 and len(tareas) > 1:
+        workers = min(max_workers, len(tareas))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map conserva el orden de entrada aunque los archivos terminen desordenados
+            resultados = iter(list(executor.map(_procesar_un_archivo_args, tareas)))
+    else:
+        resultados = iter([procesar_un_archivo(*t) for t in tareas])
+
+    lista_procesados, resumen_archivos, advertencias = [], [], []
+    for nombre, hash_archivo, estado in estados:
+        if estado != ESTADO_PROCESADO:
+            advertencias.append(f"Archivo {nombre}: {estado}, se omite")
+            resumen_archivos.append({
+                "archivo": nombre,
+                "expediente": expediente if expediente else os.path.splitext(nombre)[0],
+                "total mediciones": None,
+                "max_resultado": None,
+                "estado": estado,
+                "hash": hash_archivo,
+            })
+            continue
+        df, resumen, avisos = next(resultados)
+        advertencias.extend(avisos)
+        if df is None:
+            continue
+        lista_procesados.append(df)
+        resumen_archivos.append({**resumen, "estado": estado, "hash": hash_archivo})
+
+    resumen_df = pd.DataFrame(resumen_archivos)
+    if not resumen_df.empty:
+        # Los omitidos no tienen total: entero con nulos en lugar de float
+        resumen_df["total mediciones"] = resumen_df["total mediciones"].astype("Int64")
+    if lista_procesados:
+        return pd.concat(lista_procesados, ignore_index=True), resumen_df, advertencias
+    return pd.DataFrame(), resumen_df, advertencias
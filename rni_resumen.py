@@ -0,0 +1,212 @@
+# ============================================================
+# 📊 RESÚMENES DE MEDICIONES - RNI ENACOM
+# ============================================================
+# Tablas resumen calculadas con agregaciones agrupadas
+# (una pasada por tabla, sin iterar grupos en Python).
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from rni_procesamiento import componer_fecha_hora, format_timedelta_long
+from rni_semaforo import porcentaje_limite
+
+CLAVES_LOCALIDAD = ["CCTE", "Provincia", "Localidad"]
+
+COLUMNAS_RESUMEN_LOCALIDAD = [
+    "CCTE", "Provincia", "Localidad",
+    "Inicio", "Fin", "Mediciones", "Tiempo mediciones",
+    "Resultado Max (V/m)", "Resultado Max (%)",
+    "N° Expediente", "Sonda utilizada",
+]
+
+def unir_unicos_por_grupo(codigos, n_grupos: int, valores: pd.Series, separador: str = ", ") -> np.ndarray:
+    """
+    Une los valores distintos de `valores` por grupo ("a, b, c", ordenados como texto).
+    `codigos` es el número de grupo de cada fila (ngroup(); -1 = sin grupo).
+    La deduplicación y el orden se hacen con enteros; el join solo recorre valores únicos.
+    """
+    codigos = np.asarray(codigos)
+    valor_cod, unicos = pd.factorize(valores)
+    # Código por texto (dos valores distintos con el mismo texto cuentan una vez) en orden alfabético
+    textos = pd.Index(unicos).astype(str)
+    texto_cod, textos_unicos = pd.factorize(textos, sort=True)
+    validos = (codigos >= 0) & (valor_cod >= 0)
+
+    resultado = np.full(n_grupos, "", dtype=object)
+    if not validos.any():
+        return resultado
+    ancho = len(textos_unicos)
+    pares = np.unique(codigos[validos].astype(np.int64) * ancho + texto_cod[valor_cod[validos]])
+    grupo, texto = np.divmod(pares, ancho)
+    cortes = np.flatnonzero(np.diff(grupo)) + 1
+    textos_arr = np.asarray(textos_unicos, dtype=object)
+    for g, idx in zip(grupo[np.r_[0, cortes]], np.split(texto, cortes)):
+        resultado[g] = separador.join(textos_arr[idx])
+    return resultado
+
+# ============================================================
+# 🧮 ROLLUPS (localidad, expediente, archivo, día)
+# ============================================================
+# Pre-agregados que rni_db mantiene en la tabla rollup_mediciones.
+# Los resúmenes por localidad, día, mes y expediente se arman
+# sumando estas filas en lugar de recorrer todas las mediciones.
+
+CLAVES_ROLLUP = ["CCTE", "Provincia", "Localidad", "Expediente", "Nombre Archivo", "Fecha"]
+
+COLUMNAS_ROLLUP = CLAVES_ROLLUP + [
+    "Mediciones", "Resultados", "PuntosConHora", "ResultadosConHora",
+    "MaxResultado", "Inicio", "Fin", "Duracion", "Sondas",
+]
+
+# Separador de las listas guardadas en el rollup (no aparece en nombres de sondas)
+SEP_LISTA = "\x1f"
+
+def calcular_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agrega mediciones al grano (CCTE, Provincia, Localidad, Expediente, Nombre Archivo, Fecha):
+    cantidad de filas, de resultados y de puntos con hora, máximo, primer/último FechaHora,
+    duración trabajada (segundos) y sondas usadas.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_ROLLUP)
+
+    base = pd.DataFrame({c: df[c].values if c in df.columns else np.nan for c in CLAVES_ROLLUP}, index=df.index)
+    base["Fecha"] = pd.to_datetime(base["Fecha"], errors="coerce").dt.normalize()
+    if "FechaHora" in df.columns:
+        base["FechaHora"] = pd.to_datetime(df["FechaHora"], errors="coerce")
+    else:
+        base["FechaHora"] = componer_fecha_hora(base["Fecha"], df["Hora"])
+    base["Resultado"] = pd.to_numeric(df["Resultado"], errors="coerce")
+    base["_res_con_hora"] = base["Resultado"].where(base["FechaHora"].notna())
+
+    grupos = base.groupby(CLAVES_ROLLUP, sort=True, dropna=False, observed=True)
+    codigos = grupos.ngroup().to_numpy()
+    rollup = grupos.agg(
+        Mediciones=("Resultado", "size"),
+        Resultados=("Resultado", "count"),
+        PuntosConHora=("FechaHora", "count"),
+        ResultadosConHora=("_res_con_hora", "count"),
+        MaxResultado=("Resultado", "max"),
+        Inicio=("FechaHora", "min"),
+        Fin=("FechaHora", "max"),
+    )
+    # Cada fila es un único día de un archivo: la duración es último - primer punto
+    rollup["Duracion"] = (rollup["Fin"] - rollup["Inicio"]).dt.total_seconds().fillna(0)
+    if "Sonda" in df.columns:
+        rollup["Sondas"] = unir_unicos_por_grupo(codigos, len(rollup), df["Sonda"], separador=SEP_LISTA)
+    else:
+        rollup["Sondas"] = ""
+    return rollup.reset_index()[COLUMNAS_ROLLUP]
+
+def _unir_listas_por_grupo(codigos, n_grupos: int, listas: pd.Series) -> np.ndarray:
+    """Une (sin repetir, ordenadas) las listas SEP_LISTA de varias filas de rollup por grupo."""
+    partes = listas.fillna("").str.split(SEP_LISTA)
+    largos = partes.str.len().to_numpy()
+    valores = pd.Series(np.concatenate(partes.to_numpy()) if len(partes) else [], dtype=object)
+    valores = valores.where(valores != "")
+    return unir_unicos_por_grupo(np.repeat(np.asarray(codigos), largos), n_grupos, valores)
+
+def _formatear_duraciones(segundos: pd.Series) -> list:
+    return [format_timedelta_long(pd.Timedelta(seconds=float(s))) for s in segundos.fillna(0)]
+
+def resumen_por_localidad_desde_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tabla "Resumen general de mediciones": una fila por (CCTE, Provincia, Localidad)
+    con inicio/fin, cantidad de mediciones, tiempo medido, máximo y expedientes/sondas,
+    sumando filas de rollup.
+    """
+    rollup = rollup.dropna(subset=CLAVES_LOCALIDAD)
+    if rollup.empty:
+        return pd.DataFrame(columns=COLUMNAS_RESUMEN_LOCALIDAD)
+
+    grupos = rollup.groupby(CLAVES_LOCALIDAD, sort=True, observed=True)
+    codigos = grupos.ngroup().to_numpy()
+    resumen = grupos.agg(
+        Inicio=("Inicio", "min"),
+        Fin=("Fin", "max"),
+        Mediciones=("Mediciones", "sum"),
+        Max=("MaxResultado", "max"),
+        Duracion=("Duracion", "sum"),
+    )
+    n_grupos = len(resumen)
+    resumen["Tiempo mediciones"] = _formatear_duraciones(resumen["Duracion"])
+    max_res = resumen["Max"]
+    resumen["Resultado Max (V/m)"] = max_res
+    resumen["Resultado Max (%)"] = porcentaje_limite(max_res).where(max_res.notna() & (max_res != 0))
+    resumen["N° Expediente"] = unir_unicos_por_grupo(codigos, n_grupos, rollup["Expediente"])
+    resumen["Sonda utilizada"] = _unir_listas_por_grupo(codigos, n_grupos, rollup["Sondas"])
+    return resumen.reset_index()[COLUMNAS_RESUMEN_LOCALIDAD]
+
+def resumen_diario_desde_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Tabla "Tiempo trabajado por día" (solo días con puntos que tienen hora)."""
+    columnas = [
+        "Fecha de medición", "Hora de inicio", "Hora de fin", "Tiempo total trabajado",
+        "Cantidad de puntos medidos", "Localidades trabajadas (por día)",
+    ]
+    rollup = rollup[rollup["PuntosConHora"] > 0]
+    if rollup.empty:
+        return pd.DataFrame(columns=columnas)
+
+    fechas = rollup["Fecha"].dt.date
+    grupos = rollup.groupby(fechas, sort=True)
+    codigos = grupos.ngroup().to_numpy()
+    dias = grupos.agg(
+        Inicio=("Inicio", "min"),
+        Fin=("Fin", "max"),
+        Duracion=("Duracion", "sum"),
+        Puntos=("PuntosConHora", "sum"),
+    )
+    return pd.DataFrame({
+        "Fecha de medición": dias.index,
+        "Hora de inicio": dias["Inicio"].dt.strftime("%H:%M:%S").values,
+        "Hora de fin": dias["Fin"].dt.strftime("%H:%M:%S").values,
+        "Tiempo total trabajado": _formatear_duraciones(dias["Duracion"]),
+        "Cantidad de puntos medidos": dias["Puntos"].values,
+        "Localidades trabajadas (por día)": unir_unicos_por_grupo(codigos, len(dias), rollup["Localidad"]),
+    })
+
+def resumen_mensual_desde_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Tabla "Mediciones totales por mes" con horas trabajadas."""
+    columnas = ["Mes", "Hora inicio", "Hora fin", "Localidades trabajadas", "Cantidad puntos", "Horas trabajadas"]
+    rollup = rollup[rollup["PuntosConHora"] > 0]
+    if rollup.empty:
+        return pd.DataFrame(columns=columnas)
+
+    meses = rollup["Fecha"].dt.to_period("M").rename("Mes")
+    grupos = rollup.groupby(meses, sort=True)
+    codigos = grupos.ngroup().to_numpy()
+    mensual = grupos.agg(
+        Inicio=("Inicio", "min"),
+        Fin=("Fin", "max"),
+        Puntos=("ResultadosConHora", "sum"),
+        Duracion=("Duracion", "sum"),
+    )
+    return pd.DataFrame({
+        "Mes": mensual.index,
+        "Hora inicio": mensual["Inicio"].values,
+        "Hora fin": mensual["Fin"].values,
+        "Localidades trabajadas": unir_unicos_por_grupo(codigos, len(mensual), rollup["Localidad"]),
+        "Cantidad puntos": mensual["Puntos"].values,
+        "Horas trabajadas": _formatear_duraciones(mensual["Duracion"]),
+    })
+
+def resumen_por_expediente_desde_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Tabla de expedientes del informe (ordenada por máximo V/m)."""
+    columnas = ["Expediente", "Cantidad_puntos", "CCTE", "Provincias", "Localidades", "Max_Vm"]
+    rollup = rollup.dropna(subset=["Expediente"])
+    if rollup.empty:
+        return pd.DataFrame(columns=columnas)
+
+    grupos = rollup.groupby("Expediente", sort=True, observed=True)
+    codigos = grupos.ngroup().to_numpy()
+    expedientes = grupos.agg(
+        Cantidad_puntos=("Resultados", "sum"),
+        Max_Vm=("MaxResultado", "max"),
+    )
+    n_grupos = len(expedientes)
+    expedientes["CCTE"] = unir_unicos_por_grupo(codigos, n_grupos, rollup["CCTE"])
+    expedientes["Provincias"] = unir_unicos_por_grupo(codigos, n_grupos, rollup["Provincia"])
+    expedientes["Localidades"] = unir_unicos_por_grupo(codigos, n_grupos, rollup["Localidad"])
+    expedientes = expedientes.reset_index()[columnas]
+    return expedientes.sort_values(by="Max_Vm", ascending=False)
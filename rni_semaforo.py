@@ -0,0 +1,54 @@
+# ============================================================
+# 🚦 SEMÁFORO DE EXPOSICIÓN - RNI ENACOM
+# ============================================================
+# Única tabla de bandas del semáforo (bordes en % del límite y
+# colores) y clasificación vectorizada: porcentaje del límite y
+# banda de arrays completos con np.searchsorted. La usan la
+# ingesta (columna Banda), los resúmenes, el mapa, el panel del
+# semáforo y el informe.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+# Resultado (V/m) -> densidad de potencia R² / 3770 (mW/cm²) -> % del límite de 0.20021 mW/cm²
+FACTOR_DENSIDAD = 3770
+LIMITE_DENSIDAD = 0.20021
+
+# Bordes (% del límite) de las bandas: banda i = [BORDES[i-1], BORDES[i]),
+# la 0 es < 1 % y la última (len(BORDES)) es >= 100 %
+BORDES_SEMAFORO = np.array([1, 2, 4, 8, 15, 20, 35, 50, 100], dtype=float)
+# Banda de las mediciones sin Resultado
+BANDA_SIN_DATO = -1
+
+# Un color por banda (ver "mapa de calor.png"); el último es el de "sin dato",
+# así COLORES_*[BANDA_SIN_DATO] lo toma directamente
+COLORES_SEMAFORO = [
+    "#84C2F5", "#489DFF", "#006BD6",
+    "#A9E7A9", "#89DD89", "#4D9623",
+    "#D9FF00", "#F39A6D", "#E68200",
+    "#CC0000",
+    "#C8C8C8",
+]
+COLORES_RGB = np.array(
+    [[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in COLORES_SEMAFORO], dtype=np.uint8
+)
+
+def porcentaje_limite(resultado):
+    """% del límite de cada Resultado en V/m (escalar, array o Series; NaN se mantiene)."""
+    return resultado ** 2 / FACTOR_DENSIDAD / LIMITE_DENSIDAD * 100
+
+def bandas_de_porcentaje(porcentaje) -> np.ndarray:
+    """Banda (int8) de cada porcentaje del límite; BANDA_SIN_DATO para NaN."""
+    porcentaje = np.asarray(porcentaje, dtype=float)
+    bandas = np.searchsorted(BORDES_SEMAFORO, porcentaje, side="right")
+    return np.where(np.isnan(porcentaje), BANDA_SIN_DATO, bandas).astype(np.int8)
+
+def banda_semaforo(resultado: pd.Series) -> pd.Series:
+    """Banda del semáforo de cada Resultado en V/m (mismo índice); BANDA_SIN_DATO si falta."""
+    valores = pd.to_numeric(resultado, errors="coerce").to_numpy(dtype=float)
+    return pd.Series(bandas_de_porcentaje(porcentaje_limite(valores)), index=resultado.index)
+
+def color_semaforo(porcentaje) -> str:
+    """Color (hex) de la banda de un porcentaje suelto (gris si es nulo)."""
+    return COLORES_SEMAFORO[int(bandas_de_porcentaje(porcentaje))]
@@ -0,0 +1,169 @@
+# ============================================================
+# 📡 SITIOS REMEDIDOS - RNI ENACOM
+# ============================================================
+# Índice KD-tree en memoria sobre Lat/Lon de las mediciones con
+# coordenadas válidas de la tabla maestra compartida. Sirve para
+# buscar mediciones anteriores cerca de un punto y para agrupar
+# los puntos en sitios (el mismo lugar medido con otra Localidad
+# o Expediente) sin comparar todos contra todos. Los puntos se
+# pasan a x/y/z sobre la esfera unitaria: la distancia euclídea
+# (cuerda) crece igual que la distancia sobre la superficie.
+# Requiere scipy; sin scipy el índice no está disponible.
+# ============================================================
+
+import math
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.spatial import cKDTree
+    KDTREE_DISPONIBLE = True
+except ImportError:
+    KDTREE_DISPONIBLE = False
+
+from rni_mapa import RADIO_TIERRA_M, distancia_m
+from rni_resumen import unir_unicos_por_grupo
+
+# Distancia (m) hasta la que dos puntos se consideran el mismo sitio
+RADIO_SITIO_M = 100
+# Las altas van a un árbol chico aparte; cuando supera esta fracción del
+# principal se reconstruye uno solo con todos los puntos
+FRACCION_RECONSTRUCCION = 0.1
+
+def xyz_esfera(lat, lon) -> np.ndarray:
+    """Coordenadas cartesianas sobre la esfera unitaria (n x 3)."""
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def _cuerda(radio_m: float) -> float:
+    """Radio en metros sobre la superficie -> distancia euclídea en la esfera unitaria."""
+    return 2 * math.sin(min(radio_m / RADIO_TIERRA_M, math.pi) / 2)
+
+class IndiceSitios:
+    """
+    KD-tree de las filas con CoordValida de una instantánea de la tabla maestra.
+    Las posiciones que devuelve son posiciones de fila (iloc) en `self.df`.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._filas = np.empty(0, dtype=np.int64)
+        self._arbol = None
+        self._filas_altas = np.empty(0, dtype=np.int64)
+        self._arbol_altas = None
+        self._reconstruir(self._filas_validas(df, 0))
+
+    @staticmethod
+    def _filas_validas(df: pd.DataFrame, desde: int) -> np.ndarray:
+        if df.empty or "CoordValida" not in df.columns:
+            return np.empty(0, dtype=np.int64)
+        return desde + np.flatnonzero(df["CoordValida"].to_numpy(dtype=bool)[desde:])
+
+    def _arbol_de(self, filas: np.ndarray):
+        if len(filas) == 0:
+            return None
+        return cKDTree(xyz_esfera(self.df["Lat"].to_numpy()[filas], self.df["Lon"].to_numpy()[filas]))
+
+    def _reconstruir(self, filas: np.ndarray):
+        self._filas, self._arbol = filas, self._arbol_de(filas)
+        self._filas_altas, self._arbol_altas = np.empty(0, dtype=np.int64), None
+
+    def agregar(self, df: pd.DataFrame) -> "IndiceSitios":
+        """
+        Pasa el índice a `df`, que es la instantánea anterior con filas agregadas al
+        final (DatasetCompartido.registrar_alta). Solo se indexan las filas nuevas.
+        """
+        n_anterior = len(self.df)
+        self.df = df
+        nuevas = self._filas_validas(df, n_anterior)
+        altas = np.concatenate([self._filas_altas, nuevas])
+        if len(altas) > FRACCION_RECONSTRUCCION * max(len(self._filas), 1):
+            self._reconstruir(np.concatenate([self._filas, altas]))
+        else:
+            self._filas_altas, self._arbol_altas = altas, self._arbol_de(altas)
+        return self
+
+    def __len__(self):
+        return len(self._filas) + len(self._filas_altas)
+
+    def filas_cercanas(self, lat, lon, radio_m: float) -> np.ndarray:
+        """Posiciones (ordenadas, sin repetir) de las filas a lo sumo a radio_m de alguno de los puntos."""
+        puntos = xyz_esfera(np.atleast_1d(lat), np.atleast_1d(lon))
+        encontradas = []
+        for arbol, filas in ((self._arbol, self._filas), (self._arbol_altas, self._filas_altas)):
+            if arbol is None or len(puntos) == 0:
+                continue
+            vecinos = arbol.query_ball_point(puntos, _cuerda(radio_m), return_sorted=False)
+            indices = np.concatenate([np.asarray(v, dtype=np.int64) for v in vecinos])
+            encontradas.append(filas[indices])
+        if not encontradas:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(encontradas))
+
+    def cercanos(self, lat: float, lon: float, radio_m: float) -> pd.DataFrame:
+        """Filas a lo sumo a radio_m del punto, con Distancia (m) y ordenadas por distancia."""
+        cerca = self.df.iloc[self.filas_cercanas(lat, lon, radio_m)].copy()
+        cerca["Distancia"] = distancia_m(cerca["Lat"], cerca["Lon"], lat, lon)
+        return cerca.sort_values("Distancia", kind="stable")
+
+    def sitios(self, radio_m: float = RADIO_SITIO_M) -> np.ndarray:
+        """
+        Número de sitio de cada fila de `df` (-1 sin coordenadas válidas). Agrupamiento
+        por líderes: en orden de fila, cada punto todavía libre abre un sitio con todos
+        los puntos libres a lo sumo a radio_m de él (sin encadenar puntos a lo largo
+        de un recorrido). Cada búsqueda usa el KD-tree, sin comparar todos contra todos.
+        """
+        if len(self._filas_altas):
+            self._reconstruir(np.concatenate([self._filas, self._filas_altas]))
+        etiquetas = np.full(len(self.df), -1, dtype=np.int64)
+        if self._arbol is None:
+            return etiquetas
+        libre = np.ones(len(self._filas), dtype=bool)
+        puntos, radio = self._arbol.data, _cuerda(radio_m)
+        sitio = 0
+        for i in range(len(self._filas)):
+            if not libre[i]:
+                continue
+            vecinos = np.asarray(self._arbol.query_ball_point(puntos[i], radio, return_sorted=False), dtype=np.int64)
+            vecinos = vecinos[libre[vecinos]]
+            libre[vecinos] = False
+            etiquetas[self._filas[vecinos]] = sitio
+            sitio += 1
+        return etiquetas
+
+def resumen_sitios_repetidos(df: pd.DataFrame, etiquetas: np.ndarray) -> pd.DataFrame:
+    """
+    Sitios medidos con más de una Localidad o Expediente: centro, mediciones,
+    localidades y expedientes distintos, primera y última fecha y Resultado máximo.
+    """
+    columnas = ["Sitio", "Lat", "Lon", "Mediciones", "Localidades", "Expedientes", "Desde", "Hasta", "Resultado Max (V/m)"]
+    validas = etiquetas >= 0
+    if not validas.any():
+        return pd.DataFrame(columns=columnas)
+    base = pd.DataFrame({
+        "Sitio": etiquetas[validas],
+        "Lat": df["Lat"].to_numpy()[validas],
+        "Lon": df["Lon"].to_numpy()[validas],
+        "Resultado": pd.to_numeric(df["Resultado"], errors="coerce").to_numpy()[validas],
+        "Fecha": pd.to_datetime(df["Fecha"], errors="coerce").to_numpy()[validas],
+        "loc": pd.factorize(df["Localidad"])[0][validas],
+        "exp": pd.factorize(df["Expediente"])[0][validas],
+    })
+    resumen = base.groupby("Sitio").agg(
+        Lat=("Lat", "mean"), Lon=("Lon", "mean"), Mediciones=("Sitio", "size"),
+        n_loc=("loc", "nunique"), n_exp=("exp", "nunique"),
+        Desde=("Fecha", "min"), Hasta=("Fecha", "max"), Resultado=("Resultado", "max"),
+    )
+    repetidos = resumen[(resumen["n_loc"] > 1) | (resumen["n_exp"] > 1)]
+    if repetidos.empty:
+        return pd.DataFrame(columns=columnas)
+    # Textos unidos solo para los sitios repetidos
+    grupo = pd.Series(np.arange(len(repetidos)), index=repetidos.index)
+    codigos = grupo.reindex(etiquetas).fillna(-1).to_numpy(dtype=np.int64)
+    repetidos = repetidos.reset_index()
+    repetidos["Localidades"] = unir_unicos_por_grupo(codigos, len(repetidos), df["Localidad"])
+    repetidos["Expedientes"] = unir_unicos_por_grupo(codigos, len(repetidos), df["Expediente"])
+    repetidos = repetidos.rename(columns={"Resultado": "Resultado Max (V/m)"})
+    return repetidos.sort_values("Mediciones", ascending=False, kind="stable")[columnas].reset_index(drop=True)
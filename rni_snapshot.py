@@ -0,0 +1,123 @@
+# ============================================================
+# ⚡ SNAPSHOT ARROW IPC - RNI ENACOM
+# ============================================================
+# Copia de la tabla maestra en formato Arrow IPC (Feather v2)
+# sin compresión, escrita después de cada cambio y mapeada en
+# memoria al arrancar. Resultado, Lat, Lon y las fechas se
+# usan directamente desde el archivo mapeado (sin copiar ni
+# armar objetos Python fila por fila como pd.read_sql).
+# ============================================================
+
+import glob, os, re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    SNAPSHOT_DISPONIBLE = True
+except ImportError:
+    SNAPSHOT_DISPONIBLE = False
+
+# Un archivo por versión de datos: en Windows no se puede reemplazar un archivo
+# que otra sesión todavía tiene mapeado, así que las versiones viejas se borran
+# cuando se puede.
+SNAPSHOT_PATRON = "tabla_maestra.v{version}.arrow"
+
+COLUMNAS_NUMERICAS = ["Resultado", "Lat", "Lon"]
+COLUMNAS_FECHA = ["Fecha", "FechaCarga", "FechaHora"]
+# Enteros chicos calculados en la ingesta: Banda int8 y CoordValida como uint8 (0/1) que se lee como bool
+COLUMNAS_INT8 = ["Banda"]
+COLUMNAS_BOOL = ["CoordValida"]
+
+def ruta_snapshot(version: int) -> str:
+    return SNAPSHOT_PATRON.format(version=version)
+
+def _columna_arrow(serie: pd.Series):
+    """
+    Numéricos como float64 con NaN (sin máscara de nulos) y fechas como int64
+    (NaT = mínimo int64) y Banda/CoordValida como enteros de un byte, así se
+    pueden leer sin copiar; categóricas como diccionario (códigos + categorías);
+    el resto como texto.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy().astype(np.int32)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(codigos, mask=codigos < 0), pa.array(serie.cat.categories.astype(str), type=pa.string())
+        )
+    if serie.name in COLUMNAS_NUMERICAS:
+        return pa.array(pd.to_numeric(serie, errors="coerce").to_numpy(dtype="float64"))
+    if serie.name in COLUMNAS_FECHA:
+        fechas = pd.to_datetime(serie, errors="coerce").to_numpy(dtype="datetime64[ns]")
+        return pa.array(fechas.view("int64"))
+    if serie.name in COLUMNAS_INT8:
+        return pa.array(serie.to_numpy(dtype=np.int8))
+    if serie.name in COLUMNAS_BOOL:
+        return pa.array(serie.to_numpy(dtype=bool).view(np.uint8))
+    valores = serie.astype(object)
+    return pa.array(valores.astype(str).where(valores.notna(), None), type=pa.string(), from_pandas=True)
+
+def escribir_snapshot(df: pd.DataFrame, version: int, id_base: int):
+    """
+    Escribe el snapshot de la versión indicada (archivo temporal + rename) y borra los anteriores.
+    id_base (de los metadatos de rni.db) queda en el esquema para no confundir bases distintas.
+    """
+    if not SNAPSHOT_DISPONIBLE:
+        return
+    tabla = pa.table(
+        {col: _columna_arrow(df[col]) for col in df.columns},
+        metadata={"id_base": str(id_base), "version_datos": str(version)},
+    )
+    ruta = ruta_snapshot(version)
+    temporal = ruta + ".tmp"
+    with pa.OSFile(temporal, "wb") as sink:
+        with pa.ipc.new_file(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+    os.replace(temporal, ruta)
+    borrar_snapshots_viejos(version)
+
+def borrar_snapshots_viejos(version_vigente: int):
+    """Borra snapshots de otras versiones (los que siguen mapeados se reintentan más adelante)."""
+    for ruta in glob.glob(SNAPSHOT_PATRON.format(version="*")):
+        m = re.search(r"\.v(\d+)\.arrow$", ruta)
+        if m and int(m.group(1)) != version_vigente:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def leer_snapshot(version: int, id_base: int):
+    """
+    Mapea en memoria el snapshot de la versión indicada y lo devuelve como DataFrame
+    de solo lectura (None si no existe o es de otra base). Las columnas numéricas y
+    de fecha apuntan directamente al archivo mapeado.
+    """
+    ruta = ruta_snapshot(version)
+    if not SNAPSHOT_DISPONIBLE or not os.path.exists(ruta):
+        return None
+    # No se cierra el mapeo: los buffers de la tabla lo mantienen vivo mientras se usen
+    lector = pa.ipc.open_file(pa.memory_map(ruta, "r"))
+    metadatos = lector.schema.metadata or {}
+    if metadatos.get(b"id_base") != str(id_base).encode():
+        return None
+    tabla = lector.read_all()
+    columnas = {}
+    for nombre in tabla.column_names:
+        columna = tabla.column(nombre)
+        arr = columna.chunk(0) if columna.num_chunks == 1 else columna.combine_chunks()
+        if pa.types.is_dictionary(arr.type):
+            codigos = arr.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            columnas[nombre] = pd.Categorical.from_codes(codigos, categories=arr.dictionary.to_pylist())
+        elif nombre in COLUMNAS_NUMERICAS:
+            columnas[nombre] = arr.to_numpy(zero_copy_only=True)
+        elif nombre in COLUMNAS_FECHA:
+            columnas[nombre] = arr.to_numpy(zero_copy_only=True).view("datetime64[ns]")
+        elif nombre in COLUMNAS_INT8:
+            columnas[nombre] = arr.to_numpy(zero_copy_only=True)
+        elif nombre in COLUMNAS_BOOL:
+            columnas[nombre] = arr.to_numpy(zero_copy_only=True).view(bool)
+        else:
+            # Texto como object (igual que la lectura desde rni.db; pandas 3 inferiría str)
+            columnas[nombre] = pd.Series(arr.to_numpy(zero_copy_only=False), dtype=object)
+    # copy=False: cada columna queda en su propio bloque, sin consolidar (ni copiar)
+    return pd.DataFrame(columnas, copy=False)
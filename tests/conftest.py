@@ -0,0 +1,59 @@
+import os, sys
+from datetime import datetime, time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """Directorio de trabajo vacío: rni.db, el snapshot Arrow y rni_parquet/ se crean ahí."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def mediciones(localidad="Palermo", provincia="CABA", archivo="palermo.xlsx", n=4, lat=34.58, lon=58.43,
+               fecha="2024-05-01", expediente="EX-1", resultado=None):
+    """Lote de mediciones como lo arma procesar_lote (Lat/Lon sin signo, Hora en texto)."""
+    return pd.DataFrame({
+        "CCTE": "CABA",
+        "Provincia": provincia,
+        "Localidad": localidad,
+        "Resultado": resultado if resultado is not None else np.linspace(0.5, 2.0, n),
+        "Fecha": fecha,
+        "Hora": [f"10:{i:02d}:00" for i in range(n)],
+        "Nombre Archivo": archivo,
+        "Expediente": expediente,
+        "Sonda": "EP-600",
+        "Lat": lat + np.arange(n) * 0.0005,
+        "Lon": lon + np.arange(n) * 0.0005,
+        "FechaCarga": pd.Timestamp("2024-05-02 09:15:30"),
+    })
+
+ENCABEZADO_PLANILLA = ["N°", "Fecha", "Hora", "Resultado con incertidumbre", "Sonda utilizada", "Latitud", "Longitud"]
+
+def filas_planilla(n=5, semilla=0) -> list:
+    """Filas de mediciones como las carga el equipo (coordenadas en DMS y Resultado con texto)."""
+    return [
+        [i + 1, datetime(2024, 5, 1 + semilla % 28), time(10, i % 60, semilla % 60), f"{0.5 + i * 0.1 + semilla:.2f} V/m",
+         "EP-600", f"34°{36 + semilla % 20}'{i % 60}.5\"S", f"58°22'{i % 60}.8\"W"]
+        for i in range(n)
+    ]
+
+def planilla(filas=None, encabezado=ENCABEZADO_PLANILLA, n=5, semilla=0) -> bytes:
+    """Excel de mediciones: texto libre arriba y los encabezados en la fila 9."""
+    libro = Workbook()
+    hoja = libro.active
+    hoja["A1"] = "Informe de medición de RNI"
+    hoja["A3"] = f"Planilla {semilla}"
+    for columna, valor in enumerate(encabezado, start=1):
+        hoja.cell(row=9, column=columna, value=valor)
+    for fila, valores in enumerate(filas if filas is not None else filas_planilla(n, semilla), start=10):
+        for columna, valor in enumerate(valores, start=1):
+            hoja.cell(row=fila, column=columna, value=valor)
+    salida = BytesIO()
+    libro.save(salida)
+    return salida.getvalue()
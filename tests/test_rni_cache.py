@@ -0,0 +1,60 @@
+from rni_cache import CacheDerivados
+
+def _contador():
+    llamadas = []
+    def calcular(valor):
+        def f():
+            llamadas.append(valor)
+            return valor
+        return f
+    return llamadas, calcular
+
+def test_desaloja_la_entrada_menos_usada():
+    cache = CacheDerivados(max_entradas=2)
+    llamadas, calcular = _contador()
+    cache.obtener(1, "a", calcular("a"))
+    cache.obtener(1, "b", calcular("b"))
+    # "a" pasa a ser la más reciente: al entrar "c" sale "b"
+    assert cache.obtener(1, "a", calcular("a")) == "a"
+    cache.obtener(1, "c", calcular("c"))
+    assert len(cache) == 2
+    cache.obtener(1, "a", calcular("a"))
+    cache.obtener(1, "b", calcular("b"))
+    assert llamadas == ["a", "b", "c", "b"]
+    assert (cache.aciertos, cache.fallos) == (2, 4)
+
+def test_version_nueva_descarta_todo():
+    cache = CacheDerivados()
+    llamadas, calcular = _contador()
+    cache.obtener(1, "a", calcular("a1"))
+    assert cache.obtener(2, "a", calcular("a2")) == "a2"
+    assert cache.obtener(2, "a", calcular("a2")) == "a2"
+    assert cache.version == 2 and llamadas == ["a1", "a2"]
+
+def test_version_vieja_calcula_sin_guardar():
+    cache = CacheDerivados()
+    llamadas, calcular = _contador()
+    cache.obtener(2, "a", calcular("a2"))
+    # Sesión que todavía está en la versión 1: no recibe el valor de la 2 ni lo pisa
+    assert cache.obtener(1, "a", calcular("a1")) == "a1"
+    assert cache.obtener(1, "b", calcular("b1")) == "b1"
+    assert cache.version == 2 and len(cache) == 1
+    assert cache.obtener(2, "a", calcular("a2")) == "a2"
+    assert llamadas == ["a2", "a1", "b1"]
+
+def test_no_guarda_si_la_version_avanza_mientras_calcula():
+    cache = CacheDerivados()
+    def calcular():
+        # Otra sesión ve una escritura mientras tanto
+        cache.obtener(2, "otra", lambda: "otra")
+        return "a1"
+    assert cache.obtener(1, "a", calcular) == "a1"
+    assert cache.version == 2 and len(cache) == 1
+
+def test_limpiar():
+    cache = CacheDerivados()
+    cache.obtener(3, "a", lambda: "a")
+    cache.limpiar()
+    assert len(cache) == 0 and cache.version is None
+    assert cache.obtener(1, "a", lambda: "a1") == "a1"
+    assert cache.version == 1
@@ -0,0 +1,49 @@
+import pandas as pd
+
+import rni_dataset
+import rni_db
+from rni_dataset import DatasetCompartido
+from conftest import mediciones
+
+def _contar_cargas(monkeypatch) -> list:
+    cargas = []
+    original = rni_dataset.load_tabla_maestra_from_db
+    def cargar():
+        cargas.append(rni_db.version_datos())
+        return original()
+    monkeypatch.setattr(rni_dataset, "load_tabla_maestra_from_db", cargar)
+    return cargas
+
+def test_sesion_con_version_vieja_no_hace_volver_atras_la_instantanea(base, monkeypatch):
+    cargas = _contar_cargas(monkeypatch)
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    dataset = DatasetCompartido()
+    vieja = rni_db.version_datos()
+    dataset.snapshot(vieja)
+
+    # Escritura de otro proceso: la primera sesión que ve la versión nueva recarga
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95))
+    nueva = rni_db.version_datos()
+    assert len(dataset.snapshot(nueva)) == 7
+    # Una sesión que todavía no releyó la versión recibe la vigente, sin recargar
+    assert len(dataset.snapshot(vieja)) == 7
+    assert len(dataset.snapshot(nueva)) == 7
+    assert dataset.version == nueva
+    assert cargas == [vieja, nueva]
+
+def test_altas_y_bajas_no_modifican_la_instantanea_anterior(base):
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    dataset = DatasetCompartido()
+    anterior = dataset.snapshot()
+    copia = anterior.copy()
+
+    nuevo = rni_db.normalizar_tabla_maestra(mediciones("Quilmes", "Buenos Aires", "quilmes.xlsx", lat=34.72, lon=58.25))
+    rni_db.append_tabla_maestra_to_db(nuevo)
+    dataset.registrar_alta(nuevo[rni_db.EXPECTED_COLS])
+    rni_db.actualizar_localidad_en_db("Palermo", {"Expediente": "EX-9"})
+    dataset.registrar_edicion("Palermo", {"Expediente": "EX-9"})
+
+    pd.testing.assert_frame_equal(anterior, copia)
+    vigente = dataset.snapshot()
+    assert len(vigente) == 8
+    assert set(vigente.loc[vigente["Localidad"] == "Palermo", "Expediente"]) == {"EX-9"}
@@ -0,0 +1,247 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rni_db
+from rni_dataset import DatasetCompartido
+from rni_mapa import NIVELES_CALOR, distancia_m
+from rni_procesamiento import (
+    ESTADO_PROCESADO, ESTADO_REPETIDO, ESTADO_YA_INGRESADO, hash_contenido, procesar_lote,
+)
+from rni_resumen import CLAVES_ROLLUP
+from conftest import mediciones, planilla
+
+def test_append_conserva_filas_y_tipos(base):
+    primero = mediciones()
+    segundo = mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95)
+    rni_db.append_tabla_maestra_to_db(primero)
+    rni_db.append_tabla_maestra_to_db(segundo)
+
+    df = rni_db.load_tabla_maestra_filtrada()
+    assert len(df) == 7
+    assert list(df["Localidad"]) == ["Palermo"] * 4 + ["La Plata"] * 3
+    for col in rni_db.COLUMNAS_CATEGORICAS:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+    assert df["Resultado"].dtype == np.float64
+    assert pd.api.types.is_datetime64_any_dtype(df["Fecha"])
+    assert pd.api.types.is_datetime64_any_dtype(df["FechaHora"])
+    assert df["Banda"].dtype == np.int8
+    assert df["CoordValida"].dtype == bool
+    assert (df["Lat"] < 0).all() and (df["Lon"] < 0).all()
+    assert df["FechaHora"].iloc[1] == pd.Timestamp("2024-05-01 10:01:00")
+
+def test_append_no_reescribe_las_filas_existentes(base):
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    conn = rni_db._conectar()
+    ids_antes = [f[0] for f in conn.execute('SELECT "id" FROM "mediciones" ORDER BY "id"')]
+    conn.close()
+
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx"))
+    conn = rni_db._conectar()
+    ids_despues = [f[0] for f in conn.execute('SELECT "id" FROM "mediciones" ORDER BY "id"')]
+    conn.close()
+    assert ids_despues[:len(ids_antes)] == ids_antes
+    assert len(ids_despues) == 8
+
+def test_consultas_puntuales_sin_cargar_la_tabla(base):
+    rni_db.append_tabla_maestra_to_db(mediciones(resultado=[0.5, 3.2, 1.0, None]))
+    otra = mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=2, lat=34.92, lon=57.95)
+    otra["FechaCarga"] = pd.Timestamp("2024-06-01 08:00:00")
+    rni_db.append_tabla_maestra_to_db(otra)
+
+    assert rni_db.contar_mediciones() == 6
+    assert rni_db.contar_mediciones(localidad="La Plata") == 2
+    assert rni_db.contar_mediciones(localidad="Otra") == 0
+    assert rni_db.ultima_fecha_carga("La Plata") == pd.Timestamp("2024-06-01 08:00:00")
+    assert rni_db.ultima_fecha_carga("Otra") is None
+    maximo = rni_db.load_maximo_resultado()
+    assert len(maximo) == 1
+    assert maximo["Resultado"].iloc[0] == 3.2
+    assert maximo["Localidad"].iloc[0] == "Palermo"
+    assert maximo["FechaHora"].iloc[0] == pd.Timestamp("2024-05-01 10:01:00")
+
+def _rollup_ordenado() -> pd.DataFrame:
+    rollup = rni_db.load_rollup_filtrado()
+    return rollup.sort_values(CLAVES_ROLLUP, na_position="first").reset_index(drop=True)
+
+def test_rollup_incremental_igual_a_recalculo_completo(base):
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95))
+    # Mismo archivo de Palermo en otro día y otra localidad que después se borra
+    rni_db.append_tabla_maestra_to_db(mediciones(archivo="palermo_2.xlsx", fecha="2024-05-03", expediente="EX-2"))
+    rni_db.append_tabla_maestra_to_db(mediciones("Quilmes", "Buenos Aires", "quilmes.xlsx", lat=34.72, lon=58.25))
+    rni_db.actualizar_localidad_en_db("La Plata", {"Localidad": "Ensenada", "Expediente": "EX-9"})
+    rni_db.eliminar_localidad_en_db("Quilmes")
+
+    incremental = _rollup_ordenado()
+    conn = rni_db._conectar()
+    with conn:
+        rni_db._recalcular_rollup(conn)
+    conn.close()
+    completo = _rollup_ordenado()
+
+    assert set(incremental["Localidad"]) == {"Palermo", "Ensenada"}
+    assert incremental["Mediciones"].sum() == 11
+    pd.testing.assert_frame_equal(incremental, completo)
+
+def test_instantanea_despues_de_un_alta_igual_a_la_base(base):
+    dataset = DatasetCompartido()
+    dataset.snapshot()
+    # Igual que la app: FechaCarga con microsegundos y el lote normalizado antes de guardarlo
+    df = mediciones()
+    df["FechaCarga"] = pd.Timestamp("2024-05-02 09:15:30.654321")
+    df = rni_db.normalizar_tabla_maestra(df)[rni_db.EXPECTED_COLS]
+    rni_db.append_tabla_maestra_to_db(df)
+    dataset.registrar_alta(df)
+
+    instantanea = dataset.snapshot()
+    assert (instantanea["FechaCarga"] == pd.Timestamp("2024-05-02 09:15:30")).all()
+    pd.testing.assert_frame_equal(
+        instantanea.reset_index(drop=True), rni_db.load_tabla_maestra_filtrada(), check_categorical=False
+    )
+
+def _cargar_sitios():
+    rni_db.append_tabla_maestra_to_db(mediciones(n=6))
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=5, lat=34.92, lon=57.95))
+    rni_db.append_tabla_maestra_to_db(mediciones("Quilmes", "Buenos Aires", "quilmes.xlsx", n=5, lat=34.72, lon=58.25))
+    # Coordenadas fuera de Argentina: no entran en ninguna consulta espacial
+    rni_db.append_tabla_maestra_to_db(mediciones("Sin GPS", "CABA", "sin_gps.xlsx", n=2, lat=0, lon=0))
+
+@pytest.mark.parametrize("lat, lon, radio_m", [(-34.581, -58.431, 150), (-34.7, -58.2, 30000), (-34.92, -57.95, 1)])
+def test_consultas_espaciales_igual_a_fuerza_bruta(base, lat, lon, radio_m):
+    _cargar_sitios()
+    todas = rni_db.load_tabla_maestra_filtrada()
+    validas = todas[todas["CoordValida"]]
+
+    en_radio = rni_db.load_mediciones_en_radio(lat, lon, radio_m)
+    distancias = distancia_m(validas["Lat"], validas["Lon"], lat, lon)
+    esperadas = validas[distancias <= radio_m]
+    assert len(en_radio) == len(esperadas) > 0
+    assert sorted(zip(en_radio["Localidad"], en_radio["Lat"])) == sorted(zip(esperadas["Localidad"], esperadas["Lat"]))
+    assert en_radio["Distancia"].is_monotonic_increasing
+    assert (en_radio["Distancia"] <= radio_m).all()
+
+    oeste, sur, este, norte = -58.432, -34.95, -57.9, -34.579
+    en_caja = rni_db.load_mediciones_en_caja(oeste, sur, este, norte)
+    esperadas = validas[validas["Lon"].between(oeste, este) & validas["Lat"].between(sur, norte)]
+    assert sorted(en_caja["Lat"]) == sorted(esperadas["Lat"])
+
+@pytest.mark.skipif(not rni_db.RTREE_DISPONIBLE, reason="SQLite sin R-tree")
+def test_rtree_sigue_a_las_mediciones(base):
+    _cargar_sitios()
+
+    def ids_rtree():
+        conn = sqlite3.connect(rni_db.DB_FILE)
+        ids = {r[0] for r in conn.execute(f'SELECT "id" FROM "{rni_db.RTREE_TABLE}"')}
+        validos = {r[0] for r in conn.execute(f'SELECT "id" FROM "{rni_db.MEDICIONES_TABLE}" WHERE "CoordValida" = 1')}
+        conn.close()
+        return ids, validos
+
+    ids, validos = ids_rtree()
+    assert ids == validos and len(ids) == 16
+
+    rni_db.eliminar_localidad_en_db("Quilmes")
+    ids, validos = ids_rtree()
+    assert ids == validos and len(ids) == 11
+    assert rni_db.load_mediciones_en_radio(-34.72, -58.25, 1000).empty
+
+    # Un punto que se corre: el R-tree lo encuentra en su posición nueva
+    conn = sqlite3.connect(rni_db.DB_FILE)
+    with conn:
+        conn.execute(f'UPDATE "{rni_db.MEDICIONES_TABLE}" SET "Lat" = -31.42, "Lon" = -64.18 WHERE "id" = 1')
+    conn.close()
+    cordoba = rni_db.load_mediciones_en_radio(-31.42, -64.18, 10)
+    assert len(cordoba) == 1 and cordoba["Localidad"].iloc[0] == "Palermo"
+    assert len(rni_db.load_mediciones_en_radio(-34.58, -58.43, 400)) == 5
+
+def test_arranque_en_frio_lee_el_snapshot(base, monkeypatch):
+    if not rni_db.rni_snapshot.SNAPSHOT_DISPONIBLE:
+        pytest.skip("requiere pyarrow")
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95))
+    # Primer proceso: lee la base y deja escrito el snapshot de la versión
+    esperado = DatasetCompartido().snapshot()
+
+    # Proceso nuevo: la tabla sale del snapshot sin consultar las mediciones
+    def sin_sql(*args, **kwargs):
+        raise AssertionError("no debería leer tabla_maestra")
+    monkeypatch.setattr(rni_db, "_leer_mediciones", sin_sql)
+    pd.testing.assert_frame_equal(DatasetCompartido().snapshot(), esperado)
+
+def _subir(archivos, localidad):
+    """Carga como la app: procesar_lote contra el registro y append con los archivos procesados."""
+    df, resumen, _ = procesar_lote(archivos, "CABA", "CABA", localidad, "", ya_ingresados=rni_db.hashes_ingresados())
+    procesados = resumen[resumen["estado"] == ESTADO_PROCESADO]
+    if not df.empty:
+        df["FechaCarga"] = pd.Timestamp("2024-05-02 09:15:30")
+        rni_db.append_tabla_maestra_to_db(df, archivos=[
+            {"Hash": r["hash"], "Nombre Archivo": r["archivo"], "Expediente": r["expediente"],
+             "Localidad": localidad, "FechaCarga": "2024-05-02 09:15:30"}
+            for r in procesados.to_dict("records")
+        ])
+    return dict(zip(resumen["archivo"], resumen["estado"]))
+
+def test_archivos_repetidos_por_hash(base):
+    a, b, c = planilla(semilla=1), planilla(semilla=2), planilla(semilla=3)
+    assert _subir([("a.xlsx", a), ("b.xlsx", b), ("a_copia.xlsx", a)], "Palermo") == {
+        "a.xlsx": ESTADO_PROCESADO, "b.xlsx": ESTADO_PROCESADO, "a_copia.xlsx": ESTADO_REPETIDO,
+    }
+    assert rni_db.contar_mediciones() == 10
+    # Mismo contenido con otro nombre en una carga posterior
+    assert _subir([("a_renombrado.xlsx", a), ("c.xlsx", c)], "La Plata") == {
+        "a_renombrado.xlsx": ESTADO_YA_INGRESADO, "c.xlsx": ESTADO_PROCESADO,
+    }
+    assert rni_db.contar_mediciones() == 15
+    assert len(rni_db.hashes_ingresados()) == 3
+
+def test_borrar_localidad_permite_volver_a_cargar_sus_archivos(base):
+    a, b = planilla(semilla=1), planilla(semilla=2)
+    _subir([("a.xlsx", a)], "Palermo")
+    _subir([("b.xlsx", b)], "La Plata")
+
+    rni_db.eliminar_localidad_en_db("Palermo")
+    assert rni_db.hashes_ingresados() == {hash_contenido(b)}
+    assert _subir([("a.xlsx", a), ("b.xlsx", b)], "Palermo") == {"a.xlsx": ESTADO_PROCESADO, "b.xlsx": ESTADO_YA_INGRESADO}
+
+    # Al renombrar la localidad el registro la sigue: borrarla con el nombre nuevo libera sus archivos
+    rni_db.actualizar_localidad_en_db("La Plata", {"Localidad": "Ensenada"})
+    rni_db.eliminar_localidad_en_db("Ensenada")
+    assert rni_db.hashes_ingresados() == {hash_contenido(a)}
+    assert _subir([("b.xlsx", b)], "Ensenada") == {"b.xlsx": ESTADO_PROCESADO}
+
+def _mapa_calor() -> dict:
+    return {
+        nivel: rni_db.load_mapa_calor(nivel).sort_values(["ix", "iy"]).reset_index(drop=True)
+        for nivel in NIVELES_CALOR
+    }
+
+def _mapa_calor_igual_a_reconstruirlo():
+    incremental = _mapa_calor()
+    conn = rni_db._conectar()
+    with conn:
+        rni_db._recalcular_mapa_calor(conn)
+    conn.close()
+    completo = _mapa_calor()
+    for nivel in NIVELES_CALOR:
+        pd.testing.assert_frame_equal(incremental[nivel], completo[nivel], obj=f"nivel {nivel}")
+    return completo
+
+def test_mapa_calor_incremental_igual_a_reconstruirlo(base):
+    rni_db.append_tabla_maestra_to_db(mediciones(n=6))
+    # La Plata comparte celdas con Quilmes; Quilmes cruza el borde de una celda de 1° y cae justo sobre otro
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=5, lat=34.99, lon=57.998, resultado=[9, 1, 30, 2, 5]))
+    rni_db.append_tabla_maestra_to_db(mediciones("Quilmes", "Buenos Aires", "quilmes.xlsx", n=4, lat=34.9995, lon=57.999, resultado=[40, 0.1, 3, 60]))
+    rni_db.append_tabla_maestra_to_db(mediciones("Sin GPS", "CABA", "sin_gps.xlsx", n=2, lat=0, lon=0))
+    assert _mapa_calor_igual_a_reconstruirlo()[0]["Mediciones"].sum() == 15
+
+    rni_db.actualizar_localidad_en_db("La Plata", {"Localidad": "Ensenada", "Expediente": "EX-9"})
+    _mapa_calor_igual_a_reconstruirlo()
+
+    # Quilmes tenía el máximo de celdas compartidas: se recalculan con lo que queda
+    rni_db.eliminar_localidad_en_db("Quilmes")
+    assert _mapa_calor_igual_a_reconstruirlo()[0]["Mediciones"].sum() == 11
+    rni_db.eliminar_localidad_en_db("Palermo")
+    rni_db.eliminar_localidad_en_db("Ensenada")
+    assert all(df.empty for df in _mapa_calor_igual_a_reconstruirlo().values())
@@ -0,0 +1,104 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rni_db
+from rni_resumen import CLAVES_ROLLUP, COLUMNAS_ROLLUP, calcular_rollup
+from conftest import mediciones
+
+# Migración que lleva cada versión de esquema desde la anterior
+MIGRACIONES = {
+    2: rni_db._migrar_v1_a_v2,
+    3: rni_db._migrar_v2_a_v3,
+    4: rni_db._migrar_v3_a_v4,
+    5: rni_db._migrar_v4_a_v5,
+    6: rni_db._migrar_v5_a_v6,
+    7: rni_db._migrar_v6_a_v7,
+    8: rni_db._migrar_v7_a_v8,
+    9: rni_db._migrar_v8_a_v9,
+}
+
+def _lote() -> pd.DataFrame:
+    df = pd.concat([
+        mediciones(),
+        mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95, fecha="2024-05-03"),
+    ], ignore_index=True)
+    return rni_db.normalizar_tabla_maestra(df)
+
+def _insertar_rollup(conn, df: pd.DataFrame):
+    """Rollup de v3-v5, que lo calculaban sobre la tabla de texto."""
+    rollup = calcular_rollup(df)
+    rollup["Fecha"] = rollup["Fecha"].dt.strftime("%Y-%m-%d")
+    rollup["Inicio"] = rollup["Inicio"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    rollup["Fin"] = rollup["Fin"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    rollup = rollup.astype(object).where(rollup.notna(), None)
+    lista = ", ".join(f'"{c}"' for c in COLUMNAS_ROLLUP)
+    marcas = ", ".join("?" for _ in COLUMNAS_ROLLUP)
+    conn.executemany(
+        f'INSERT INTO "{rni_db.ROLLUP_TABLE}" ({lista}) VALUES ({marcas})',
+        rollup[COLUMNAS_ROLLUP].itertuples(index=False, name=None),
+    )
+
+def _base_en_version(version: int):
+    """
+    rni.db con user_version = `version`: la tabla_maestra de texto de v1 (Lat/Lon
+    sin signo, sin FechaHora, índices sobre el texto) llevada hasta esa versión.
+    """
+    df = _lote()
+    columnas = [c for c in rni_db.EXPECTED_COLS if c not in ("FechaHora", "Banda", "CoordValida")]
+    texto = df[columnas].copy()
+    texto = texto.astype({c: object for c in rni_db.DIMENSIONES})
+    texto["Fecha"] = texto["Fecha"].dt.strftime("%Y-%m-%d")
+    texto["FechaCarga"] = texto["FechaCarga"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    texto["Lat"] = texto["Lat"].abs()
+    texto["Lon"] = texto["Lon"].abs()
+
+    conn = sqlite3.connect(rni_db.DB_FILE)
+    with conn:
+        tipos = ", ".join(f'"{c}" {rni_db.COLUMN_TYPES[c]}' for c in columnas)
+        conn.execute(f'CREATE TABLE "{rni_db.TABLE_NAME}" ("id" INTEGER PRIMARY KEY, {tipos})')
+        conn.execute(f'CREATE INDEX "idx_tm_localidad" ON "{rni_db.TABLE_NAME}" ("Localidad")')
+        conn.execute(f'CREATE INDEX "idx_tm_fecha" ON "{rni_db.TABLE_NAME}" ("Fecha")')
+        lista = ", ".join(f'"{c}"' for c in columnas)
+        marcas = ", ".join("?" for _ in columnas)
+        conn.executemany(
+            f'INSERT INTO "{rni_db.TABLE_NAME}" ({lista}) VALUES ({marcas})',
+            texto.itertuples(index=False, name=None),
+        )
+        for destino in range(2, version + 1):
+            MIGRACIONES[destino](conn)
+            if destino == 3:
+                _insertar_rollup(conn, df)
+        conn.execute(f"PRAGMA user_version = {version}")
+    conn.close()
+    return df
+
+def _rollup_ordenado() -> pd.DataFrame:
+    rollup = rni_db.load_rollup_filtrado()
+    return rollup.sort_values(CLAVES_ROLLUP, na_position="first").reset_index(drop=True)
+
+@pytest.mark.parametrize("version", range(1, rni_db.SCHEMA_VERSION))
+def test_migracion_desde_cada_version(base, version):
+    original = _base_en_version(version)
+
+    assert rni_db.contar_mediciones() == len(original)
+    conn = sqlite3.connect(rni_db.DB_FILE)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == rni_db.SCHEMA_VERSION
+    conn.close()
+
+    df = rni_db.load_tabla_maestra_filtrada()
+    assert (df["Lat"] < 0).all() and (df["Lon"] < 0).all()
+    assert df["CoordValida"].all()
+    assert df["FechaHora"].notna().all()
+    np.testing.assert_array_equal(df["Banda"].to_numpy(), original["Banda"].to_numpy())
+    assert rni_db.contar_mediciones(localidad="La Plata") == 3
+
+    migrado = _rollup_ordenado()
+    conn = rni_db._conectar()
+    with conn:
+        rni_db._recalcular_rollup(conn)
+    conn.close()
+    assert migrado["Mediciones"].sum() == len(original)
+    pd.testing.assert_frame_equal(migrado, _rollup_ordenado())
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from rni_nomenclador import PROVINCIA_AUTOMATICA, Nomenclador, asignar_por_gps, normalizar_nombre
+from conftest import mediciones
+
+@pytest.fixture
+def nomenclador(tmp_path):
+    archivo = tmp_path / "localidades.csv"
+    pd.DataFrame({
+        "Localidad": ["Córdoba", "Palermo", "La Plata"],
+        "Provincia": ["Córdoba", "CABA", "Buenos Aires"],
+        "Lat": [-31.4135, -34.5800, -34.9214],
+        "Lon": [-64.1811, -58.4300, -57.9545],
+    }).to_csv(archivo, index=False)
+    return Nomenclador(str(archivo))
+
+def _lote() -> pd.DataFrame:
+    return pd.concat([
+        mediciones("", PROVINCIA_AUTOMATICA, "palermo.xlsx"),
+        mediciones("", PROVINCIA_AUTOMATICA, "cordoba.xlsx", lat=31.41, lon=64.18),
+        # Sin GPS: Lat/Lon vacías
+        mediciones("", PROVINCIA_AUTOMATICA, "sin_gps.xlsx", lat=float("nan"), lon=float("nan")),
+    ], ignore_index=True)
+
+def test_normalizar_nombre():
+    nombres = normalizar_nombre(pd.Series(["  Córdoba ", "SAN  MIGUEL de Tucumán", None]))
+    assert nombres[:2].tolist() == ["cordoba", "san miguel de tucuman"]
+    assert pd.isna(nombres[2])
+    assert normalizar_nombre(pd.Series([None, None])).isna().all()
+
+def test_automatica_asigna_por_archivo_y_rechaza_los_sin_coordenadas(nomenclador):
+    df, verificacion, advertencias, rechazados = asignar_por_gps(_lote(), PROVINCIA_AUTOMATICA, "", nomenclador)
+
+    assert rechazados == ["sin_gps.xlsx"]
+    assert "sin_gps.xlsx" not in set(df["Nombre Archivo"])
+    asignadas = df.drop_duplicates("Nombre Archivo").set_index("Nombre Archivo")[["Provincia", "Localidad"]]
+    assert asignadas.loc["palermo.xlsx"].tolist() == ["CABA", "Palermo"]
+    assert asignadas.loc["cordoba.xlsx"].tolist() == ["Córdoba", "Córdoba"]
+    assert len(verificacion) == 3
+    assert any("sin_gps.xlsx" in a and "no se carga" in a for a in advertencias)
+
+def test_sin_columnas_de_coordenadas(nomenclador):
+    lote = _lote().drop(columns=["Lat", "Lon"])
+    df, _, _, rechazados = asignar_por_gps(lote, PROVINCIA_AUTOMATICA, "", nomenclador)
+    assert df.empty
+    assert sorted(rechazados) == ["cordoba.xlsx", "palermo.xlsx", "sin_gps.xlsx"]
+
+    # Con Provincia y Localidad a mano el lote se carga igual, sin GPS que comparar
+    df, verificacion, advertencias, rechazados = asignar_por_gps(lote, "CABA", "Palermo", nomenclador)
+    assert len(df) == len(lote) and rechazados == [] and advertencias == []
+    assert verificacion["Coincide"].all()
+
+@pytest.mark.parametrize("localidad, coincide", [("cordoba", True), ("CÓRDOBA ", True), ("a", False), ("Córdoba Capital", False)])
+def test_coincidencia_de_localidad_por_nombre_exacto(nomenclador, localidad, coincide):
+    lote = mediciones(localidad, "Córdoba", "cordoba.xlsx", lat=31.41, lon=64.18)
+    df, verificacion, advertencias, rechazados = asignar_por_gps(lote, "Córdoba", localidad, nomenclador)
+    assert verificacion["Coincide"].tolist() == [coincide]
+    assert len(advertencias) == (0 if coincide else 1)
+    # Una advertencia no saca el archivo del lote
+    assert len(df) == len(lote) and rechazados == []
+
+def test_nombres_repetidos_en_varias_provincias_llevan_la_provincia(tmp_path):
+    archivo = tmp_path / "localidades.csv"
+    pd.DataFrame({
+        "Localidad": ["Mercedes", "Mercedes", "Mercedes", "Palermo"],
+        "Provincia": ["Buenos Aires", "Corrientes", "San Luis", "CABA"],
+        "Lat": [-34.6515, -29.1818, -33.6767, -34.5800],
+        "Lon": [-59.4307, -58.0781, -65.4621, -58.4300],
+    }).to_csv(archivo, index=False)
+    nomenclador = Nomenclador(str(archivo))
+    assert nomenclador.localidades["Localidad"].tolist() == [
+        "Mercedes (Buenos Aires)", "Mercedes (Corrientes)", "Mercedes (San Luis)", "Palermo",
+    ]
+
+    lote = pd.concat([
+        mediciones("", PROVINCIA_AUTOMATICA, "ctes.xlsx", lat=29.18, lon=58.08),
+        mediciones("", PROVINCIA_AUTOMATICA, "bsas.xlsx", lat=34.65, lon=59.43),
+        mediciones("", PROVINCIA_AUTOMATICA, "palermo.xlsx"),
+    ], ignore_index=True)
+    df, _, _, _ = asignar_por_gps(lote, PROVINCIA_AUTOMATICA, "", nomenclador)
+    asignadas = df.drop_duplicates("Nombre Archivo").set_index("Nombre Archivo")
+    assert asignadas.loc["ctes.xlsx", "Localidad"] == "Mercedes (Corrientes)"
+    assert asignadas.loc["bsas.xlsx", "Localidad"] == "Mercedes (Buenos Aires)"
+    assert asignadas.loc["palermo.xlsx", "Localidad"] == "Palermo"
+
+    # A mano vale tanto el nombre solo como el que lleva la provincia
+    for localidad in ["Mercedes", "Mercedes (Corrientes)"]:
+        lote = mediciones(localidad, "Corrientes", "ctes.xlsx", lat=29.18, lon=58.08)
+        _, verificacion, advertencias, _ = asignar_por_gps(lote, "Corrientes", localidad, nomenclador)
+        assert verificacion["Coincide"].tolist() == [True] and advertencias == []
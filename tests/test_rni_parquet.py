@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+import pytest
+
+import rni_db
+import rni_parquet
+from conftest import mediciones
+
+pytestmark = pytest.mark.skipif(not rni_parquet.PARQUET_DISPONIBLE, reason="requiere pyarrow")
+
+def _comparable(df: pd.DataFrame) -> pd.DataFrame:
+    """Mismo orden de filas y texto en lugar de categóricas (Parquet no conserva el orden ni las categorías)."""
+    df = df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    return df.sort_values(["Localidad", "FechaHora", "Lat"]).reset_index(drop=True)
+
+def _cargar(monkeypatch, backend, **filtros) -> pd.DataFrame:
+    monkeypatch.setattr(rni_db, "BACKEND", backend)
+    return _comparable(rni_db.load_tabla_maestra_filtrada(**filtros))
+
+def _cargar_datos():
+    rni_db.append_tabla_maestra_to_db(mediciones())
+    rni_db.append_tabla_maestra_to_db(mediciones("La Plata", "Buenos Aires", "la_plata.xlsx", n=3, lat=34.92, lon=57.95))
+    rni_db.append_tabla_maestra_to_db(mediciones("Quilmes", "Buenos Aires", "quilmes.xlsx", fecha="2023-11-20", lat=34.72, lon=58.25))
+
+@pytest.mark.parametrize("filtros", [{}, {"provincia": "Buenos Aires"}, {"año": 2023}, {"localidad": "Palermo"}])
+def test_parquet_devuelve_lo_mismo_que_sqlite(base, monkeypatch, filtros):
+    monkeypatch.setattr(rni_db, "BACKEND", "parquet")
+    _cargar_datos()
+    # La Plata pasa a otra provincia (cambia de partición) y Quilmes se borra
+    rni_db.actualizar_localidad_en_db("La Plata", {"Provincia": "CABA", "Expediente": "EX-9"})
+    rni_db.eliminar_localidad_en_db("Quilmes")
+    assert rni_parquet.version_parquet() == rni_db.version_datos()
+
+    pd.testing.assert_frame_equal(_cargar(monkeypatch, "parquet", **filtros), _cargar(monkeypatch, "sqlite", **filtros))
+    restos = [d for d in os.listdir(rni_parquet.PARQUET_DIR) if d.startswith(rni_parquet.PREFIJO_TEMPORAL)]
+    assert restos == []
+
+def test_falla_de_parquet_no_deshace_la_escritura(base, monkeypatch, caplog):
+    monkeypatch.setattr(rni_db, "BACKEND", "parquet")
+    _cargar_datos()
+
+    def fallar(*args):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(rni_parquet, "eliminar_localidad_en_parquet", fallar)
+    rni_db.eliminar_localidad_en_db("Quilmes")
+
+    assert "se reconstruye" in caplog.text
+    assert rni_parquet.version_parquet() is None
+    # La próxima lectura reconstruye el directorio desde rni.db
+    df = _cargar(monkeypatch, "parquet")
+    assert "Quilmes" not in set(df["Localidad"])
+    assert rni_parquet.version_parquet() == rni_db.version_datos()
+    pd.testing.assert_frame_equal(df, _cargar(monkeypatch, "sqlite"))
@@ -0,0 +1,123 @@
+from datetime import datetime, time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rni_procesamiento
+from rni_procesamiento import ESTADO_PROCESADO, ESTADO_REPETIDO, leer_excel_en_bloques, parse_dms_serie, parse_dms_to_decimal, procesar_lote
+from conftest import planilla
+
+# Celdas de Lat/Lon como vienen en las planillas
+CORPUS = [
+    # Decimales (con punto, coma, signo, espacios y exponente)
+    "-34.6037", "34.6037", " -58.3816 ", "-34,6037", "+12.5", ".5", "5.", "1e-3", "-3.4E+1",
+    # DMS con símbolos de grado/minuto/segundo y hemisferio
+    "34°36'13.3\"S", "58°22'53.8\"W", "34° 36' 13.3\" S", "58º22'53,8\"O", "31°25'12\"N", "64°11'0\"E",
+    "34°36′13.3″S", "58°22′53.8″W", "34˚36’13”s", "58 22 53.8 o", "-34 36 13.3", "34:36:13.3S",
+    "34d36m13.3sS", "34°36'S", "S 34°36'13.3\"",
+    # Basura, vacíos y valores especiales
+    "", "   ", "sin dato", "N/A", "--", "abc12def", "12abc", "nan", "NaN", "inf", "-Infinity", "1_000",
+    "٣٤.٥", "34°36'13.3\"S extra 1", "1.2.3",
+    # Celdas que no son texto
+    np.nan, None, pd.NA, -34.6037, 58, 0, True, np.float32(1.5), np.int64(-58),
+]
+
+def _esperado(valores) -> np.ndarray:
+    return np.array([parse_dms_to_decimal(v) for v in valores], dtype=float)
+
+@pytest.mark.parametrize("arrow", [True, False])
+def test_parse_dms_serie_igual_a_celda_por_celda(monkeypatch, arrow):
+    if arrow and not rni_procesamiento.ARROW_DISPONIBLE:
+        pytest.skip("requiere pyarrow")
+    monkeypatch.setattr(rni_procesamiento, "ARROW_DISPONIBLE", arrow)
+    serie = pd.Series(CORPUS, dtype=object, index=range(10, 10 + len(CORPUS)), name="Lat")
+
+    resultado = parse_dms_serie(serie)
+
+    np.testing.assert_array_equal(resultado.to_numpy(), _esperado(CORPUS))
+    assert resultado.index.equals(serie.index)
+    assert resultado.name == "Lat"
+
+def test_parse_dms_serie_texto_y_numeros():
+    textos = [v for v in CORPUS if isinstance(v, str)]
+    texto = pd.Series(textos, dtype="string")
+    np.testing.assert_array_equal(parse_dms_serie(texto).to_numpy(), _esperado(texto))
+
+    numeros = pd.Series([-34.6, np.nan, 58.0, 0.0])
+    np.testing.assert_array_equal(parse_dms_serie(numeros).to_numpy(), _esperado(numeros))
+
+def _lote_de_archivos() -> list:
+    archivos = [(f"medicion_{i}.xlsx", planilla(n=3 + i, semilla=i)) for i in range(4)]
+    # Uno que no se puede leer, uno sin columna Resultado y una copia del primero con otro nombre
+    archivos.insert(2, ("roto.xlsx", b"no es un excel"))
+    archivos.insert(4, ("sin_resultado.xlsx", planilla(encabezado=["N°", "Fecha", "Hora", "Sonda", "Lat", "Lon"], semilla=9)))
+    archivos.append(("copia.xlsx", archivos[0][1]))
+    return archivos
+
+def test_procesar_lote_en_paralelo_igual_que_en_serie():
+    archivos = _lote_de_archivos()
+    df_serie, resumen_serie, avisos_serie = procesar_lote(archivos, "CABA", "CABA", "Palermo", "", max_workers=1)
+    df_paralelo, resumen_paralelo, avisos_paralelo = procesar_lote(archivos, "CABA", "CABA", "Palermo", "", max_workers=3)
+
+    pd.testing.assert_frame_equal(df_paralelo, df_serie)
+    pd.testing.assert_frame_equal(resumen_paralelo, resumen_serie)
+    assert avisos_paralelo == avisos_serie
+    # Orden de entrada, con los omitidos en su lugar
+    assert resumen_serie["archivo"].tolist() == [
+        "medicion_0.xlsx", "medicion_1.xlsx", "medicion_2.xlsx", "medicion_3.xlsx", "copia.xlsx",
+    ]
+    assert resumen_serie["estado"].tolist() == [ESTADO_PROCESADO] * 4 + [ESTADO_REPETIDO]
+    assert df_serie["Nombre Archivo"].drop_duplicates().tolist() == [f"medicion_{i}.xlsx" for i in range(4)]
+    assert len(df_serie) == 3 + 4 + 5 + 6
+    assert any("roto.xlsx" in a for a in avisos_serie)
+    assert any("sin_resultado.xlsx" in a and "Resultado" in a for a in avisos_serie)
+
+def _planilla_mezclada() -> bytes:
+    encabezado = ["N°", "Fecha", "Hora", "Resultado", "Resultado", None, "Sonda", "Lat", "Lon", "Resultado"]
+    filas = [
+        [1, datetime(2024, 5, 1), time(10, 0), 0.5, "0,5 V/m", None, "EP-600", "34°36'13\"S", -58.38, 1],
+        [2, datetime(2024, 5, 1), "10:01:00", 1.0, "N/A", "x", "EP-600", -34.6, "58 22 53.8", 2.5],
+        [],
+        [3, "01/05/2024", time(10, 2), "#DIV/0!", 7, None, None, "", -58.39, "texto"],
+        [],
+        [],
+        [4, datetime(2024, 5, 2, 9, 30), time(23, 59, 59), 3, True, 12, "NBM-550", -34.61, -58.4, None],
+        [5, None, None, None, None, None, None, None, None, 4.0],
+        [],
+        [],
+    ]
+    return planilla(filas, encabezado=encabezado)
+
+@pytest.mark.parametrize("filas_por_bloque", [1, 3, 5000])
+def test_leer_excel_en_bloques_igual_a_read_excel(filas_por_bloque):
+    contenido = _planilla_mezclada()
+    esperado = pd.read_excel(BytesIO(contenido), header=8, engine="openpyxl")
+
+    bloques = list(leer_excel_en_bloques(contenido, filas_por_bloque=filas_por_bloque))
+    assert all(len(b) <= filas_por_bloque for b in bloques)
+    leido = pd.concat(bloques, ignore_index=True)
+
+    assert list(leido.columns) == list(esperado.columns)
+    assert len(leido) == len(esperado)
+    for col in esperado.columns:
+        # Bloques de una fila no pueden inferir el tipo de toda la columna: se comparan valores
+        np.testing.assert_array_equal(
+            leido[col].astype(object).where(leido[col].notna(), None).to_numpy(),
+            esperado[col].astype(object).where(esperado[col].notna(), None).to_numpy(),
+            err_msg=col,
+        )
+    if filas_por_bloque >= len(esperado):
+        pd.testing.assert_frame_equal(leido, esperado)
+
+def test_leer_excel_en_bloques_elige_columnas():
+    contenido = _planilla_mezclada()
+    vistos = []
+    def elegir(nombres):
+        vistos.append(nombres)
+        return ["Lat", "Resultado.1"]
+    leido = pd.concat(leer_excel_en_bloques(contenido, elegir), ignore_index=True)
+    esperado = pd.read_excel(BytesIO(contenido), header=8, engine="openpyxl", usecols=["Lat", "Resultado.1"])
+    assert vistos == [["N°", "Fecha", "Hora", "Resultado", "Resultado.1", "Unnamed: 5", "Sonda", "Lat", "Lon", "Resultado.2"]]
+    pd.testing.assert_frame_equal(leido, esperado[["Lat", "Resultado.1"]])
@@ -0,0 +1,48 @@
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from rni_resumen import calcular_rollup
+
+def _tiempo_total_por_archivo_original(df: pd.DataFrame) -> dict:
+    """Bucle por archivo y día de la versión original (calcular_tiempo_total_por_archivo), por grupo."""
+    duraciones = {}
+    for archivo, df_archivo in df.groupby("Nombre Archivo"):
+        for fecha, df_dia in df_archivo.groupby("Fecha"):
+            horas_validas = df_dia["Hora"].dropna()
+            if not horas_validas.empty:
+                delta = datetime.combine(fecha, horas_validas.max()) - datetime.combine(fecha, horas_validas.min())
+                if delta.total_seconds() < 0:
+                    delta += timedelta(days=1)
+                duraciones[(archivo, fecha)] = delta
+    return duraciones
+
+def _mediciones() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    filas = []
+    for archivo in ("a.xlsx", "b.xlsx", "c.xlsx"):
+        for dia in (date(2024, 5, 1), date(2024, 5, 2), date(2024, 6, 30)):
+            for _ in range(int(rng.integers(1, 8))):
+                segundos = int(rng.integers(0, 86400))
+                hora = None if rng.random() < 0.15 else time(segundos // 3600, segundos // 60 % 60, segundos % 60)
+                filas.append({"Nombre Archivo": archivo, "Fecha": dia, "Hora": hora})
+    df = pd.DataFrame(filas)
+    df["CCTE"], df["Provincia"], df["Localidad"] = "CABA", "CABA", "Palermo"
+    df["Expediente"] = df["Nombre Archivo"].str.replace(".xlsx", "")
+    df["Resultado"] = rng.random(len(df))
+    df["Sonda"] = "EP-600"
+    return df
+
+def test_duracion_del_rollup_igual_al_bucle_original():
+    df = _mediciones()
+    original = _tiempo_total_por_archivo_original(df)
+
+    rollup = calcular_rollup(df.assign(Hora=df["Hora"].map(lambda h: h.strftime("%H:%M:%S") if h else None)))
+    duracion = {
+        (r["Nombre Archivo"], r["Fecha"].date()): r["Duracion"] for r in rollup.to_dict("records")
+    }
+    # Los días sin ninguna hora no suman (el rollup los deja en 0)
+    assert {k: v for k, v in duracion.items() if k in original} == {k: v.total_seconds() for k, v in original.items()}
+    assert all(v == 0 for k, v in duracion.items() if k not in original)
+    assert rollup["Duracion"].sum() == sum(v.total_seconds() for v in original.values())
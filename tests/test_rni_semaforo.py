@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rni_semaforo import (
+    BANDA_SIN_DATO, BORDES_SEMAFORO, COLORES_SEMAFORO, banda_semaforo, bandas_de_porcentaje, color_semaforo,
+    porcentaje_limite,
+)
+
+@pytest.mark.parametrize("porcentaje, banda", [
+    (0.0, 0),
+    (np.nextafter(1.0, 0), 0),
+    (1.0, 1),
+    (1.5, 1),
+    (2.0, 2),
+    (np.nextafter(100.0, 0), 8),
+    (100.0, 9),
+    (1e9, 9),
+    (np.inf, 9),
+    (np.nan, BANDA_SIN_DATO),
+    (-0.5, 0),
+    (-np.inf, 0),
+])
+def test_bordes_de_las_bandas(porcentaje, banda):
+    assert bandas_de_porcentaje([porcentaje]).tolist() == [banda]
+    assert color_semaforo(porcentaje) == COLORES_SEMAFORO[banda]
+
+def test_cada_borde_abre_su_banda():
+    bandas = bandas_de_porcentaje(BORDES_SEMAFORO)
+    assert bandas.dtype == np.int8
+    assert bandas.tolist() == list(range(1, len(BORDES_SEMAFORO) + 1))
+    assert bandas_de_porcentaje(np.nextafter(BORDES_SEMAFORO, 0)).tolist() == list(range(len(BORDES_SEMAFORO)))
+
+def test_sin_dato_es_gris():
+    assert color_semaforo(np.nan) == COLORES_SEMAFORO[-1] == "#C8C8C8"
+
+def test_banda_de_resultado_en_v_m():
+    # El 1 % y el 100 % del límite en V/m
+    v_1 = np.sqrt(0.01 * 0.20021 * 3770)
+    v_100 = np.sqrt(0.20021 * 3770)
+    assert porcentaje_limite(v_100) == pytest.approx(100)
+    resultado = pd.Series([0.0, v_1 * 0.999, v_1 * 1.001, v_100 * 1.001, None, "sin dato", -v_100 * 1.001], index=list("abcdefg"))
+    bandas = banda_semaforo(resultado)
+    assert bandas.index.equals(resultado.index)
+    # Un Resultado negativo se clasifica por su magnitud (el porcentaje usa R²)
+    assert bandas.tolist() == [0, 0, 1, 9, BANDA_SIN_DATO, BANDA_SIN_DATO, 9]
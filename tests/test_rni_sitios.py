@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import rni_sitios
+from rni_mapa import distancia_m
+from rni_sitios import IndiceSitios
+
+pytestmark = pytest.mark.skipif(not rni_sitios.KDTREE_DISPONIBLE, reason="requiere scipy")
+
+def _puntos(n: int, semilla: int) -> pd.DataFrame:
+    """Puntos alrededor de CABA (unos km), algunos sin coordenadas válidas."""
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        "Lat": -34.6 + rng.normal(0, 0.02, n),
+        "Lon": -58.4 + rng.normal(0, 0.02, n),
+        "CoordValida": rng.random(n) > 0.1,
+    })
+
+def _cercanas_fuerza_bruta(df: pd.DataFrame, lat: float, lon: float, radio_m: float) -> np.ndarray:
+    distancias = distancia_m(df["Lat"], df["Lon"], lat, lon)
+    return np.flatnonzero(df["CoordValida"].to_numpy() & (distancias <= radio_m))
+
+def _sitios_fuerza_bruta(df: pd.DataFrame, radio_m: float) -> np.ndarray:
+    """Mismo agrupamiento por líderes que IndiceSitios.sitios, comparando todos contra todos."""
+    etiquetas = np.full(len(df), -1, dtype=np.int64)
+    libre = df["CoordValida"].to_numpy().copy()
+    sitio = 0
+    for i in range(len(df)):
+        if not libre[i]:
+            continue
+        vecinos = libre & (distancia_m(df["Lat"], df["Lon"], df["Lat"].iloc[i], df["Lon"].iloc[i]) <= radio_m)
+        etiquetas[vecinos] = sitio
+        libre[vecinos] = False
+        sitio += 1
+    return etiquetas
+
+@pytest.mark.parametrize("radio_m", [50, 500, 3000])
+def test_filas_cercanas_igual_a_fuerza_bruta(radio_m):
+    df = _puntos(2000, 1)
+    indice = IndiceSitios(df)
+    assert len(indice) == df["CoordValida"].sum()
+    for lat, lon in zip(df["Lat"].iloc[:20], df["Lon"].iloc[:20]):
+        np.testing.assert_array_equal(indice.filas_cercanas(lat, lon, radio_m), _cercanas_fuerza_bruta(df, lat, lon, radio_m))
+
+    cerca = indice.cercanos(-34.6, -58.4, radio_m)
+    assert cerca["Distancia"].is_monotonic_increasing
+    assert sorted(df.index.get_indexer(cerca.index)) == list(_cercanas_fuerza_bruta(df, -34.6, -58.4, radio_m))
+
+@pytest.mark.parametrize("n_alta", [5, 1000])
+def test_agregar_indexa_solo_las_filas_nuevas(n_alta):
+    # Alta chica: árbol de altas aparte; alta grande: se reconstruye un solo árbol
+    df = _puntos(1000, 2)
+    indice = IndiceSitios(df)
+    todo = pd.concat([df, _puntos(n_alta, 3)], ignore_index=True)
+    assert indice.agregar(todo) is indice
+    assert indice.df is todo
+    assert len(indice) == todo["CoordValida"].sum()
+    for lat, lon in zip(todo["Lat"].iloc[-5:], todo["Lon"].iloc[-5:]):
+        np.testing.assert_array_equal(indice.filas_cercanas(lat, lon, 800), _cercanas_fuerza_bruta(todo, lat, lon, 800))
+    np.testing.assert_array_equal(indice.sitios(300), IndiceSitios(todo).sitios(300))
+
+def test_sitios_igual_a_fuerza_bruta():
+    df = _puntos(400, 4)
+    etiquetas = IndiceSitios(df).sitios(800)
+    np.testing.assert_array_equal(etiquetas, _sitios_fuerza_bruta(df, 800))
+    assert (etiquetas[~df["CoordValida"].to_numpy()] == -1).all()
+
+def test_indice_vacio():
+    df = _puntos(3, 5).assign(CoordValida=False)
+    indice = IndiceSitios(df)
+    assert len(indice) == 0
+    assert len(indice.filas_cercanas(-34.6, -58.4, 1000)) == 0
+    assert (indice.sitios() == -1).all()